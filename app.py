@@ -1,11 +1,21 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime, timedelta
-from dataclasses import dataclass
+import numpy as np
+from datetime import datetime
+from contextlib import nullcontext
+from functools import wraps
+from pathlib import Path
 from typing import List, Dict, Optional
 import json
 import os
-from pathlib import Path
+import atexit
+
+import storage
+from cycle_import import detect_format, import_cycles
+from fleet import FORECAST_MAX_DAYS, FORECAST_MIN_DAYS, ShardRollups, StatusCache, compute_forecast, forecast_table
+from metrics import METRICS_FILE, METRICS_INTERVAL, MetricsExporter
+from profiling import Profiler, instrument_store
+from storage import CycleBuffer, FleetDraft, FleetStore, ShardSet, get_initial_data
 
 # --- KONFIGURACJA STRONY ---
 st.set_page_config(
@@ -15,6 +25,39 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# --- PROFILOWANIE (OPCJONALNE) ---
+# Czasy etapów przebiegu i wywołań magazynu: dla wszystkich sesji WARSZTAT_PROFILE=1,
+# dla jednej sesji parametr adresu ?profile=1. Wyłączone nie mierzy niczego
+PROFILE_ALL_SESSIONS = os.environ.get("WARSZTAT_PROFILE", "0") == "1"
+
+@st.cache_resource
+def get_profiler():
+    """Zwraca profiler wspólny dla wszystkich sesji procesu"""
+    return Profiler()
+
+profiler = get_profiler() if PROFILE_ALL_SESSIONS or st.query_params.get("profile") == "1" else None
+if profiler is not None:
+    profiler.start_run()
+
+def profile(name):
+    """Mierzony blok przebiegu (pusty kontekst, gdy profilowanie jest wyłączone)"""
+    return profiler.section(name) if profiler is not None else nullcontext()
+
+def profile_lap(name):
+    """Zamyka mierzony etap przebiegu trwający od poprzedniego etapu"""
+    if profiler is not None:
+        profiler.lap(name)
+
+def profiled(name):
+    """Dekorator: mierzy każde wywołanie funkcji (np. przebieg fragmentu) jako blok `name`"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with profile(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
 # --- ZAAWANSOWANE STYLE CSS ---
 st.markdown("""
     <style>
@@ -329,174 +372,43 @@ st.markdown("""
     }
     </style>
     """, unsafe_allow_html=True)
-
-# --- KLASY DANYCH ---
-@dataclass
-class ServiceInterval:
-    """Pojedynczy interwał serwisowy"""
-    name: str
-    type: str  # 'cycles' lub 'time'
-    interval: int  # liczba cykli lub miesięcy
-    current_value: int
-    last_service: str
-    enabled: bool = True
-    
-    def get_status(self):
-        """Zwraca status: 0=OK, 1=Warning, 2=Critical"""
-        if not self.enabled:
-            return 0
-            
-        if self.type == 'cycles':
-            remaining = self.interval - self.current_value
-            if remaining <= 0:
-                return 2
-            elif remaining <= self.interval * 0.15:
-                return 1
-        else:  # time
-            last = datetime.strptime(self.last_service, "%Y-%m-%d").date()
-            next_date = add_months(last, self.interval)
-            days_remaining = (next_date - datetime.now().date()).days
-            if days_remaining <= 0:
-                return 2
-            elif days_remaining <= 7:
-                return 1
-        return 0
-    
-    def get_progress(self):
-        """Zwraca postęp jako wartość 0-1"""
-        if not self.enabled:
-            return 0
-        if self.type == 'cycles':
-            return min(self.current_value / self.interval, 1.0)
-        else:
-            last = datetime.strptime(self.last_service, "%Y-%m-%d").date()
-            next_date = add_months(last, self.interval)
-            total_days = (next_date - last).days
-            elapsed_days = (datetime.now().date() - last).days
-            return min(elapsed_days / total_days, 1.0)
+profile_lap("style CSS")
 
 # --- FUNKCJE POMOCNICZE ---
-def add_months(source_date, months):
-    """Dodaje miesiące do daty"""
-    month = source_date.month - 1 + months
-    year = source_date.year + month // 12
-    month = month % 12 + 1
-    day = min(source_date.day, [31,29,31,30,31,30,31,31,30,31,30,31][month-1])
-    return source_date.replace(year=year, month=month, day=day)
-
-# --- SYSTEM ZAPISU DANYCH (PERSISTENCE) ---
-DATA_DIR = Path("warsztat_data")
-DATABASE_FILE = DATA_DIR / "database.json"
-HISTORY_FILE = DATA_DIR / "history.json"
-BACKUP_DIR = DATA_DIR / "backups"
-
-def ensure_data_directory():
-    """Tworzy katalog na dane jeśli nie istnieje"""
-    DATA_DIR.mkdir(exist_ok=True)
-    BACKUP_DIR.mkdir(exist_ok=True)
+# Panel główny: ile alertów wypisać w sekcji alertów (reszta tylko liczona)
+MAX_LISTED_ALERTS = 25
 
-def create_backup():
-    """Tworzy kopię zapasową bazy danych"""
-    try:
-        if DATABASE_FILE.exists():
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_file = BACKUP_DIR / f"database_backup_{timestamp}.json"
-            
-            with open(DATABASE_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            with open(backup_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            
-            # Zachowaj tylko 10 ostatnich backupów
-            backups = sorted(BACKUP_DIR.glob("database_backup_*.json"))
-            if len(backups) > 10:
-                for old_backup in backups[:-10]:
-                    old_backup.unlink()
-            
-            return True
-    except Exception as e:
-        st.error(f"Błąd tworzenia backupu: {e}")
-        return False
+# Podgląd plików w konfiguracji - czytana jest tylko jedna strona pliku
+PREVIEW_PAGE_BYTES = 64 * 1024
 
-def save_database(data):
-    """Zapisuje bazę danych do pliku JSON"""
-    try:
-        ensure_data_directory()
-        
-        # Walidacja danych przed zapisem
-        if not isinstance(data, dict) or 'machines' not in data:
-            st.error("Nieprawidłowa struktura danych!")
-            return False
-        
-        # Zapisz dane
-        with open(DATABASE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        
-        return True
-    except Exception as e:
-        st.error(f"Błąd zapisu bazy danych: {e}")
-        return False
+def file_preview(path, key):
+    """Stronicowany podgląd pliku - czytany dopiero po włączeniu, jedna strona naraz"""
+    if not st.toggle("👁️ Podgląd JSON", key=key):
+        return
+    pages = max(1, -(-path.stat().st_size // PREVIEW_PAGE_BYTES))
+    page = 1
+    if pages > 1:
+        page = st.number_input(f"Strona podglądu (z {pages}, po {PREVIEW_PAGE_BYTES // 1024} KB)",
+                               min_value=1, max_value=pages, value=1, key=f"{key}_page")
+    st.code(storage.read_file_page(path, page - 1, PREVIEW_PAGE_BYTES), language='json')
 
-def load_database():
-    """Wczytuje bazę danych z pliku JSON lub tworzy nową"""
-    try:
-        ensure_data_directory()
-        
-        if DATABASE_FILE.exists():
-            with open(DATABASE_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            # Walidacja struktury
-            if isinstance(data, dict) and 'machines' in data:
-                return data
-            else:
-                st.warning("Nieprawidłowa struktura pliku database.json - tworzę nową bazę")
-                return get_initial_data()
-        else:
-            # Pierwsza inicjalizacja - utwórz pustą bazę
-            initial_data = get_initial_data()
-            save_database(initial_data)
-            return initial_data
-            
-    except json.JSONDecodeError:
-        st.error("Błąd odczytu database.json - plik uszkodzony. Tworzę nową bazę.")
-        return get_initial_data()
-    except Exception as e:
-        st.error(f"Błąd wczytywania bazy danych: {e}")
-        return get_initial_data()
+def download_database():
+    """Plik database.json do pobrania - zaległy WAL trafia najpierw do snapshotu, by plik zawierał wszystkie operacje"""
+    with store.locked():
+        store.sync()
+        if store.paths.wal.exists() and store.paths.wal.stat().st_size:
+            store.save()
+        return storage.read_file_bytes(store.paths.database)
 
-def save_history(history):
-    """Zapisuje historię operacji do pliku JSON"""
-    try:
-        ensure_data_directory()
-        
-        with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
-            json.dump(history, f, indent=2, ensure_ascii=False)
-        
-        return True
-    except Exception as e:
-        st.error(f"Błąd zapisu historii: {e}")
-        return False
+def export_database():
+    """Baza w formacie database.json z danych w pamięci - generowana dopiero przy pobraniu"""
+    with store.lock:
+        return json.dumps(store.data, indent=2, ensure_ascii=False)
 
-def load_history():
-    """Wczytuje historię operacji z pliku JSON"""
-    try:
-        ensure_data_directory()
-        
-        if HISTORY_FILE.exists():
-            with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
-                history = json.load(f)
-            return history if isinstance(history, list) else []
-        else:
-            return []
-            
-    except json.JSONDecodeError:
-        st.warning("Błąd odczytu history.json - tworzę nową historię")
-        return []
-    except Exception as e:
-        st.error(f"Błąd wczytywania historii: {e}")
-        return []
+def export_history():
+    """Historia w formacie history.jsonl z danych w pamięci - generowana dopiero przy pobraniu"""
+    with store.lock:
+        return "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in reversed(store.history))
 
 def get_status_color(status):
     """Zwraca kolor dla statusu"""
@@ -508,90 +420,404 @@ def get_status_label(status):
     labels = {0: "OK", 1: "OSTRZEŻENIE", 2: "KRYTYCZNY"}
     return labels.get(status, "NIEZNANY")
 
-def get_initial_data():
-    """Pusta struktura danych - użytkownik wprowadzi dane samodzielnie"""
-    return {
-        "machines": []
-    }
+def create_backup():
+    """Tworzy kopię zapasową bazy danych, zwraca komunikat dla użytkownika (None = błąd)"""
+    try:
+        backup, created = store.create_backup()
+    except Exception as e:
+        st.error(f"Błąd tworzenia backupu: {e}")
+        return None
+    if backup is None:
+        return None
+    return "✅ Backup utworzony!" if created else "✅ Bez zmian od ostatniego backupu - nic nie zapisano"
+
+# --- WSPÓLNY MAGAZYN DANYCH (JEDEN NA PROCES) ---
+@st.cache_resource
+def get_store():
+    """Zwraca magazyn danych wspólny dla wszystkich sesji procesu"""
+    return FleetStore()
+
+@st.cache_resource
+def get_shards():
+    """Zwraca zbiór shardów lokalizacji wspólny dla procesu (None, gdy dane nie są podzielone na hale)"""
+    return ShardSet() if storage.read_shard_manifest() else None
+
+def on_select_shard():
+    """Obsługa wyboru hali - wybór trzymany poza stanem widżetu"""
+    st.session_state.shard = st.session_state.shard_select
+
+# Dane podzielone na hale (tools/shard_by_location.py): sesja wczytuje tylko wybraną halę
+shards = get_shards()
+shard_locations = shards.locations() if shards is not None else []
+if shards is not None and st.session_state.get('shard') not in shard_locations:
+    # Hala z adresu (?hala=...) albo pierwsza z listy
+    requested = st.query_params.get("hala")
+    st.session_state.shard = requested if requested in shard_locations else shard_locations[0]
+shard = st.session_state.shard if shards is not None else None
+
+store = shards.store(shard) if shards is not None else get_store()
+if profiler is not None:
+    instrument_store(profiler, store)
 
-# Inicjalizacja danych z automatycznym zapisem/odczytem
-if 'data' not in st.session_state:
-    st.session_state.data = load_database()
-if 'history' not in st.session_state:
-    st.session_state.history = load_history()
+# Zapis odroczony: przyrosty cykli z okna N sekund sumowane w jeden zapis (0 = zapis od razu)
+WRITE_BEHIND_SECONDS = float(os.environ.get("WARSZTAT_WRITE_BEHIND_SECONDS", "0"))
+
+@st.cache_resource
+def get_cycle_buffer(location=None):
+    """Zwraca bufor przyrostów cykli wspólny dla sesji procesu - osobny dla każdej hali (None gdy zapis odroczony wyłączony)"""
+    if WRITE_BEHIND_SECONDS <= 0:
+        return None
+    buffer = CycleBuffer(store, interval=WRITE_BEHIND_SECONDS).start()
+    # Zamknięcie serwera zapisuje zawartość bufora
+    atexit.register(buffer.stop)
+    return buffer
+
+cycle_buffer = get_cycle_buffer(shard)
+
+@st.cache_resource
+def get_status_cache(location=None):
+    """Zwraca pamięć zestawienia statusów wspólną dla wszystkich sesji procesu - osobną dla każdej hali"""
+    return StatusCache()
+
+@st.cache_resource
+def get_shard_rollups():
+    """Zwraca zestawienia hal do widoku całej floty, wspólne dla procesu"""
+    return ShardRollups(shards, get_status_cache)
+
+@st.cache_resource
+def get_metrics_exporter(location=None):
+    """Zwraca zapis metryk do pliku .prom wspólny dla procesu (None gdy WARSZTAT_METRICS_FILE nie jest ustawiony)"""
+    if not METRICS_FILE:
+        return None
+    # Czasy odczytu i zapisu w metrykach pochodzą z profilera podpiętego do backendu
+    metrics_profiler = get_profiler()
+    instrument_store(metrics_profiler, store)
+    metrics_file, labels = METRICS_FILE, None
+    if location is not None:
+        # Plik metryk każdej hali obok pliku z ustawienia, np. metrics.hala-a.prom
+        metrics_path = Path(METRICS_FILE)
+        metrics_file = metrics_path.with_name(f"{metrics_path.stem}.{store.paths.root.name}{metrics_path.suffix}")
+        labels = {"shard": location}
+    exporter = MetricsExporter(store, get_status_cache(location), metrics_profiler, labels)
+    exporter.start(metrics_file, METRICS_INTERVAL)
+    atexit.register(exporter.stop)
+    return exporter
+
+get_metrics_exporter(shard)
+
+# Stan sesji: tylko ustawienia widoku i kopia robocza dla niezapisanych zmian konfiguracji
 if 'unsaved_changes' not in st.session_state:
     st.session_state.unsaved_changes = False
+if 'pending_ops' not in st.session_state:
+    st.session_state.pending_ops = []
 if 'config_authenticated' not in st.session_state:
     st.session_state.config_authenticated = False
 
 # --- FUNKCJE OPERACYJNE ---
+def run_operation(op, action=None):
+    """Wykonuje operację na wspólnych danych i uwzględnia ją w kopii roboczej"""
+    try:
+        machine = store.submit([op], action)[0]
+    except Exception as e:
+        st.error(f"Błąd zapisu bazy danych: {e}")
+        return None
+    if machine is not None and st.session_state.unsaved_changes:
+        st.session_state.draft.follow(op, machine)
+    return machine
+
+def get_draft():
+    """Kopia robocza bazy dla konfiguracji (copy-on-write) - odświeżana, gdy brak niezapisanych zmian"""
+    if not st.session_state.unsaved_changes and st.session_state.get('draft_version') != (shard, store.version):
+        with store.lock:
+            st.session_state.draft = FleetDraft(store.data)
+            st.session_state.draft_version = (shard, store.version)
+    return st.session_state.draft.data
+
+def stage_operation(op):
+    """Wykonuje edycję na kopii roboczej i odkłada ją do zapisu przyciskiem 'Zapisz zmiany'"""
+    with store.lock:
+        # Pierwsza zmiana maszyny kopiuje ją ze wspólnych danych - spójny stan pod blokadą
+        st.session_state.draft.apply(op)
+    st.session_state.pending_ops.append(op)
+    st.session_state.unsaved_changes = True
+
+def discard_draft():
+    """Porzuca niezapisane zmiany konfiguracji"""
+    st.session_state.pending_ops = []
+    st.session_state.unsaved_changes = False
+    st.session_state.pop('draft_version', None)
+
 def add_cycle(machine_id, cycles):
     """Dodaje cykle do wszystkich interwałów cyklicznych"""
-    for machine in st.session_state.data['machines']:
-        if machine['id'] == machine_id:
-            for interval in machine['service_intervals']:
-                if interval['type'] == 'cycles' and interval['enabled']:
-                    interval['current_value'] += cycles
-            
-            # Dodaj do historii
-            st.session_state.history.insert(0, {
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "machine": machine['name'],
-                "action": f"Dodano {cycles} cykli",
-                "user": "System"
-            })
-            
-            # Automatyczny zapis
-            save_database(st.session_state.data)
-            save_history(st.session_state.history)
-            break
+    if cycle_buffer is not None:
+        cycle_buffer.add(machine_id, cycles)
+        return
+    run_operation(
+        {"op": "add_cycles", "machine_id": machine_id, "cycles": cycles},
+        f"Dodano {cycles} cykli"
+    )
 
 def reset_service_interval(machine_id, interval_name):
     """Resetuje konkretny interwał serwisowy"""
-    for machine in st.session_state.data['machines']:
-        if machine['id'] == machine_id:
-            for interval in machine['service_intervals']:
-                if interval['name'] == interval_name:
-                    interval['current_value'] = 0
-                    interval['last_service'] = str(datetime.now().date())
-                    
-                    # Dodaj do historii
-                    st.session_state.history.insert(0, {
-                        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        "machine": machine['name'],
-                        "action": f"Wykonano: {interval_name}",
-                        "user": "System"
-                    })
-                    
-                    # Automatyczny zapis
-                    save_database(st.session_state.data)
-                    save_history(st.session_state.history)
-                    break
-            break
+    if store.index.interval(machine_id, interval_name) is None:
+        return
+    
+    run_operation(
+        {"op": "reset_interval", "machine_id": machine_id, "interval": interval_name,
+         "date": str(datetime.now().date())},
+        f"Wykonano: {interval_name}"
+    )
 
-def get_machine_critical_status(machine):
+def get_machine_critical_status(fleet, machine_idx):
     """Zwraca najwyższy status krytyczny dla maszyny"""
-    max_status = 0
-    critical_intervals = []
+    return fleet.critical_status(machine_idx)
+
+def current_fleet_status():
+    """Zestawienie statusów po doczytaniu zmian innych procesów (przeliczane tylko po zmianie danych lub dnia)"""
+    with store.lock:
+        store.sync()
+        return get_status_cache(shard).get(store)
+
+# --- FRAGMENTY (CZĘŚCIOWE PRZEBIEGI) ---
+# Akcje w karcie maszyny przeliczają tylko kartę i liczniki w pasku bocznym, nie całą stronę
+CARD_FRAGMENTS = ["machine_card", "fleet_status_sidebar"]
+
+def on_add_cycles(machine_id):
+    """Obsługa przycisku rejestracji cykli"""
+    cycles = st.session_state.cycles_input
+    add_cycle(machine_id, cycles)
+    st.session_state.card_notice = f"Dodano {cycles} cykli"
+    st.rerun(CARD_FRAGMENTS)
+
+def on_reset_interval(machine_id, interval_name):
+    """Obsługa przycisku szybkiej akcji"""
+    reset_service_interval(machine_id, interval_name)
+    st.session_state.card_notice = f"Wykonano: {interval_name}"
+    st.rerun(CARD_FRAGMENTS)
+
+@st.fragment(key="fleet_status_sidebar")
+@profiled("fragment: panel boczny")
+def fleet_status_sidebar():
+    """Liczniki alertów i oczekujące zapisy w pasku bocznym"""
+    critical_count, warning_count = current_fleet_status().counts()
+    
+    st.markdown("#### STATUS FLOTY")
+    if critical_count > 0:
+        st.error(f"🚨 Krytyczne: {critical_count}")
+    if warning_count > 0:
+        st.warning(f"⚠️ Ostrzeżenia: {warning_count}")
+    if critical_count == 0 and warning_count == 0:
+        st.success(f"✅ Wszystko OK")
     
-    for interval_data in machine['service_intervals']:
-        interval = ServiceInterval(**interval_data)
-        status = interval.get_status()
-        if status > max_status:
-            max_status = status
-        if status == 2:
-            critical_intervals.append(interval.name)
+    st.markdown("---")
+    st.markdown("#### 💾 SYSTEM ZAPISU")
+    if store.backend.database_file.exists():
+        file_time = datetime.fromtimestamp(store.backend.database_file.stat().st_mtime)
+        st.caption(f"Ostatni zapis: {file_time.strftime('%d.%m %H:%M')}")
+        st.caption(f"Rewizja danych: {store.revision}")
+    else:
+        st.caption("Brak zapisanej bazy")
+    
+    # Zapis odroczony - przyrosty cykli czekające w buforze
+    if cycle_buffer is not None:
+        pending = cycle_buffer.pending()
+        if pending:
+            st.warning(f"⏳ Oczekujące zapisy: {sum(pending.values())} cykli ({len(pending)} maszyn)")
+            if st.button("💾 Zapisz teraz", use_container_width=True):
+                try:
+                    cycle_buffer.flush()
+                except Exception as e:
+                    st.error(f"Błąd zapisu bazy danych: {e}")
+                else:
+                    st.rerun()
+        else:
+            st.caption(f"Oczekujące zapisy: brak (zapis co {WRITE_BEHIND_SECONDS:g} s)")
+
+@st.fragment
+def machine_tile(machine_id):
+    """Kafelek maszyny na panelu głównym - kliknięcie przelicza tylko ten kafelek"""
+    # Przebieg samego kafelka też doczytuje zmiany innych procesów; maszyna i jej pozycja z tych samych danych
+    with store.lock:
+        fleet = current_fleet_status()
+        machine = store.index.machine(machine_id)
+        if machine is None:
+            return
+        idx = store.index.position(machine_id)
+    
+    with st.container(border=True):
+        # Nagłówek z statusem
+        machine_status, critical_intervals = get_machine_critical_status(fleet, idx)
+        status_color = get_status_color(machine_status)
+        status_label = get_status_label(machine_status)
+        
+        col_name, col_status = st.columns([3, 1])
+        col_name.markdown(f"### {machine['name']}")
+        col_status.markdown(f"<div class='status-badge badge-{'critical' if machine_status == 2 else 'warning' if machine_status == 1 else 'ok'}'>{status_label}</div>", unsafe_allow_html=True)
+        
+        st.caption(f"📍 {machine['location']} | 🏭 {machine['model']}")
+        
+        st.markdown("---")
+        
+        # Interwały serwisowe
+        if len(machine['service_intervals']) > 0:
+            st.markdown("#### Interwały serwisowe:")
+            
+            rows = fleet.machine_rows(idx)
+            for interval in rows[rows['enabled']].itertuples():
+                col_label, col_value = st.columns([2, 1])
+                col_label.caption(interval.name)
+                
+                if interval.type == 'cycles':
+                    col_value.write(f"{interval.current_value}/{interval.interval}")
+                else:
+                    col_value.write(f"{int(interval.remaining_days)} dni")
+                
+                # Pasek postępu z kolorem
+                progress_color = get_status_color(interval.status)
+                st.progress(interval.progress)
+        else:
+            st.caption("Brak skonfigurowanych interwałów")
+        
+        st.markdown("")
+        
+        # Przycisk akcji
+        if st.button(f"Otwórz kartę", key=f"open_{machine['id']}", use_container_width=True, type="primary"):
+            st.session_state.selected_machine = machine['id']
+
+@st.fragment(key="machine_card")
+@profiled("fragment: karta maszyny")
+def machine_card(machine_id):
+    """Operacje i status interwałów maszyny - akcje przeliczają tylko ten fragment"""
+    machine = store.index.machine(machine_id)
+    if machine is None:
+        st.warning("Maszyna została usunięta")
+        return
+    interval_rows = current_fleet_status().machine_rows(store.index.position(machine_id))
+    enabled_rows = interval_rows[interval_rows['enabled']]
+    
+    # Dwie kolumny: Operacje i Interwały
+    col_left, col_right = st.columns([1, 2])
+    
+    with col_left:
+        st.markdown("### 📝 OPERACJE")
+        
+        # Potwierdzenie ostatniej akcji (komunikat z obsługi przycisku)
+        notice = st.session_state.pop('card_notice', None)
+        if notice:
+            st.success(notice)
+        
+        with st.container(border=True):
+            st.markdown("#### Rejestracja cykli")
+            st.number_input("Liczba wykonanych cykli:", min_value=1, step=1, value=1, key="cycles_input")
+            
+            st.button("✅ Zatwierdź wpis", key="add_cycles", use_container_width=True, type="primary",
+                      on_click=on_add_cycles, args=(machine['id'],))
+            
+            if cycle_buffer is not None:
+                pending_cycles = cycle_buffer.pending().get(machine['id'])
+                if pending_cycles:
+                    st.caption(f"⏳ Oczekuje na zapis: +{pending_cycles} cykli")
+        
+        st.markdown("")
+        
+        with st.container(border=True):
+            st.markdown("#### Szybkie akcje")
+            
+            if len(machine['service_intervals']) > 0:
+                for interval in enabled_rows.itertuples():
+                    button_type = "primary" if interval.status == 2 else "secondary"
+                    button_label = f"🛠️ {interval.name}"
+                    
+                    st.button(button_label, key=f"reset_{machine['id']}_{interval.name}", use_container_width=True,
+                              on_click=on_reset_interval, args=(machine['id'], interval.name))
+            else:
+                st.caption("Brak skonfigurowanych interwałów")
     
-    return max_status, critical_intervals
+    with col_right:
+        st.markdown("### 📊 STATUS INTERWAŁÓW")
+        
+        if len(machine['service_intervals']) > 0:
+            # Szczegółowy widok każdego interwału
+            for interval in enabled_rows.itertuples():
+                status = interval.status
+                
+                with st.expander(f"**{interval.name}** - {get_status_label(status)}", expanded=(status == 2)):
+                    col_a, col_b = st.columns(2)
+                    
+                    with col_a:
+                        if interval.type == 'cycles':
+                            st.metric("Aktualny stan", f"{interval.current_value}/{interval.interval} cykli")
+                            st.metric("Pozostało", f"{int(interval.remaining_cycles)} cykli")
+                        else:
+                            st.metric("Następny termin", interval.next_due.strftime("%d.%m.%Y"))
+                            st.metric("Pozostało", f"{int(interval.remaining_days)} dni")
+                    
+                    with col_b:
+                        st.metric("Ostatni serwis", interval.last_service)
+                        st.metric("Status", get_status_label(status))
+                    
+                    st.progress(interval.progress)
+                    
+                    # Prognoza
+                    if interval.type == 'cycles' and machine['avg_daily_cycles'] > 0:
+                        days_to_service = int(interval.remaining_days)
+                        service_date = interval.next_due
+                        st.info(f"📅 Estymowany termin serwisu: **{service_date.strftime('%d.%m.%Y')}** (za {days_to_service} dni)")
+            
+            st.markdown("---")
+            machine_forecast(machine['id'])
+        else:
+            st.info("Brak skonfigurowanych interwałów dla tej maszyny.")
+
+@st.fragment
+@profiled("fragment: prognoza")
+def machine_forecast(machine_id):
+    """Prognoza maszyny - zmiana horyzontu przelicza tylko tabelę prognozy"""
+    machine = store.index.machine(machine_id)
+    if machine is None:
+        return
+    interval_rows = get_status_cache(shard).get(store).machine_rows(store.index.position(machine_id))
+    
+    # Prognoza 14-dniowa
+    horizon = st.slider("Horyzont prognozy (dni)", FORECAST_MIN_DAYS, FORECAST_MAX_DAYS, 14, key="forecast_horizon")
+    st.markdown(f"### 📈 PROGNOZA {horizon}-DNIOWA")
+    
+    if machine['avg_daily_cycles'] <= 0:
+        st.info("⚠️ Prognoza niedostępna - maszyna nie ma cykli dziennych (avg_daily_cycles = 0). Pokazane zostaną tylko przeglądy czasowe.")
+    
+    events = compute_forecast(interval_rows, horizon)
+    df_forecast = forecast_table(events, horizon)
+    
+    def highlight_forecast(val):
+        if 'SERWIS' in str(val) or 'PRZEGLĄD' in str(val):
+            return 'background-color: rgba(239, 68, 68, 0.3); color: #ef4444; font-weight: 600'
+        return ''
+    
+    st.dataframe(
+        df_forecast.style.map(highlight_forecast, subset=['Status']),
+        use_container_width=True,
+        hide_index=True,
+        height=520
+    )
+
+profile_lap("magazyn i funkcje")
 
 # --- SIDEBAR ---
 st.sidebar.markdown("### 🔧 WARSZTAT ZIOŁOLEK")
 st.sidebar.markdown("#### System Utrzymania Ruchu")
 st.sidebar.markdown("---")
 
+if shards is not None:
+    # Zmiana hali wczytuje tylko jej shard; niezapisane zmiany konfiguracji dotyczą bieżącej hali
+    st.sidebar.selectbox("🏭 HALA", shard_locations, index=shard_locations.index(shard), key="shard_select",
+                         on_change=on_select_shard, disabled=st.session_state.unsaved_changes,
+                         help="Najpierw zapisz lub porzuć zmiany konfiguracji" if st.session_state.unsaved_changes else None)
+    st.sidebar.markdown("---")
+
 view = st.sidebar.radio(
     "NAWIGACJA",
-    ["🏠 Panel Główny", "🔧 Karta Maszyny", "⚙️ Konfiguracja", "📊 Historia"],
+    ["🏠 Panel Główny", "🔧 Karta Maszyny", "📅 Kalendarz", "⚙️ Konfiguracja", "📊 Historia"]
+    + (["🌐 Wszystkie hale"] if shards is not None else []),
     label_visibility="visible"
 )
 
@@ -599,37 +825,21 @@ st.sidebar.markdown("---")
 st.sidebar.markdown(f"**Data systemu:** {datetime.now().strftime('%d.%m.%Y')}")
 st.sidebar.markdown(f"**Godzina:** {datetime.now().strftime('%H:%M:%S')}")
 
-# Liczniki alertów
-critical_count = 0
-warning_count = 0
-for machine in st.session_state.data['machines']:
-    status, _ = get_machine_critical_status(machine)
-    if status == 2:
-        critical_count += 1
-    elif status == 1:
-        warning_count += 1
-
 st.sidebar.markdown("---")
-st.sidebar.markdown("#### STATUS FLOTY")
-if critical_count > 0:
-    st.sidebar.error(f"🚨 Krytyczne: {critical_count}")
-if warning_count > 0:
-    st.sidebar.warning(f"⚠️ Ostrzeżenia: {warning_count}")
-if critical_count == 0 and warning_count == 0:
-    st.sidebar.success(f"✅ Wszystko OK")
 
-st.sidebar.markdown("---")
-st.sidebar.markdown("#### 💾 SYSTEM ZAPISU")
-if DATABASE_FILE.exists():
-    file_time = datetime.fromtimestamp(DATABASE_FILE.stat().st_mtime)
-    st.sidebar.caption(f"Ostatni zapis: {file_time.strftime('%d.%m %H:%M')}")
-else:
-    st.sidebar.caption("Brak zapisanej bazy")
+# Liczniki alertów i stan zapisu - fragment odświeżany osobno po akcjach w karcie maszyny
+with st.sidebar:
+    fleet_status_sidebar()
+profile_lap("panel boczny")
+fleet_status = get_status_cache(shard).get(store)
+critical_count, warning_count = fleet_status.counts()
+profile_lap("status floty")
 
 # Przycisk tworzenia backupu
 if st.sidebar.button("📦 Utwórz Backup", use_container_width=True):
-    if create_backup():
-        st.sidebar.success("✅ Backup utworzony!")
+    message = create_backup()
+    if message:
+        st.sidebar.success(message)
     else:
         st.sidebar.error("❌ Błąd backupu")
 
@@ -637,39 +847,36 @@ if st.sidebar.button("📦 Utwórz Backup", use_container_width=True):
 if view == "🏠 Panel Główny":
     st.title("DASHBOARD UTRZYMANIA RUCHU")
     
-    if len(st.session_state.data['machines']) == 0:
+    if len(store.data['machines']) == 0:
         st.info("ℹ️ **Brak maszyn w systemie.** Przejdź do zakładki **Konfiguracja** (wymagane hasło: 1111) aby dodać pierwsze maszyny.")
     else:
         # Sekcja alertów
-        alerts_critical = []
-        alerts_warning = []
+        status_rows = fleet_status.intervals
+        critical_rows = status_rows[status_rows['status'] == 2]
+        warning_rows = status_rows[status_rows['status'] == 1]
         
-        for machine in st.session_state.data['machines']:
-            for interval_data in machine['service_intervals']:
-                interval = ServiceInterval(**interval_data)
-                status = interval.get_status()
-                
-                if status == 2:
-                    alerts_critical.append(f"**{machine['name']}** - {interval.name}")
-                elif status == 1:
-                    alerts_warning.append(f"**{machine['name']}** - {interval.name}")
+        def alert_list(rows):
+            """Lista alertów jednym elementem - przy dużej flocie tylko pierwsze MAX_LISTED_ALERTS pozycji"""
+            shown = rows.head(MAX_LISTED_ALERTS)
+            lines = [f"- **{m}** - {n}" for m, n in zip(shown['machine'], shown['name'])]
+            if len(rows) > len(shown):
+                lines.append(f"- ... i {len(rows) - len(shown)} kolejnych (zawęź listę maszyn filtrem statusu)")
+            st.markdown("\n".join(lines))
         
         # Wyświetlanie alertów
         col_alert1, col_alert2 = st.columns(2)
         
         with col_alert1:
-            if alerts_critical:
-                st.error(f"### 🚨 PILNE INTERWENCJE ({len(alerts_critical)})")
-                for alert in alerts_critical:
-                    st.markdown(f"- {alert}")
+            if len(critical_rows):
+                st.error(f"### 🚨 PILNE INTERWENCJE ({len(critical_rows)})")
+                alert_list(critical_rows)
             else:
                 st.success("### ✅ Brak krytycznych alertów")
         
         with col_alert2:
-            if alerts_warning:
-                st.warning(f"### ⚠️ OSTRZEŻENIA ({len(alerts_warning)})")
-                for alert in alerts_warning:
-                    st.markdown(f"- {alert}")
+            if len(warning_rows):
+                st.warning(f"### ⚠️ OSTRZEŻENIA ({len(warning_rows)})")
+                alert_list(warning_rows)
             else:
                 st.info("### ℹ️ Brak ostrzeżeń")
         
@@ -680,7 +887,7 @@ if view == "🏠 Panel Główny":
         
         col1, col2, col3, col4 = st.columns(4)
         
-        total_machines = len(st.session_state.data['machines'])
+        total_machines = len(store.data['machines'])
         machines_ok = total_machines - critical_count - warning_count
         
         col1.metric("Maszyny w systemie", total_machines, delta=None)
@@ -690,80 +897,99 @@ if view == "🏠 Panel Główny":
         
         st.markdown("---")
         
-        # Lista maszyn - kafelki
+        # Lista maszyn - kafelki tylko dla widocznej strony, od najpilniejszych
         st.subheader("STATUS MASZYN")
         
-        cols = st.columns(2)
-        for idx, machine in enumerate(st.session_state.data['machines']):
-            col = cols[idx % 2]
-            
-            with col:
-                with st.container(border=True):
-                    # Nagłówek z statusem
-                    machine_status, critical_intervals = get_machine_critical_status(machine)
-                    status_color = get_status_color(machine_status)
-                    status_label = get_status_label(machine_status)
-                    
-                    col_name, col_status = st.columns([3, 1])
-                    col_name.markdown(f"### {machine['name']}")
-                    col_status.markdown(f"<div class='status-badge badge-{'critical' if machine_status == 2 else 'warning' if machine_status == 1 else 'ok'}'>{status_label}</div>", unsafe_allow_html=True)
-                    
-                    st.caption(f"📍 {machine['location']} | 🏭 {machine['model']}")
-                    
-                    st.markdown("---")
-                    
-                    # Interwały serwisowe
-                    if len(machine['service_intervals']) > 0:
-                        st.markdown("#### Interwały serwisowe:")
-                        
-                        for interval_data in machine['service_intervals']:
-                            if interval_data['enabled']:
-                                interval = ServiceInterval(**interval_data)
-                                status = interval.get_status()
-                                progress = interval.get_progress()
-                                
-                                col_label, col_value = st.columns([2, 1])
-                                col_label.caption(interval.name)
-                                
-                                if interval.type == 'cycles':
-                                    col_value.write(f"{interval.current_value}/{interval.interval}")
-                                else:
-                                    last = datetime.strptime(interval.last_service, "%Y-%m-%d").date()
-                                    next_date = add_months(last, interval.interval)
-                                    days = (next_date - datetime.now().date()).days
-                                    col_value.write(f"{days} dni")
-                                
-                                # Pasek postępu z kolorem
-                                progress_color = get_status_color(status)
-                                st.progress(progress)
-                    else:
-                        st.caption("Brak skonfigurowanych interwałów")
-                    
-                    st.markdown("")
-                    
-                    # Przycisk akcji
-                    if st.button(f"Otwórz kartę", key=f"open_{machine['id']}", use_container_width=True, type="primary"):
-                        st.session_state.selected_machine = machine['id']
-                        st.rerun()
+        machines = store.data['machines']
+        locations = np.array([m['location'] for m in machines], dtype=object)
+        models = np.array([m['model'] for m in machines], dtype=object)
+        
+        col_f1, col_f2, col_f3, col_f4 = st.columns(4)
+        with col_f1:
+            status_filter = st.multiselect("Status", [2, 1, 0], format_func=get_status_label, placeholder="Wszystkie")
+        with col_f2:
+            location_filter = st.multiselect("Lokalizacja", sorted(set(locations)), placeholder="Wszystkie")
+        with col_f3:
+            model_filter = st.multiselect("Model", sorted(set(models)), placeholder="Wszystkie")
+        with col_f4:
+            page_size = st.selectbox("Maszyn na stronę", [10, 20, 50, 100], index=1)
+        
+        matching = np.ones(len(machines), dtype=bool)
+        if status_filter:
+            matching &= np.isin(fleet_status.machine_status, status_filter)
+        if location_filter:
+            matching &= np.isin(locations, location_filter)
+        if model_filter:
+            matching &= np.isin(models, model_filter)
+        order = fleet_status.urgency_order(np.flatnonzero(matching))
+        
+        total = len(order)
+        pages = max(1, -(-total // page_size))
+        page = min(st.session_state.get('dashboard_page', 1), pages)
+        
+        col_p1, col_p2 = st.columns([1, 3])
+        with col_p1:
+            st.number_input(f"Strona (z {pages})", min_value=1, max_value=pages, value=page, key="dashboard_page")
+        with col_p2:
+            st.markdown(f"Znaleziono **{total}** z {len(machines)} maszyn - strona {page} z {pages}")
+        
+        if total == 0:
+            st.info("Brak maszyn spełniających filtry")
+        
+        with profile("kafelki maszyn"):
+            cols = st.columns(2)
+            for tile_idx, idx in enumerate(order[(page - 1) * page_size:page * page_size]):
+                with cols[tile_idx % 2]:
+                    machine_tile(machines[idx]['id'])
 
 # --- WIDOK 2: KARTA MASZYNY ---
 elif view == "🔧 Karta Maszyny":
     st.title("KARTA MASZYNY")
     
-    if len(st.session_state.data['machines']) == 0:
+    if len(store.data['machines']) == 0:
         st.info("ℹ️ **Brak maszyn w systemie.** Przejdź do zakładki **Konfiguracja** (wymagane hasło: 1111) aby dodać pierwsze maszyny.")
     else:
+        # Import zrzutów liczników ze sterowników - wszystkie maszyny jednym zapisem
+        with st.expander("📥 Import liczników z pliku (CSV / JSONL)"):
+            st.caption("Kolumny: machine_id, cycles, timestamp (CSV z nagłówkiem, separator , lub ;) lub obiekty JSON w kolejnych liniach.")
+            counters_file = st.file_uploader("Plik z licznikami", type=["csv", "jsonl", "ndjson"], key="cycles_import_file")
+            skip_invalid = st.checkbox("Pomiń błędne wiersze", key="cycles_import_skip")
+            
+            if counters_file is not None and st.button("📥 Importuj cykle", key="cycles_import", type="primary"):
+                try:
+                    st.session_state.cycles_import_result = import_cycles(store, counters_file, detect_format(counters_file.name), skip_invalid)
+                except Exception as e:
+                    st.error(f"Błąd importu: {e}")
+                else:
+                    # Odśwież statusy po imporcie - raport zostaje w stanie sesji
+                    st.rerun()
+            
+            result = st.session_state.get('cycles_import_result')
+            if result is not None:
+                if result.applied:
+                    st.success(f"Zaimportowano {sum(result.cycles.values())} cykli dla {len(result.cycles)} maszyn "
+                               f"({result.valid_rows} z {result.rows} wierszy, {result.first_timestamp} – {result.last_timestamp})")
+                elif result.error_count:
+                    st.error(f"Plik zawiera {result.error_count} błędnych wierszy - nic nie zaimportowano")
+                else:
+                    st.warning("Plik nie zawiera wierszy do importu")
+                
+                for line, message in result.errors:
+                    st.caption(f"Linia {line}: {message}")
+                if result.error_count > len(result.errors):
+                    st.caption(f"... i {result.error_count - len(result.errors)} kolejnych błędów")
+        
         # Wybór maszyny
-        machine_names = [m['name'] for m in st.session_state.data['machines']]
+        machine_ids = store.index.ids()
         
-        if 'selected_machine' in st.session_state:
-            default_machine = next((m for m in st.session_state.data['machines'] if m['id'] == st.session_state.selected_machine), None)
-            default_index = machine_names.index(default_machine['name']) if default_machine else 0
+        if store.index.machine(st.session_state.get('selected_machine')) is not None:
+            default_index = store.index.position(st.session_state.selected_machine)
         else:
             default_index = 0
         
-        selected_name = st.selectbox("**Wybierz maszynę:**", machine_names, index=default_index)
-        machine = next(m for m in st.session_state.data['machines'] if m['name'] == selected_name)
+        selected_id = st.selectbox("**Wybierz maszynę:**", machine_ids, index=default_index,
+                                   format_func=lambda machine_id: store.index.machine(machine_id)['name'])
+        machine = store.index.machine(selected_id)
         
         st.markdown("---")
         
@@ -775,170 +1001,55 @@ elif view == "🔧 Karta Maszyny":
         
         st.markdown("---")
         
-        # Dwie kolumny: Operacje i Interwały
-        col_left, col_right = st.columns([1, 2])
+        machine_card(selected_id)
+
+# --- WIDOK: KALENDARZ SERWISÓW ---
+elif view == "📅 Kalendarz":
+    st.title("KALENDARZ SERWISÓW")
+    
+    if len(store.data['machines']) == 0:
+        st.info("ℹ️ **Brak maszyn w systemie.** Przejdź do zakładki **Konfiguracja** aby dodać maszyny.")
+    else:
+        col_c1, col_c2 = st.columns([1, 2])
+        with col_c1:
+            horizon = st.slider("Horyzont (dni)", FORECAST_MIN_DAYS, FORECAST_MAX_DAYS, 14, key="calendar_horizon")
         
-        with col_left:
-            st.markdown("### 📝 OPERACJE")
-            
-            with st.container(border=True):
-                st.markdown("#### Rejestracja cykli")
-                cycles_to_add = st.number_input("Liczba wykonanych cykli:", min_value=1, step=1, value=1, key="cycles_input")
-                
-                if st.button("✅ Zatwierdź wpis", key="add_cycles", use_container_width=True, type="primary"):
-                    add_cycle(machine['id'], cycles_to_add)
-                    st.success(f"Dodano {cycles_to_add} cykli")
-                    st.rerun()
-            
-            st.markdown("")
-            
-            with st.container(border=True):
-                st.markdown("#### Szybkie akcje")
-                
-                if len(machine['service_intervals']) > 0:
-                    for interval_data in machine['service_intervals']:
-                        if interval_data['enabled']:
-                            interval = ServiceInterval(**interval_data)
-                            status = interval.get_status()
-                            
-                            button_type = "primary" if status == 2 else "secondary"
-                            button_label = f"🛠️ {interval.name}"
-                            
-                            if st.button(button_label, key=f"reset_{machine['id']}_{interval.name}", use_container_width=True):
-                                reset_service_interval(machine['id'], interval.name)
-                                st.success(f"Wykonano: {interval.name}")
-                                st.rerun()
-                else:
-                    st.caption("Brak skonfigurowanych interwałów")
+        # Prognoza całej floty liczona jednym przebiegiem i pamiętana do zmiany danych
+        events = get_status_cache(shard).forecast(store, horizon)
+        locations = sorted(events['location'].dropna().unique())
+        with col_c2:
+            location_filter = st.multiselect("Lokalizacje", locations, placeholder="Wszystkie")
+        if location_filter:
+            events = events[events['location'].isin(location_filter)]
+        
+        col_m1, col_m2, col_m3 = st.columns(3)
+        col_m1.metric("Zaplanowane serwisy", len(events))
+        col_m2.metric("Maszyny", events['machine_id'].nunique())
+        col_m3.metric("Zaległe (już wymagane)", int((events['status'] == 2).sum()))
         
-        with col_right:
-            st.markdown("### 📊 STATUS INTERWAŁÓW")
+        if events.empty:
+            st.success(f"✅ Brak serwisów w ciągu najbliższych {horizon} dni")
+        else:
+            agenda = events.sort_values(['date', 'location', 'machine', 'name'], kind='stable')
             
-            if len(machine['service_intervals']) > 0:
-                # Szczegółowy widok każdego interwału
-                for interval_data in machine['service_intervals']:
-                    if interval_data['enabled']:
-                        interval = ServiceInterval(**interval_data)
-                        status = interval.get_status()
-                        progress = interval.get_progress()
-                        
-                        with st.expander(f"**{interval.name}** - {get_status_label(status)}", expanded=(status == 2)):
-                            col_a, col_b = st.columns(2)
-                            
-                            with col_a:
-                                if interval.type == 'cycles':
-                                    st.metric("Aktualny stan", f"{interval.current_value}/{interval.interval} cykli")
-                                    remaining = interval.interval - interval.current_value
-                                    st.metric("Pozostało", f"{remaining} cykli")
-                                else:
-                                    last = datetime.strptime(interval.last_service, "%Y-%m-%d").date()
-                                    next_date = add_months(last, interval.interval)
-                                    days = (next_date - datetime.now().date()).days
-                                    st.metric("Następny termin", next_date.strftime("%d.%m.%Y"))
-                                    st.metric("Pozostało", f"{days} dni")
-                            
-                            with col_b:
-                                st.metric("Ostatni serwis", interval.last_service)
-                                st.metric("Status", get_status_label(status))
-                            
-                            st.progress(progress)
-                            
-                            # Prognoza
-                            if interval.type == 'cycles' and machine['avg_daily_cycles'] > 0:
-                                remaining = interval.interval - interval.current_value
-                                days_to_service = int(remaining / machine['avg_daily_cycles'])
-                                service_date = datetime.now().date() + timedelta(days=days_to_service)
-                                st.info(f"📅 Estymowany termin serwisu: **{service_date.strftime('%d.%m.%Y')}** (za {days_to_service} dni)")
-                
-                st.markdown("---")
-                
-                # Prognoza 14-dniowa
-                st.markdown("### 📈 PROGNOZA 14-DNIOWA")
-                
-                if machine['avg_daily_cycles'] > 0:
-                    forecast_data = []
-                    for i in range(1, 15):
-                        day = datetime.now().date() + timedelta(days=i)
-                        day_status = "OK"
-                        events = []
-                        
-                        # Sprawdź cykle
-                        predicted_cycles = machine['avg_daily_cycles'] * i
-                        for interval_data in machine['service_intervals']:
-                            if interval_data['enabled'] and interval_data['type'] == 'cycles':
-                                future_value = interval_data['current_value'] + predicted_cycles
-                                if future_value >= interval_data['interval']:
-                                    events.append(interval_data['name'])
-                                    day_status = "SERWIS"
-                        
-                        # Sprawdź daty
-                        for interval_data in machine['service_intervals']:
-                            if interval_data['enabled'] and interval_data['type'] == 'time':
-                                last = datetime.strptime(interval_data['last_service'], "%Y-%m-%d").date()
-                                next_date = add_months(last, interval_data['interval'])
-                                if day == next_date:
-                                    events.append(interval_data['name'])
-                                    day_status = "PRZEGLĄD"
-                        
-                        forecast_data.append({
-                            "Data": day.strftime("%d.%m (%a)"),
-                            "Status": day_status,
-                            "Zdarzenia": ", ".join(events) if events else "-"
-                        })
-                    
-                    df_forecast = pd.DataFrame(forecast_data)
-                    
-                    def highlight_forecast(val):
-                        if 'SERWIS' in str(val) or 'PRZEGLĄD' in str(val):
-                            return 'background-color: rgba(239, 68, 68, 0.3); color: #ef4444; font-weight: 600'
-                        return ''
-                    
-                    st.dataframe(
-                        df_forecast.style.map(highlight_forecast, subset=['Status']),
-                        use_container_width=True,
-                        hide_index=True,
-                        height=520
-                    )
-                else:
-                    st.info("⚠️ Prognoza niedostępna - maszyna nie ma cykli dziennych (avg_daily_cycles = 0). Pokazane zostaną tylko przeglądy czasowe.")
-                    
-                    # Pokaż tylko przeglądy czasowe
-                    forecast_data = []
-                    for i in range(1, 15):
-                        day = datetime.now().date() + timedelta(days=i)
-                        day_status = "OK"
-                        events = []
-                        
-                        # Sprawdź tylko daty
-                        for interval_data in machine['service_intervals']:
-                            if interval_data['enabled'] and interval_data['type'] == 'time':
-                                last = datetime.strptime(interval_data['last_service'], "%Y-%m-%d").date()
-                                next_date = add_months(last, interval_data['interval'])
-                                if day == next_date:
-                                    events.append(interval_data['name'])
-                                    day_status = "PRZEGLĄD"
-                        
-                        forecast_data.append({
-                            "Data": day.strftime("%d.%m (%a)"),
-                            "Status": day_status,
-                            "Zdarzenia": ", ".join(events) if events else "-"
-                        })
-                    
-                    df_forecast = pd.DataFrame(forecast_data)
-                    
-                    def highlight_forecast(val):
-                        if 'PRZEGLĄD' in str(val):
-                            return 'background-color: rgba(239, 68, 68, 0.3); color: #ef4444; font-weight: 600'
-                        return ''
-                    
-                    st.dataframe(
-                        df_forecast.style.map(highlight_forecast, subset=['Status']),
-                        use_container_width=True,
-                        hide_index=True,
-                        height=520
-                    )
-            else:
-                st.info("Brak skonfigurowanych interwałów dla tej maszyny.")
+            st.markdown("### 📊 SERWISY WG DNIA I LOKALIZACJI")
+            summary = pd.crosstab(agenda['date'].dt.strftime('%Y-%m-%d (%a)'), agenda['location'])
+            st.dataframe(summary, use_container_width=True)
+            
+            st.markdown("### 📅 AGENDA")
+            st.dataframe(
+                pd.DataFrame({
+                    "Data": agenda['date'].dt.strftime('%d.%m (%a)'),
+                    "Lokalizacja": agenda['location'],
+                    "Maszyna": agenda['machine'],
+                    "Interwał": agenda['name'],
+                    "Rodzaj": np.where(agenda['type'] == 'time', "PRZEGLĄD", "SERWIS"),
+                    "Uwagi": np.where(agenda['status'] == 2, "⚠️ zaległy", ""),
+                }),
+                use_container_width=True,
+                hide_index=True,
+                height=600
+            )
 
 # --- WIDOK 3: KONFIGURACJA ---
 elif view == "⚙️ Konfiguracja":
@@ -977,6 +1088,8 @@ elif view == "⚙️ Konfiguracja":
     
     st.markdown("---")
     
+    draft = get_draft()
+    
     # Ostrzeżenie o niezapisanych zmianach
     if st.session_state.unsaved_changes:
         st.warning("⚠️ **Masz niezapisane zmiany!** Kliknij 'Zapisz zmiany' aby je zachować.")
@@ -986,24 +1099,32 @@ elif view == "⚙️ Konfiguracja":
     
     with col_save:
         if st.button("💾 Zapisz zmiany", type="primary", use_container_width=True):
-            if save_database(st.session_state.data):
-                st.session_state.unsaved_changes = False
-                st.success("✅ Zmiany zapisane pomyślnie!")
-                st.rerun()
+            try:
+                results = store.submit(st.session_state.pending_ops) if st.session_state.pending_ops else []
+            except Exception as e:
+                st.error(f"❌ Błąd zapisu! {e}")
             else:
-                st.error("❌ Błąd zapisu!")
+                discard_draft()
+                rejected = results.count(None)
+                if rejected:
+                    # Operacje dotyczyły maszyn/interwałów zmienionych w międzyczasie przez inną sesję
+                    st.warning(f"⚠️ Zapisano zmiany, pominięto {rejected} nieaktualnych (dane zmieniono w innej sesji).")
+                else:
+                    st.success("✅ Zmiany zapisane pomyślnie!")
+                    st.rerun()
     
     with col_backup:
         if st.button("📦 Backup przed zmianami", use_container_width=True):
-            if create_backup():
-                st.success("✅ Backup utworzony!")
+            message = create_backup()
+            if message:
+                st.success(message)
             else:
                 st.error("❌ Błąd backupu!")
     
     with col_reset:
         if st.button("🔄 Odśwież dane", use_container_width=True):
-            st.session_state.data = load_database()
-            st.session_state.unsaved_changes = False
+            store.reload()
+            discard_draft()
             st.success("✅ Dane odświeżone!")
             st.rerun()
     
@@ -1014,47 +1135,35 @@ elif view == "⚙️ Konfiguracja":
     with tab1:
         st.subheader("Lista maszyn")
         
-        if len(st.session_state.data['machines']) > 0:
-            for idx, machine in enumerate(st.session_state.data['machines']):
+        if len(draft['machines']) > 0:
+            for idx, machine in enumerate(draft['machines']):
                 with st.expander(f"**{machine['name']}** ({machine['id']})", expanded=False):
                     col1, col2 = st.columns(2)
                     
                     with col1:
                         new_name = st.text_input("Nazwa", machine['name'], key=f"name_{idx}")
-                        new_location = st.text_input("Lokalizacja", machine['location'], key=f"loc_{idx}")
+                        # Przy podziale na hale lokalizacja wyznacza shard - przeniesienie maszyny to eksport i import
+                        new_location = st.text_input("Lokalizacja", machine['location'], key=f"loc_{idx}",
+                                                     disabled=shards is not None)
                         
                         if new_name != machine['name']:
-                            machine['name'] = new_name
-                            st.session_state.unsaved_changes = True
+                            stage_operation({"op": "update_machine", "machine_id": machine['id'], "fields": {"name": new_name}})
                         if new_location != machine['location']:
-                            machine['location'] = new_location
-                            st.session_state.unsaved_changes = True
+                            stage_operation({"op": "update_machine", "machine_id": machine['id'], "fields": {"location": new_location}})
                     
                     with col2:
                         new_model = st.text_input("Model", machine['model'], key=f"model_{idx}")
                         new_avg = st.number_input("Średnia dzienna cykli", value=machine['avg_daily_cycles'], min_value=0, key=f"avg_{idx}")
                         
                         if new_model != machine['model']:
-                            machine['model'] = new_model
-                            st.session_state.unsaved_changes = True
+                            stage_operation({"op": "update_machine", "machine_id": machine['id'], "fields": {"model": new_model}})
                         if new_avg != machine['avg_daily_cycles']:
-                            machine['avg_daily_cycles'] = new_avg
-                            st.session_state.unsaved_changes = True
+                            stage_operation({"op": "update_machine", "machine_id": machine['id'], "fields": {"avg_daily_cycles": new_avg}})
                     
                     if st.button(f"🗑️ Usuń maszynę", key=f"del_machine_{idx}"):
-                        if len(st.session_state.data['machines']) > 1:
+                        if len(draft['machines']) > 1:
                             deleted_name = machine['name']
-                            st.session_state.data['machines'].pop(idx)
-                            save_database(st.session_state.data)
-                            
-                            # Dodaj do historii
-                            st.session_state.history.insert(0, {
-                                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                                "machine": deleted_name,
-                                "action": "Usunięto maszynę z systemu",
-                                "user": "System"
-                            })
-                            save_history(st.session_state.history)
+                            run_operation({"op": "delete_machine", "machine_id": machine['id']}, "Usunięto maszynę z systemu")
                             
                             st.success(f"Usunięto maszynę: {deleted_name}")
                             st.rerun()
@@ -1066,26 +1175,17 @@ elif view == "⚙️ Konfiguracja":
         st.markdown("---")
         
         if st.button("➕ Dodaj nową maszynę", type="primary"):
-            new_id = f"M{len(st.session_state.data['machines'])+1:02d}"
+            # Przy podziale na hale ID z licznika całej floty - inaczej hale nadawałyby te same ID
+            new_id = shards.new_machine_id() if shards is not None else store.index.new_machine_id()
             new_machine = {
                 "id": new_id,
                 "name": f"Nowa maszyna {new_id}",
-                "location": "Hala X",
+                "location": shard or "Hala X",
                 "model": "Model",
                 "avg_daily_cycles": 0,
                 "service_intervals": []
             }
-            st.session_state.data['machines'].append(new_machine)
-            save_database(st.session_state.data)
-            
-            # Dodaj do historii
-            st.session_state.history.insert(0, {
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "machine": new_machine['name'],
-                "action": "Dodano nową maszynę do systemu",
-                "user": "System"
-            })
-            save_history(st.session_state.history)
+            run_operation({"op": "add_machine", "machine": new_machine}, "Dodano nową maszynę do systemu")
             
             st.success("Dodano nową maszynę!")
             st.rerun()
@@ -1093,9 +1193,11 @@ elif view == "⚙️ Konfiguracja":
     with tab2:
         st.subheader("Konfiguracja interwałów serwisowych")
         
-        if len(st.session_state.data['machines']) > 0:
-            selected_machine_name = st.selectbox("Wybierz maszynę:", [m['name'] for m in st.session_state.data['machines']], key="config_select")
-            machine = next(m for m in st.session_state.data['machines'] if m['name'] == selected_machine_name)
+        if len(draft['machines']) > 0:
+            draft_index = st.session_state.draft.index
+            selected_machine_id = st.selectbox("Wybierz maszynę:", draft_index.ids(), key="config_select",
+                                               format_func=lambda machine_id: draft_index.machine(machine_id)['name'])
+            machine = draft_index.machine(selected_machine_id)
             
             st.markdown("---")
             
@@ -1111,11 +1213,9 @@ elif view == "⚙️ Konfiguracja":
                             new_enabled = st.checkbox("Włączony", interval_data['enabled'], key=f"int_en_{machine['id']}_{idx}")
                             
                             if new_int_name != interval_data['name']:
-                                interval_data['name'] = new_int_name
-                                st.session_state.unsaved_changes = True
+                                stage_operation({"op": "update_interval", "machine_id": machine['id'], "index": idx, "interval": interval_data['name'], "fields": {"name": new_int_name}})
                             if new_enabled != interval_data['enabled']:
-                                interval_data['enabled'] = new_enabled
-                                st.session_state.unsaved_changes = True
+                                stage_operation({"op": "update_interval", "machine_id": machine['id'], "index": idx, "interval": interval_data['name'], "fields": {"enabled": new_enabled}})
                         
                         with col2:
                             new_type = st.selectbox("Typ", ['cycles', 'time'], index=0 if interval_data['type']=='cycles' else 1, key=f"int_type_{machine['id']}_{idx}")
@@ -1123,11 +1223,9 @@ elif view == "⚙️ Konfiguracja":
                             new_interval = st.number_input(interval_label, value=interval_data['interval'], min_value=1, key=f"int_val_{machine['id']}_{idx}")
                             
                             if new_type != interval_data['type']:
-                                interval_data['type'] = new_type
-                                st.session_state.unsaved_changes = True
+                                stage_operation({"op": "update_interval", "machine_id": machine['id'], "index": idx, "interval": interval_data['name'], "fields": {"type": new_type}})
                             if new_interval != interval_data['interval']:
-                                interval_data['interval'] = new_interval
-                                st.session_state.unsaved_changes = True
+                                stage_operation({"op": "update_interval", "machine_id": machine['id'], "index": idx, "interval": interval_data['name'], "fields": {"interval": new_interval}})
                         
                         with col3:
                             new_current = st.number_input("Bieżąca wartość", value=interval_data['current_value'], min_value=0, key=f"int_cur_{machine['id']}_{idx}")
@@ -1135,25 +1233,14 @@ elif view == "⚙️ Konfiguracja":
                                                                        key=f"int_date_{machine['id']}_{idx}").strftime("%Y-%m-%d")
                             
                             if new_current != interval_data['current_value']:
-                                interval_data['current_value'] = new_current
-                                st.session_state.unsaved_changes = True
+                                stage_operation({"op": "update_interval", "machine_id": machine['id'], "index": idx, "interval": interval_data['name'], "fields": {"current_value": new_current}})
                             if new_last != interval_data['last_service']:
-                                interval_data['last_service'] = new_last
-                                st.session_state.unsaved_changes = True
+                                stage_operation({"op": "update_interval", "machine_id": machine['id'], "index": idx, "interval": interval_data['name'], "fields": {"last_service": new_last}})
                         
                         if st.button(f"🗑️ Usuń interwał", key=f"del_int_{machine['id']}_{idx}"):
                             deleted_interval = interval_data['name']
-                            machine['service_intervals'].pop(idx)
-                            save_database(st.session_state.data)
-                            
-                            # Dodaj do historii
-                            st.session_state.history.insert(0, {
-                                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                                "machine": machine['name'],
-                                "action": f"Usunięto interwał: {deleted_interval}",
-                                "user": "System"
-                            })
-                            save_history(st.session_state.history)
+                            run_operation({"op": "delete_interval", "machine_id": machine['id'], "index": idx, "interval": deleted_interval},
+                                          f"Usunięto interwał: {deleted_interval}")
                             
                             st.success("Usunięto interwał")
                             st.rerun()
@@ -1184,17 +1271,8 @@ elif view == "⚙️ Konfiguracja":
                         "last_service": str(datetime.now().date()),
                         "enabled": True
                     }
-                    machine['service_intervals'].append(new_interval)
-                    save_database(st.session_state.data)
-                    
-                    # Dodaj do historii
-                    st.session_state.history.insert(0, {
-                        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        "machine": machine['name'],
-                        "action": f"Dodano interwał: {new_int_name}",
-                        "user": "System"
-                    })
-                    save_history(st.session_state.history)
+                    run_operation({"op": "add_interval", "machine_id": machine['id'], "interval": new_interval},
+                                  f"Dodano interwał: {new_int_name}")
                     
                     st.success("Dodano nowy interwał")
                     st.rerun()
@@ -1208,80 +1286,108 @@ elif view == "⚙️ Konfiguracja":
         
         with col_info1:
             st.markdown("#### 📊 Baza danych")
-            if DATABASE_FILE.exists():
-                file_size = DATABASE_FILE.stat().st_size
-                file_time = datetime.fromtimestamp(DATABASE_FILE.stat().st_mtime)
-                st.info(f"**Plik:** `{DATABASE_FILE}`\n\n**Rozmiar:** {file_size} bajtów\n\n**Ostatnia modyfikacja:** {file_time.strftime('%Y-%m-%d %H:%M:%S')}")
+            if store.paths.database.exists():
+                # Otwarcie zakładki to tylko stat() - treść czytana przy podglądzie lub pobraniu
+                file_stat = store.paths.database.stat()
+                file_time = datetime.fromtimestamp(file_stat.st_mtime)
+                compact = storage.snapshot_layout(store.paths.database) == 'compact'
+                layout = "kompaktowy (JSON Lines)" if compact else "czytelny (JSON)"
+                st.info(f"**Plik:** `{store.paths.database}`\n\n**Rozmiar:** {file_stat.st_size} bajtów\n\n**Układ:** {layout}\n\n**Ostatnia modyfikacja:** {file_time.strftime('%Y-%m-%d %H:%M:%S')}")
                 
                 # Podgląd zawartości
-                with st.expander("👁️ Podgląd JSON"):
-                    with open(DATABASE_FILE, 'r', encoding='utf-8') as f:
-                        st.code(f.read(), language='json')
+                file_preview(store.paths.database, "preview_database")
                 
-                # Pobieranie pliku
-                with open(DATABASE_FILE, 'r', encoding='utf-8') as f:
-                    st.download_button(
-                        label="📥 Pobierz database.json",
-                        data=f.read(),
-                        file_name=f"database_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                        mime="application/json",
-                        use_container_width=True
-                    )
+                # Pobieranie pliku - przy zaległym WAL pobierany jest nowy snapshot w układzie DATABASE_LAYOUT
+                if store.paths.wal.exists() and store.paths.wal.stat().st_size:
+                    compact = storage.DATABASE_LAYOUT == 'compact'
+                st.download_button(
+                    label="📥 Pobierz database.json",
+                    data=download_database,
+                    file_name=f"database_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{'jsonl' if compact else 'json'}",
+                    mime="application/x-ndjson" if compact else "application/json",
+                    on_click="ignore",
+                    use_container_width=True
+                )
+            elif store.backend.name == 'sqlite':
+                database_file = store.backend.database_file
+                file_size = database_file.stat().st_size
+                st.info(f"**Plik:** `{database_file}` (SQLite)\n\n**Rozmiar:** {file_size} bajtów\n\n**Rewizja:** {store.revision}")
+                
+                # Eksport bazy SQLite do tego samego formatu co database.json
+                st.download_button(
+                    label="📥 Pobierz bazę jako JSON",
+                    data=export_database,
+                    file_name=f"database_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                    mime="application/json",
+                    on_click="ignore",
+                    use_container_width=True
+                )
             else:
                 st.warning("Plik database.json nie istnieje")
         
         with col_info2:
             st.markdown("#### 📜 Historia")
-            if HISTORY_FILE.exists():
-                file_size = HISTORY_FILE.stat().st_size
-                file_time = datetime.fromtimestamp(HISTORY_FILE.stat().st_mtime)
-                st.info(f"**Plik:** `{HISTORY_FILE}`\n\n**Rozmiar:** {file_size} bajtów\n\n**Ostatnia modyfikacja:** {file_time.strftime('%Y-%m-%d %H:%M:%S')}")
+            if store.paths.history.exists():
+                file_stat = store.paths.history.stat()
+                file_time = datetime.fromtimestamp(file_stat.st_mtime)
+                st.info(f"**Plik:** `{store.paths.history}`\n\n**Rozmiar:** {file_stat.st_size} bajtów\n\n**Ostatnia modyfikacja:** {file_time.strftime('%Y-%m-%d %H:%M:%S')}")
                 
                 # Pobieranie pliku
-                with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
-                    st.download_button(
-                        label="📥 Pobierz history.json",
-                        data=f.read(),
-                        file_name=f"history_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                        mime="application/json",
-                        use_container_width=True
-                    )
+                st.download_button(
+                    label="📥 Pobierz history.jsonl",
+                    data=lambda path=store.paths.history: storage.read_file_bytes(path),
+                    file_name=f"history_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl",
+                    mime="application/x-ndjson",
+                    on_click="ignore",
+                    use_container_width=True
+                )
+            elif store.backend.name == 'sqlite':
+                st.info(f"**Historia w bazie:** `{store.backend.database_file}`\n\n**Wpisów:** {len(store.history)}")
+                st.download_button(
+                    label="📥 Pobierz history.jsonl",
+                    data=export_history,
+                    file_name=f"history_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl",
+                    mime="application/x-ndjson",
+                    on_click="ignore",
+                    use_container_width=True
+                )
             else:
-                st.warning("Plik history.json nie istnieje")
+                st.warning("Plik history.jsonl nie istnieje")
         
         st.markdown("---")
         
         st.markdown("#### 📦 Kopie zapasowe")
         
-        backups = sorted(BACKUP_DIR.glob("database_backup_*.json"), reverse=True)
+        backups = storage.list_backups(store.backups.backup_dir)
         
         if backups:
             st.info(f"Znaleziono {len(backups)} kopii zapasowych")
+            st.caption(f"Retencja: {storage.BACKUP_KEEP_LAST} ostatnich oraz najnowsza z każdej z "
+                       f"{storage.BACKUP_KEEP_HOURLY} godzin, {storage.BACKUP_KEEP_DAILY} dni i "
+                       f"{storage.BACKUP_KEEP_WEEKLY} tygodni. Kopia o niezmienionej treści nie jest zapisywana.")
             
             for backup in backups[:5]:  # Pokaż tylko 5 ostatnich
-                backup_time = datetime.strptime(backup.stem.replace("database_backup_", ""), "%Y%m%d_%H%M%S")
                 col_b1, col_b2, col_b3 = st.columns([3, 1, 1])
                 
-                col_b1.caption(f"📦 {backup_time.strftime('%Y-%m-%d %H:%M:%S')}")
+                size_kb = backup.path.stat().st_size / 1024
+                revision = f" | rewizja {backup.revision}" if backup.revision is not None else ""
+                col_b1.caption(f"📦 {backup.created.strftime('%Y-%m-%d %H:%M:%S')}{revision} | {size_kb:.1f} KB")
                 
-                with open(backup, 'r', encoding='utf-8') as f:
-                    col_b2.download_button(
-                        label="📥",
-                        data=f.read(),
-                        file_name=backup.name,
-                        mime="application/json",
-                        key=f"download_{backup.name}"
-                    )
+                col_b2.download_button(
+                    label="📥",
+                    data=lambda path=backup.path: storage.read_file_bytes(path),
+                    file_name=backup.path.name,
+                    mime="application/gzip" if backup.digest else "application/json",
+                    on_click="ignore",
+                    key=f"download_{backup.path.name}"
+                )
                 
-                if col_b3.button("♻️", key=f"restore_{backup.name}"):
-                    # Przywróć backup
-                    with open(backup, 'r', encoding='utf-8') as f:
-                        restored_data = json.load(f)
+                if col_b3.button("♻️", key=f"restore_{backup.path.name}"):
+                    # Przywróć backup - bieżąca baza trafia wcześniej do kopii (w tle)
+                    store.replace(storage.read_backup(backup))
+                    discard_draft()
                     
-                    st.session_state.data = restored_data
-                    save_database(restored_data)
-                    
-                    st.success(f"Przywrócono backup z {backup_time.strftime('%Y-%m-%d %H:%M:%S')}")
+                    st.success(f"Przywrócono backup z {backup.created.strftime('%Y-%m-%d %H:%M:%S')}")
                     st.rerun()
         else:
             st.warning("Brak kopii zapasowych")
@@ -1296,16 +1402,18 @@ elif view == "⚙️ Konfiguracja":
             
             with col_d1:
                 if st.button("🗑️ Wyczyść całą bazę danych", type="secondary"):
-                    create_backup()  # Najpierw backup
-                    st.session_state.data = get_initial_data()
-                    save_database(st.session_state.data)
-                    st.warning("Baza danych wyczyszczona! Utworzono backup.")
+                    # Magazyn zapisuje kopię bieżącej bazy w tle przed podmianą
+                    backup_path = store.replace(get_initial_data())
+                    discard_draft()
+                    if backup_path is not None:
+                        st.warning(f"Baza danych wyczyszczona! Kopia zapasowa: {backup_path.name}")
+                    else:
+                        st.warning("Baza danych wyczyszczona - bez kopii zapasowej (kopie wyłączone, pusta baza lub błąd zapisu kopii)")
                     st.rerun()
             
             with col_d2:
                 if st.button("🗑️ Wyczyść historię", type="secondary"):
-                    st.session_state.history = []
-                    save_history([])
+                    store.clear_history()
                     st.warning("Historia wyczyszczona!")
                     st.rerun()
 
@@ -1313,19 +1421,89 @@ elif view == "⚙️ Konfiguracja":
 elif view == "📊 Historia":
     st.title("HISTORIA OPERACJI")
     
-    if st.session_state.history:
-        st.markdown(f"Pokazano **{len(st.session_state.history)}** ostatnich operacji")
+    archived_months = storage.list_history_archives(store.paths)
+    if store.history or archived_months:
+        history = store.history
+        
+        # Filtry - listy wartości pochodzą z indeksów bieżącego segmentu, bez przeglądania wpisów
+        col_h1, col_h2, col_h3, col_h4 = st.columns(4)
+        with col_h1:
+            machine_names = set(m for m in history.by_machine if m) | {m['name'] for m in store.data['machines']}
+            machine_filter = st.selectbox("Maszyna", ["Wszystkie"] + sorted(machine_names))
+        with col_h2:
+            type_filter = st.selectbox("Rodzaj operacji", ["Wszystkie"] + [label for _, label in storage.ACTION_TYPES] + ["Inne"])
+        with col_h3:
+            user_filter = st.selectbox("Użytkownik", ["Wszyscy"] + sorted(u for u in history.by_user if u))
+        with col_h4:
+            date_range = st.date_input("Zakres dat", value=(), format="DD.MM.YYYY")
         
-        df_history = pd.DataFrame(st.session_state.history)
-        st.dataframe(df_history, use_container_width=True, hide_index=True)
+        if archived_months:
+            st.caption(f"Bez zakresu dat widoczny jest bieżący segment historii. "
+                       f"Archiwum: {len(archived_months)} mies. ({archived_months[0]} – {archived_months[-1]}) - wybierz zakres dat, aby je przeszukać.")
+        
+        col_p1, col_p2 = st.columns([1, 3])
+        with col_p1:
+            page_size = st.selectbox("Wpisów na stronę", [25, 50, 100, 250], index=1)
+        page = st.session_state.get('history_page', 1)
+        
+        filters = dict(
+            machine=None if machine_filter == "Wszystkie" else machine_filter,
+            action_type=None if type_filter == "Wszystkie" else type_filter,
+            user=None if user_filter == "Wszyscy" else user_filter,
+            date_from=date_range[0] if len(date_range) > 0 else None,
+            date_to=date_range[1] if len(date_range) > 1 else None
+        )
+        # Do tabeli trafia tylko widoczna strona
+        entries, total = store.query_history((page - 1) * page_size, page_size, **filters)
+        pages = max(1, -(-total // page_size))
+        if page > pages:
+            page = pages
+            entries, total = store.query_history((page - 1) * page_size, page_size, **filters)
+        with col_p2:
+            st.number_input(f"Strona (z {pages})", min_value=1, max_value=pages, value=page, key="history_page")
+        
+        st.markdown(f"Znaleziono **{total}** operacji - strona {page} z {pages}")
+        if entries:
+            df_history = pd.DataFrame(entries)
+            st.dataframe(df_history, use_container_width=True, hide_index=True)
+        else:
+            st.info("Brak operacji spełniających filtry")
         
         if st.button("🗑️ Wyczyść historię"):
-            st.session_state.history = []
-            save_history([])
+            store.clear_history()
             st.rerun()
     else:
         st.info("Brak zapisanych operacji w historii")
 
+# --- WIDOK 5: WSZYSTKIE HALE (DANE PODZIELONE NA LOKALIZACJE) ---
+elif view == "🌐 Wszystkie hale":
+    st.title("PRZEGLĄD WSZYSTKICH HAL")
+    
+    # Zestawienia per hala - shard niewczytany przez serwer i niezmieniony od zapisu zestawienia nie jest wczytywany
+    halls = get_shard_rollups().table()
+    
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Maszyny we wszystkich halach", int(halls['machines'].sum()))
+    col2.metric("Stan sprawny", int(halls['ok'].sum()))
+    col3.metric("Ostrzeżenia", int(halls['warning'].sum()))
+    col4.metric("Krytyczne", int(halls['critical'].sum()))
+    
+    st.markdown("---")
+    
+    st.dataframe(
+        halls.rename(columns={
+            'location': "Hala", 'machines': "Maszyny", 'ok': "OK", 'warning': "Ostrzeżenia", 'critical': "Krytyczne",
+            'intervals': "Interwały", 'overdue_intervals': "Zaległe interwały", 'source': "Źródło zestawienia"
+        }),
+        use_container_width=True,
+        hide_index=True
+    )
+    st.caption(f"Magazyny wczytane w tym procesie: {len(shards.stores)} z {len(shard_locations)}. "
+               "Pozostałe hale korzystają z zestawienia zapisanego w ich katalogu (summary.json), "
+               "dopóki ich dane się nie zmienią. Szczegóły hali - wybierz ją w panelu bocznym.")
+
+profile_lap(f"widok: {view}")
+
 # --- FOOTER ---
 st.markdown("---")
 st.markdown("""
@@ -1338,3 +1516,26 @@ st.markdown("""
         </p>
     </div>
 """, unsafe_allow_html=True)
+
+# --- PROFILOWANIE: ZESTAWIENIE PRZEBIEGU ---
+if profiler is not None:
+    run_total, run_sections = profiler.finish_run()
+    with st.sidebar.expander(f"⏱️ PROFIL PRZEBIEGU: {run_total * 1000:.0f} ms", expanded=False):
+        st.dataframe(
+            pd.DataFrame({
+                "Etap": ["\u2003" * depth + name for name, depth, _ in run_sections],
+                "ms": [round(seconds * 1000, 1) for _, _, seconds in run_sections],
+            }),
+            use_container_width=True,
+            hide_index=True
+        )
+        st.caption(f"Percentyle z ostatnich {profiler.window} pomiarów (ms)")
+        st.dataframe(pd.DataFrame.from_dict(profiler.stats(), orient='index'), use_container_width=True)
+        st.download_button(
+            label="📥 Eksport percentyli (JSON)",
+            data=profiler.export_json,
+            file_name=f"profil_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+            mime="application/json",
+            on_click="ignore",
+            use_container_width=True
+        )
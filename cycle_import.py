@@ -0,0 +1,140 @@
+"""Import liczników cykli z plików CSV/JSONL (zrzuty zmianowe ze sterowników) - niezależny od Streamlit"""
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import csv
+import io
+import json
+
+REQUIRED_COLUMNS = ('machine_id', 'cycles', 'timestamp')
+
+# Ile błędów zapamiętać do raportu - dalsze są tylko liczone
+MAX_REPORTED_ERRORS = 50
+
+
+@dataclass
+class ImportResult:
+    """Wynik walidacji i importu pliku z licznikami"""
+    rows: int = 0
+    valid_rows: int = 0
+    error_count: int = 0
+    errors: List[Tuple[int, str]] = field(default_factory=list)
+    cycles: Dict[str, int] = field(default_factory=dict)  # suma cykli per ID maszyny
+    row_counts: Dict[str, int] = field(default_factory=dict)
+    first_timestamp: Optional[str] = None
+    last_timestamp: Optional[str] = None
+    applied: bool = False
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+def detect_format(name):
+    """Format pliku po rozszerzeniu: 'jsonl' dla .jsonl/.ndjson, w pozostałych przypadkach 'csv'"""
+    return 'jsonl' if str(name).lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+
+def iter_rows(stream, fmt):
+    """Czyta kolejne wiersze (nr linii, słownik) z pliku tekstowego bez wczytywania całości"""
+    if fmt == 'jsonl':
+        for line_no, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield line_no, None
+                continue
+            yield line_no, row if isinstance(row, dict) else None
+        return
+
+    header = stream.readline()
+    delimiter = ';' if header.count(';') > header.count(',') else ','
+    columns = [column.strip().lower() for column in next(csv.reader([header], delimiter=delimiter), [])]
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if missing:
+        raise ValueError(f"Brak kolumn w nagłówku CSV: {', '.join(missing)}")
+
+    for line_no, values in enumerate(csv.reader(stream, delimiter=delimiter), start=2):
+        if not values:
+            continue
+        yield line_no, dict(zip(columns, values))
+
+def validate_rows(stream, fmt, index):
+    """Jeden przebieg po pliku: walidacja wierszy i sumowanie przyrostów per maszyna"""
+    result = ImportResult()
+    cycles, row_counts = result.cycles, result.row_counts
+
+    for line_no, row in iter_rows(stream, fmt):
+        result.rows += 1
+        if row is None:
+            result.add_error(line_no, "Nieprawidłowy wiersz")
+            continue
+
+        machine_id = str(row.get('machine_id', '')).strip()
+        if index.machine(machine_id) is None:
+            result.add_error(line_no, f"Nieznana maszyna: {machine_id or '(brak)'}")
+            continue
+
+        # Jak w ingest_server: tylko liczby całkowite - bez ucinania ułamków (2.7) i wartości logicznych (true)
+        value = row.get('cycles')
+        try:
+            if isinstance(value, bool) or not isinstance(value, (int, str)):
+                raise TypeError(value)
+            count = int(value)
+        except (TypeError, ValueError):
+            result.add_error(line_no, f"Nieprawidłowa liczba cykli: {value}")
+            continue
+        if count <= 0:
+            result.add_error(line_no, f"Liczba cykli musi być dodatnia: {count}")
+            continue
+
+        try:
+            timestamp = datetime.fromisoformat(str(row.get('timestamp', '')).strip()).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            result.add_error(line_no, f"Nieprawidłowy znacznik czasu: {row.get('timestamp')}")
+            continue
+
+        result.valid_rows += 1
+        cycles[machine_id] = cycles.get(machine_id, 0) + count
+        row_counts[machine_id] = row_counts.get(machine_id, 0) + 1
+        if result.first_timestamp is None or timestamp < result.first_timestamp:
+            result.first_timestamp = timestamp
+        if result.last_timestamp is None or timestamp > result.last_timestamp:
+            result.last_timestamp = timestamp
+
+    return result
+
+def import_cycles(store, stream, fmt='csv', skip_invalid=False, user="Import"):
+    """Waliduje plik i dodaje cykle jedną paczką operacji: jeden zapis bazy i jeden zapis historii.
+
+    Przy błędach w pliku nic nie jest zapisywane, chyba że skip_invalid=True -
+    wtedy importowane są tylko poprawne wiersze.
+    """
+    if isinstance(stream, (bytes, bytearray)):
+        stream = io.BytesIO(stream)
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+    # Walidacja i zapis pod jedną blokadą magazynu, na danych uzgodnionych z innymi procesami
+    with store.locked():
+        store.sync()
+        result = validate_rows(stream, fmt, store.index)
+        if (result.error_count and not skip_invalid) or not result.cycles:
+            return result
+
+        machine_ids = list(result.cycles)
+        ops = [{"op": "add_cycles", "machine_id": machine_id, "cycles": result.cycles[machine_id]} for machine_id in machine_ids]
+        actions = [f"Dodano {result.cycles[machine_id]} cykli (import: {result.row_counts[machine_id]} wpisów)"
+                   for machine_id in machine_ids]
+        applied = store.submit(ops, actions, user=user)
+
+    # Wynik opisuje to, co magazyn faktycznie zapisał
+    for machine_id, machine in zip(machine_ids, applied):
+        if machine is None:
+            result.valid_rows -= result.row_counts.pop(machine_id)
+            result.cycles.pop(machine_id)
+            result.add_error('-', f"Maszyna {machine_id} zmieniona lub usunięta w trakcie importu - pominięto")
+    result.applied = bool(result.cycles)
+    return result
@@ -0,0 +1,421 @@
+"""Silnik statusu i prognoz floty - niezależny od Streamlit.
+
+Wylicza statusy, postęp i terminy interwałów serwisowych całej floty
+(kolumnowo, numpy/pandas) oraz prognozy serwisów. Dane pochodzą z magazynu
+(storage.FleetStore), a wyniki pokazuje aplikacja (app.py).
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from itertools import islice
+import calendar
+
+import numpy as np
+import pandas as pd
+
+from storage import file_lock, json_dumps, json_loads, write_bytes_atomic
+
+# --- KLASY DANYCH ---
+@dataclass
+class ServiceInterval:
+    """Pojedynczy interwał serwisowy"""
+    name: str
+    type: str  # 'cycles' lub 'time'
+    interval: int  # liczba cykli lub miesięcy
+    current_value: int
+    last_service: str
+    enabled: bool = True
+    
+    def get_status(self):
+        """Zwraca status: 0=OK, 1=Warning, 2=Critical"""
+        if not self.enabled:
+            return 0
+            
+        if self.type == 'cycles':
+            remaining = self.interval - self.current_value
+            if remaining <= 0:
+                return 2
+            elif remaining <= self.interval * 0.15:
+                return 1
+        else:  # time
+            last = datetime.strptime(self.last_service, "%Y-%m-%d").date()
+            next_date = add_months(last, self.interval)
+            days_remaining = (next_date - datetime.now().date()).days
+            if days_remaining <= 0:
+                return 2
+            elif days_remaining <= 7:
+                return 1
+        return 0
+    
+    def get_progress(self):
+        """Zwraca postęp jako wartość 0-1"""
+        if not self.enabled:
+            return 0
+        if self.type == 'cycles':
+            return min(self.current_value / self.interval, 1.0)
+        else:
+            last = datetime.strptime(self.last_service, "%Y-%m-%d").date()
+            next_date = add_months(last, self.interval)
+            total_days = (next_date - last).days
+            elapsed_days = (datetime.now().date() - last).days
+            return min(elapsed_days / total_days, 1.0)
+
+# --- FUNKCJE POMOCNICZE ---
+def add_months(source_date, months):
+    """Dodaje miesiące do daty"""
+    month = source_date.month - 1 + months
+    year = source_date.year + month // 12
+    month = month % 12 + 1
+    day = min(source_date.day, calendar.monthrange(year, month)[1])
+    return source_date.replace(year=year, month=month, day=day)
+
+# --- SILNIK STATUSU FLOTY (WEKTOROWO) ---
+def add_months_vectorized(dates, months):
+    """Dodaje miesiące do tablicy dat datetime64[D] (odpowiednik add_months)"""
+    month_start = dates.astype('datetime64[M]')
+    day_offset = (dates - month_start.astype('datetime64[D]')).astype(np.int64)
+    target = month_start + months.astype('timedelta64[M]')
+    target_start = target.astype('datetime64[D]')
+    days_in_month = ((target + 1).astype('datetime64[D]') - target_start).astype(np.int64)
+    return target_start + np.minimum(day_offset, days_in_month - 1).astype('timedelta64[D]')
+
+@dataclass
+class FleetStatus:
+    """Wyniki silnika statusu - jeden wiersz tabeli na interwał serwisowy"""
+    intervals: pd.DataFrame
+    machine_status: np.ndarray
+    offsets: np.ndarray  # wiersze maszyny i to zakres offsets[i]:offsets[i+1]
+    
+    def machine_rows(self, machine_idx):
+        """Zwraca wiersze interwałów danej maszyny (w kolejności konfiguracji)"""
+        return self.intervals.iloc[self.offsets[machine_idx]:self.offsets[machine_idx + 1]]
+    
+    def critical_status(self, machine_idx):
+        """Zwraca najwyższy status maszyny i listę krytycznych interwałów"""
+        rows = self.machine_rows(machine_idx)
+        return int(self.machine_status[machine_idx]), rows.loc[rows['status'] == 2, 'name'].tolist()
+    
+    def counts(self):
+        """Zwraca liczbę maszyn w stanie krytycznym i ostrzegawczym"""
+        return int((self.machine_status == 2).sum()), int((self.machine_status == 1).sum())
+    
+    def urgency_order(self, positions):
+        """Sortuje pozycje maszyn od najpilniejszych: status, potem najwyższy postęp interwału"""
+        progress = np.zeros(len(self.machine_status))
+        np.maximum.at(progress, self.intervals['machine_idx'].to_numpy(), self.intervals['progress'].to_numpy())
+        return positions[np.lexsort((-progress[positions], -self.machine_status[positions]))]
+    
+    def patched(self, positions, partial):
+        """Kopia wyników z podmienionymi wierszami wskazanych maszyn (None, gdy zmieniła się liczba interwałów)"""
+        spans = []
+        for part_idx, machine_idx in enumerate(positions):
+            start, end = self.offsets[machine_idx], self.offsets[machine_idx + 1]
+            part_start, part_end = partial.offsets[part_idx], partial.offsets[part_idx + 1]
+            if end - start != part_end - part_start:
+                return None
+            spans.append((start, end, part_start, part_end))
+        
+        # Kopia zamiast zmiany w miejscu - inne sesje mogą właśnie renderować poprzedni wynik
+        # Kolumny bez zmian (zwykle nazwy i typy) są współdzielone, a nie przepisywane
+        columns = {}
+        for col in self.intervals.columns:
+            current = self.intervals[col]
+            columns[col] = current
+            if col == 'machine_idx':
+                continue
+            part_values = partial.intervals[col].to_numpy()
+            changed = [(start, end, part_start, part_end) for start, end, part_start, part_end in spans
+                       if not np.array_equal(current.iloc[start:end].to_numpy(), part_values[part_start:part_end])]
+            if changed:
+                values = current.to_numpy(copy=True)
+                for start, end, part_start, part_end in changed:
+                    values[start:end] = part_values[part_start:part_end]
+                columns[col] = values
+        machine_status = self.machine_status.copy()
+        machine_status[positions] = partial.machine_status
+        return FleetStatus(pd.DataFrame(columns), machine_status, self.offsets)
+
+INTERVAL_FIELDS = ['name', 'type', 'interval', 'current_value', 'last_service', 'enabled']
+
+def compute_fleet_status(machines, today=None):
+    """Wylicza status, postęp i terminy wszystkich interwałów floty w jednym przebiegu"""
+    today = np.datetime64(today or datetime.now().date(), 'D')
+    
+    # Tabela kolumnowa: interwały kolejnych maszyn leżą w ciągłych zakresach wierszy
+    counts = np.fromiter((len(m['service_intervals']) for m in machines), dtype=np.int64, count=len(machines))
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    machine_idx = np.repeat(np.arange(len(machines)), counts)
+    columns = {
+        'machine_idx': machine_idx,
+        'machine_id': np.repeat(np.array([m['id'] for m in machines], dtype=object), counts),
+        'machine': np.repeat(np.array([m['name'] for m in machines], dtype=object), counts),
+        'location': np.repeat(np.array([m['location'] for m in machines], dtype=object), counts),
+        'model': np.repeat(np.array([m['model'] for m in machines], dtype=object), counts),
+    }
+    intervals = [i for m in machines for i in m['service_intervals']]
+    for field in INTERVAL_FIELDS:
+        columns[field] = [i[field] for i in intervals]
+    df = pd.DataFrame(columns)
+    
+    is_time = np.array(columns['type'], dtype=object) == 'time'
+    enabled = np.array(columns['enabled'], dtype=bool)
+    interval = np.array(columns['interval'], dtype=np.int64)
+    current = np.array(columns['current_value'], dtype=np.int64)
+    avg_daily = np.repeat(np.array([m['avg_daily_cycles'] for m in machines], dtype=np.float64), counts)
+    last = np.array(columns['last_service'], dtype='datetime64[D]')
+    df['avg_daily_cycles'] = avg_daily
+    
+    # Interwały czasowe: termin = ostatni serwis + N miesięcy
+    next_date = add_months_vectorized(last, np.where(is_time, interval, 0))
+    days_to_date = (next_date - today).astype(np.int64)
+    total_days = (next_date - last).astype(np.int64)
+    elapsed_days = (today - last).astype(np.int64)
+    
+    # Interwały cykliczne: termin estymowany ze średniej dziennej liczby cykli
+    remaining_cycles = interval - current
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cycle_progress = current / interval
+        time_progress = elapsed_days / total_days
+        days_to_cycles = np.trunc(remaining_cycles / avg_daily)
+    has_estimate = avg_daily > 0
+    days_to_cycles = np.where(has_estimate, days_to_cycles, 0)
+    
+    cycle_status = np.where(remaining_cycles <= 0, 2, np.where(remaining_cycles <= interval * 0.15, 1, 0))
+    time_status = np.where(days_to_date <= 0, 2, np.where(days_to_date <= 7, 1, 0))
+    status = np.where(enabled, np.where(is_time, time_status, cycle_status), 0)
+    
+    df['status'] = status
+    df['progress'] = np.where(enabled, np.clip(np.where(is_time, time_progress, cycle_progress), 0.0, 1.0), 0.0)
+    df['remaining_cycles'] = np.where(is_time, np.nan, remaining_cycles)
+    df['remaining_days'] = np.where(is_time, days_to_date, np.where(has_estimate, days_to_cycles, np.nan))
+    cycle_due = today + days_to_cycles.astype('timedelta64[D]')
+    df['next_due'] = np.where(is_time, next_date, np.where(has_estimate, cycle_due, np.datetime64('NaT')))
+    
+    # Najwyższy status każdej maszyny
+    machine_status = np.zeros(len(machines), dtype=np.int64)
+    np.maximum.at(machine_status, machine_idx, status)
+    
+    return FleetStatus(df, machine_status, offsets)
+
+# --- SILNIK PROGNOZ (WEKTOROWO) ---
+FORECAST_MIN_DAYS, FORECAST_MAX_DAYS = 7, 365
+ROLLUP_CHUNK = 2000  # maszyn na paczkę przy liczeniu zestawienia ze strumienia
+
+def compute_forecast(intervals, horizon=14, today=None):
+    """Pierwszy dzień serwisu w horyzoncie dla każdego włączonego interwału - jedno wyliczenie na interwał.
+
+    Przyjmuje tabelę interwałów z silnika statusu (całą flotę lub wiersze jednej
+    maszyny). Interwał cykliczny jest wymagany od pierwszego dnia, w którym
+    current_value + avg_daily_cycles * dzień >= interval, i pozostaje wymagany do
+    końca horyzontu; czasowy - tylko w dniu terminu. Zaległe interwały (termin
+    dziś lub wcześniej, status 2) przypadają na pierwszy dzień horyzontu.
+    """
+    today = np.datetime64(today or datetime.now().date(), 'D')
+    is_time = (intervals['type'] == 'time').to_numpy()
+    enabled = intervals['enabled'].to_numpy(dtype=bool)
+    avg = intervals['avg_daily_cycles'].to_numpy(dtype=np.float64)
+    current = intervals['current_value'].to_numpy(dtype=np.float64)
+    limit = intervals['interval'].to_numpy(dtype=np.float64)
+    
+    # Interwały cykliczne: dzień liczony analitycznie, z korektą zaokrągleń względem warunku dziennego
+    has_cycles = ~is_time & (avg > 0)
+    safe_avg = np.where(has_cycles, avg, 1.0)
+    first = np.ceil((limit - current) / safe_avg)
+    first = np.where(current + safe_avg * (first - 1) >= limit, first - 1, first)
+    first = np.where(current + safe_avg * first < limit, first + 1, first)
+    first_cycles = np.maximum(first, 1).astype(np.int64)
+    
+    # Interwały czasowe: termin z silnika statusu (ostatni serwis + N miesięcy)
+    due = intervals['next_due'].to_numpy(dtype='datetime64[D]')
+    has_due = is_time & ~np.isnat(due)
+    due_days = np.where(has_due, (due - today).astype(np.int64), 0)
+    
+    first_day = np.where(is_time, np.maximum(due_days, 1), first_cycles)
+    in_horizon = enabled & np.where(is_time, has_due & (due_days <= horizon), has_cycles & (first_cycles <= horizon))
+    
+    events = intervals.loc[in_horizon, ['machine_idx', 'machine_id', 'machine', 'location', 'name', 'type', 'status']].copy()
+    events['first_day'] = first_day[in_horizon]
+    events['date'] = today + events['first_day'].to_numpy().astype('timedelta64[D]')
+    return events
+
+def forecast_table(events, horizon=14, today=None):
+    """Tabela dzień po dniu (Data, Status, Zdarzenia) ze zdarzeń prognozy jednej maszyny.
+
+    Interwał cykliczny i każdy zaległy interwał są wymagane od pierwszego dnia
+    do końca horyzontu, czasowy przed terminem - tylko w dniu terminu.
+    """
+    today = today or datetime.now().date()
+    # Kolejność jak w karcie maszyny: najpierw interwały cykliczne, potem czasowe
+    events = events.sort_values('type', key=lambda types: types == 'time', kind='stable')
+    is_time = (events['type'] == 'time').to_numpy()
+    first = events['first_day'].to_numpy()
+    names = events['name'].to_numpy(dtype=object)
+    
+    days = np.arange(1, horizon + 1)[:, None]
+    once = is_time & (events['status'] != 2).to_numpy()
+    hits = np.where(once, days == first, days >= first)
+    
+    rows = []
+    for day, day_hits in enumerate(hits, start=1):
+        if (day_hits & is_time).any():
+            status = "PRZEGLĄD"
+        elif day_hits.any():
+            status = "SERWIS"
+        else:
+            status = "OK"
+        rows.append({
+            "Data": (today + timedelta(days=day)).strftime("%d.%m (%a)"),
+            "Status": status,
+            "Zdarzenia": ", ".join(names[day_hits]) if day_hits.any() else "-"
+        })
+    return pd.DataFrame(rows, columns=["Data", "Status", "Zdarzenia"])
+
+def status_rollup(status, machines):
+    """Zestawienie statusu listy maszyn: maszyny per status, zaległe interwały per lokalizacja, liczba interwałów"""
+    intervals = status.intervals
+    locations = sorted(set(m['location'] for m in machines))
+    overdue = intervals.loc[intervals['status'] == 2, 'location'].value_counts()
+    return {
+        'machines_by_status': np.bincount(status.machine_status, minlength=3).tolist(),
+        'overdue_by_location': {location: int(overdue.get(location, 0)) for location in locations},
+        'intervals': len(intervals),
+        'enabled_intervals': int(intervals['enabled'].sum()),
+    }
+
+
+def stream_rollup(machines, today=None, chunk_size=ROLLUP_CHUNK):
+    """Zestawienie jak status_rollup liczone paczkami maszyn (np. strumień ze snapshotu) - bez całej floty w pamięci"""
+    total = {'machines_by_status': [0, 0, 0], 'overdue_by_location': {}, 'intervals': 0, 'enabled_intervals': 0}
+    machines = iter(machines)
+    while chunk := list(islice(machines, chunk_size)):
+        part = status_rollup(compute_fleet_status(chunk, today), chunk)
+        total['machines_by_status'] = [a + b for a, b in zip(total['machines_by_status'], part['machines_by_status'])]
+        for location, count in part['overdue_by_location'].items():
+            total['overdue_by_location'][location] = total['overdue_by_location'].get(location, 0) + count
+        total['intervals'] += part['intervals']
+        total['enabled_intervals'] += part['enabled_intervals']
+    total['overdue_by_location'] = dict(sorted(total['overdue_by_location'].items()))
+    return total
+
+
+class StatusCache:
+    """Zestawienie statusów floty pamiętane dla (epoka danych, rewizja, dzień)"""
+    
+    def __init__(self):
+        self.key = None
+        self.status = None
+        self.forecasts = {}
+        self.summary = None
+    
+    def get(self, store):
+        """Zwraca aktualne zestawienie, przeliczając tylko maszyny zmienione od ostatniego razu"""
+        today = datetime.now().date()
+        with store.lock:
+            key = (store.epoch, store.revision, today)
+            if key == self.key:
+                return self.status
+            
+            status = None
+            if self.key is not None and self.key[0] == store.epoch and self.key[2] == today:
+                machine_ids = store.changed_machines(self.key[1])
+                if machine_ids is not None:
+                    positions = np.array([store.index.position(mid) for mid in sorted(machine_ids)], dtype=np.int64)
+                    partial = compute_fleet_status([store.data['machines'][pos] for pos in positions], today)
+                    status = self.status.patched(positions, partial)
+            
+            if status is None:
+                status = compute_fleet_status(store.data['machines'], today)
+            self.key, self.status = key, status
+            self.forecasts = {}
+            self.summary = None
+            return status
+    
+    def forecast(self, store, horizon):
+        """Zwraca prognozę całej floty dla horyzontu, pamiętaną do zmiany danych lub dnia"""
+        with store.lock:
+            status = self.get(store)
+            events = self.forecasts.get(horizon)
+            if events is None:
+                events = compute_forecast(status.intervals, horizon, self.key[2])
+                self.forecasts[horizon] = events
+            return events
+    
+    def rollup(self, store):
+        """Zestawienie do metryk (maszyny per status, zaległe interwały per lokalizacja), pamiętane do zmiany danych lub dnia"""
+        with store.lock:
+            status = self.get(store)
+            if self.summary is None:
+                self.summary = status_rollup(status, store.data['machines'])
+            return self.summary
+
+
+# --- ZESTAWIENIE WSZYSTKICH HAL (DANE PODZIELONE NA LOKALIZACJE) ---
+def read_shard_summary(path):
+    """Zapisane zestawienie shardu (summary.json) lub None, gdy brak lub plik nieczytelny"""
+    try:
+        with open(path, 'rb') as f:
+            return json_loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+class ShardRollups:
+    """Zestawienia statusów hal do widoku całej floty - bez wczytywania shardów, których proces nie otworzył.
+
+    Zestawienie wczytanego shardu liczy jego StatusCache. Shard, którego proces
+    nie wczytał, korzysta z zapisanego w jego katalogu summary.json, dopóki dzień
+    i sygnatura plików danych się zgadzają - w przeciwnym razie zestawienie jest
+    liczone paczkami z odczytu plików (ShardSet.read_machines), a magazyn shardu
+    nie powstaje. Każde świeżo policzone zestawienie trafia do summary.json.
+    """
+
+    def __init__(self, shards, status_cache=None):
+        self.shards = shards
+        self._caches = {}
+        self.status_cache = status_cache or (lambda location: self._caches.setdefault(location, StatusCache()))
+        self._written = {}
+
+    def summary(self, location):
+        """(zestawienie shardu jak StatusCache.rollup, źródło: 'pamięć', 'summary.json' lub 'odczyt pliku')"""
+        paths = self.shards.paths(location)
+        today = str(datetime.now().date())
+        store = self.shards.loaded(location)
+        if store is not None:
+            with store.locked():
+                # Sygnatura pod blokadą shardu odpowiada danym, z których liczone jest zestawienie
+                store.sync()
+                signature = self.shards.data_signature(location)
+                rollup = self.status_cache(location).rollup(store)
+            source = 'pamięć'
+        else:
+            saved = read_shard_summary(paths.summary)
+            if saved is not None and saved.get('date') == today \
+                    and saved.get('signature') == self.shards.data_signature(location):
+                return saved['rollup'], 'summary.json'
+            with file_lock(paths.lock):
+                signature = self.shards.data_signature(location)
+                rollup = stream_rollup(self.shards.read_machines(location))
+            source = 'odczyt pliku'
+        if self._written.get(location) != (today, signature):
+            record = {'date': today, 'signature': signature, 'rollup': rollup}
+            write_bytes_atomic(paths.summary, json_dumps(record, indent=True))
+            self._written[location] = (today, signature)
+        return rollup, source
+
+    def table(self):
+        """Wiersz zestawienia na każdą halę: maszyny wg statusu, interwały, zaległe i źródło danych"""
+        rows = []
+        for location in self.shards.locations():
+            rollup, source = self.summary(location)
+            ok, warning, critical = rollup['machines_by_status']
+            rows.append({
+                'location': location,
+                'machines': ok + warning + critical,
+                'ok': ok,
+                'warning': warning,
+                'critical': critical,
+                'intervals': rollup['intervals'],
+                'overdue_intervals': sum(rollup['overdue_by_location'].values()),
+                'source': source,
+            })
+        return pd.DataFrame(rows, columns=['location', 'machines', 'ok', 'warning', 'critical', 'intervals',
+                                           'overdue_intervals', 'source'])
@@ -0,0 +1,155 @@
+"""Serwis HTTP przyjmujący liczniki cykli bezpośrednio od maszyn.
+
+Uruchomienie (z katalogu, w którym leży warsztat_data - ten sam magazyn co aplikacja):
+    python ingest_server.py --port 8502 --flush-interval 1.0
+
+    POST /machines/{id}/cycles   treść {"cycles": 25} -> 202, przyrost trafia do bufora
+    GET  /health                 liczba zgłoszeń i maszyn czekających na zapis
+    GET  /metrics                metryki floty i magazynu w formacie Prometheus (metrics.py)
+
+Przyrosty są sumowane w pamięci (CycleBuffer) i zapisywane co --flush-interval
+sekund lub po --max-pending zgłoszeniach, z takimi samymi wpisami historii jak
+przycisk "Zatwierdź wpis" w karcie maszyny. Zatrzymanie (Ctrl+C, SIGTERM)
+zapisuje zawartość bufora. Z --metrics-file metryki są dodatkowo zapisywane
+do pliku .prom (textfile collector node_exportera) co --metrics-interval sekund.
+
+Przy danych podzielonych na hale (tools/shard_by_location.py) serwis obsługuje
+jedną halę: --location wybiera jej shard, a metryki dostają etykietę shard.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import logging
+import re
+import signal
+import threading
+
+from metrics import METRICS_FILE, METRICS_INTERVAL, MetricsExporter
+from profiling import Profiler, instrument_store
+from storage import CycleBuffer, FleetStore, ShardSet, read_shard_manifest
+
+logger = logging.getLogger(__name__)
+
+CYCLES_PATH = re.compile(r"^/machines/([^/]+)/cycles/?$")
+
+# Górna granica pojedynczego zgłoszenia - chroni przed pomyłką w sterowniku
+MAX_CYCLES_PER_REQUEST = 1_000_000
+
+
+class IngestHandler(BaseHTTPRequestHandler):
+    """Obsługa zgłoszeń - store i buffer ustawia serwer (IngestServer)"""
+
+    protocol_version = "HTTP/1.1"  # połączenia keep-alive
+    # Nagłówki i treść odpowiedzi w jednym pakiecie - bez opóźnień Nagle/delayed ACK
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def _reply(self, status, payload, content_type="application/json; charset=utf-8"):
+        if not isinstance(payload, str):
+            payload = json.dumps(payload, ensure_ascii=False)
+        body = payload.encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+
+        match = CYCLES_PATH.match(self.path)
+        if match is None:
+            return self._reply(404, {"error": "Nieznany adres"})
+
+        machine_id = match.group(1)
+        store = self.server.store
+        if store.index.machine(machine_id) is None:
+            # Maszyna mogła zostać dodana w aplikacji po starcie serwisu
+            store.sync()
+        if store.index.machine(machine_id) is None:
+            return self._reply(404, {"error": f"Nieznana maszyna: {machine_id}"})
+
+        try:
+            cycles = json.loads(body)["cycles"]
+        except (ValueError, KeyError, TypeError):
+            return self._reply(400, {"error": "Oczekiwano treści JSON {\"cycles\": liczba}"})
+        if not isinstance(cycles, int) or isinstance(cycles, bool) or not 0 < cycles <= MAX_CYCLES_PER_REQUEST:
+            return self._reply(400, {"error": f"Liczba cykli musi być liczbą całkowitą 1-{MAX_CYCLES_PER_REQUEST}"})
+
+        self.server.buffer.add(machine_id, cycles)
+        self._reply(202, {"machine_id": machine_id, "cycles": cycles})
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/metrics":
+            return self._reply(200, self.server.metrics.render(), "text/plain; version=0.0.4; charset=utf-8")
+        if self.path.rstrip("/") != "/health":
+            return self._reply(404, {"error": "Nieznany adres"})
+        pending = self.server.buffer.pending()
+        self._reply(200, {
+            "status": "ok",
+            "revision": self.server.store.revision,
+            "pending_requests": self.server.buffer.pending_requests(),
+            "pending_machines": len(pending),
+            "pending_cycles": sum(pending.values()),
+        })
+
+    def log_message(self, format, *args):
+        # Bez logu każdego zgłoszenia - przy tysiącach na sekundę spowalnia serwis
+        pass
+
+
+class IngestServer(ThreadingHTTPServer):
+    """Serwer HTTP z magazynem i buforem przyrostów wspólnym dla wątków obsługi"""
+
+    daemon_threads = True
+
+    def __init__(self, address, store, buffer, metrics):
+        super().__init__(address, IngestHandler)
+        self.store = store
+        self.buffer = buffer
+        self.metrics = metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--flush-interval", type=float, default=1.0, help="sekundy między zapisami bufora")
+    parser.add_argument("--max-pending", type=int, default=5000, help="zapis wcześniej po tylu zgłoszeniach")
+    parser.add_argument("--metrics-file", default=METRICS_FILE, help="plik .prom zapisywany cyklicznie (domyślnie brak)")
+    parser.add_argument("--metrics-interval", type=float, default=METRICS_INTERVAL, help="sekundy między zapisami metryk")
+    parser.add_argument("--location", help="hala obsługiwana przez serwis (wymagane, gdy dane są podzielone na hale)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    shards = read_shard_manifest()
+    if shards and args.location not in shards:
+        parser.error(f"dane są podzielone na hale - wskaż jedną przez --location: {', '.join(sorted(shards))}")
+
+    store = ShardSet().store(args.location) if shards else FleetStore()
+    profiler = Profiler()
+    instrument_store(profiler, store)
+    metrics = MetricsExporter(store, profiler=profiler, labels={"shard": args.location} if shards else None)
+    if args.metrics_file:
+        metrics.start(args.metrics_file, args.metrics_interval)
+    buffer = CycleBuffer(store, args.flush_interval, args.max_pending).start()
+    server = IngestServer((args.host, args.port), store, buffer, metrics)
+
+    # SIGTERM kończy pracę tak samo jak Ctrl+C - z zapisem bufora
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+
+    logger.info("Nasłuch na http://%s:%d (zapis co %.1f s)", args.host, args.port, args.flush_interval)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        buffer.stop()
+        metrics.stop()
+        logger.info("Bufor zapisany, rewizja danych %d", store.revision)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Metryki floty i magazynu w formacie tekstowym Prometheus - niezależne od Streamlit.
+
+Metryki są udostępniane przez GET /metrics serwisu ingest_server.py albo
+zapisywane co WARSZTAT_METRICS_INTERVAL sekund do pliku WARSZTAT_METRICS_FILE
+(np. katalog textfile collectora node_exportera) przez aplikację.
+
+Statusy pochodzą z zestawienia StatusCache (przeliczanego tylko po zmianie
+danych lub dnia), cykle per maszyna są liczone przyrostowo z nowych wpisów
+historii, a czasy odczytu i zapisu - z profilera podpiętego do backendu.
+"""
+from pathlib import Path
+import logging
+import os
+import re
+import threading
+
+from fleet import StatusCache
+from storage import file_signature
+
+logger = logging.getLogger(__name__)
+
+METRICS_FILE = os.environ.get("WARSZTAT_METRICS_FILE", "")
+METRICS_INTERVAL = float(os.environ.get("WARSZTAT_METRICS_INTERVAL", "15"))
+
+STATUS_LABELS = ("ok", "warning", "critical")
+
+CYCLES_ACTION = re.compile(r"^Dodano (\d+) cykli")
+
+
+def escape_label(value):
+    """Wartość etykiety zgodna z formatem tekstowym Prometheus"""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def sample_line(name, labels, value):
+    """Linia próbki: nazwa{etykiety} wartość"""
+    label_text = ",".join(f'{key}="{escape_label(val)}"' for key, val in labels.items())
+    return f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}"
+
+
+def metric_family(lines, name, kind, help_text, samples, common_labels=None):
+    """Dopisuje rodzinę metryk: nagłówki HELP/TYPE i próbki (etykiety, wartość)"""
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {kind}")
+    lines.extend(sample_line(name, {**(common_labels or {}), **labels}, value) for labels, value in samples)
+
+
+class CycleCounter:
+    """Cykle zarejestrowane per maszyna w bieżącym segmencie historii - liczone tylko z nowych wpisów.
+
+    Segment historii obejmuje bieżący miesiąc, więc licznik zeruje się po
+    przeniesieniu starszych wpisów do archiwum (Prometheus traktuje to jak
+    restart licznika).
+    """
+
+    def __init__(self):
+        self.history = None
+        self.position = 0
+        self.cycles = {}
+
+    def update(self, history):
+        """Dolicza wpisy dopisane od poprzedniego wywołania, zwraca cykle per ID maszyny"""
+        if history is not self.history:
+            self.history, self.position, self.cycles = history, 0, {}
+        entries = history.entries
+        for entry in entries[self.position:]:
+            match = CYCLES_ACTION.match(entry.get('action', ''))
+            if match:
+                machine_id = entry.get('machine_id') or entry.get('machine')
+                self.cycles[machine_id] = self.cycles.get(machine_id, 0) + int(match[1])
+        self.position = len(entries)
+        return self.cycles
+
+
+class MetricsExporter:
+    """Zestawia metryki magazynu (render) i opcjonalnie zapisuje je cyklicznie do pliku .prom.
+
+    `labels` trafiają do każdej próbki - np. {"shard": lokalizacja}, gdy metryki
+    kilku hal zbiera ten sam collector.
+    """
+
+    def __init__(self, store, status_cache=None, profiler=None, labels=None):
+        self.store = store
+        self.labels = labels or {}
+        self.status_cache = status_cache or StatusCache()
+        self.profiler = profiler
+        self.cycles = CycleCounter()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def data_files(self):
+        """Pliki danych backendu (nazwa -> ścieżka)"""
+        return self.store.paths.data_files(self.store.backend.name)
+
+    def render(self):
+        """Metryki w formacie tekstowym Prometheus"""
+        store = self.store
+        with self._lock, store.lock:
+            # Zmiany innych procesów (np. aplikacji i serwisu przyjmującego cykle)
+            store.sync()
+            summary = self.status_cache.rollup(store)
+            cycles = dict(self.cycles.update(store.history))
+            revision, machines, history_entries = store.revision, len(store.data['machines']), len(store.history)
+
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            metric_family(lines, name, kind, help_text, samples, self.labels)
+
+        family("warsztat_machines", "gauge", "Maszyny wg najwyższego statusu interwałów",
+               [({"status": label}, count) for label, count in zip(STATUS_LABELS, summary['machines_by_status'])])
+        family("warsztat_fleet_machines", "gauge", "Liczba maszyn", [({}, machines)])
+        family("warsztat_fleet_intervals", "gauge", "Interwały serwisowe (wszystkie i włączone)",
+               [({"state": "all"}, summary['intervals']), ({"state": "enabled"}, summary['enabled_intervals'])])
+        family("warsztat_overdue_intervals", "gauge", "Interwały wymagające serwisu wg lokalizacji",
+               [({"location": location}, count) for location, count in summary['overdue_by_location'].items()])
+        family("warsztat_cycles_registered_total", "counter",
+               "Cykle zarejestrowane per maszyna (bieżący miesiąc historii)",
+               [({"machine_id": machine_id}, count) for machine_id, count in sorted(cycles.items())])
+        family("warsztat_data_revision", "gauge", "Rewizja danych", [({}, revision)])
+        family("warsztat_history_entries", "gauge", "Wpisy w bieżącym segmencie historii",
+               [({}, history_entries)])
+
+        sizes = []
+        for name, path in self.data_files().items():
+            signature = file_signature(path)
+            if signature is not None:
+                sizes.append(({"file": name}, signature[2]))
+        family("warsztat_file_size_bytes", "gauge", "Rozmiar plików danych", sizes)
+
+        if self.profiler is not None:
+            # Podsumowanie: kwantyle z okna ostatnich pomiarów, suma i liczba od startu procesu
+            name = "warsztat_storage_duration_seconds"
+            samples, totals = [], []
+            for section, (quantiles, count, total) in self.profiler.quantiles("storage.").items():
+                labels = {"operation": section[len("storage."):]}
+                samples.extend(({**labels, "quantile": f"{q / 100:g}"}, f"{value:.6f}") for q, value in quantiles.items())
+                totals.append(sample_line(f"{name}_sum", {**self.labels, **labels}, f"{total:.6f}"))
+                totals.append(sample_line(f"{name}_count", {**self.labels, **labels}, count))
+            family(name, "summary", "Czas operacji odczytu i zapisu magazynu", samples)
+            lines.extend(totals)
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Zapisuje metryki do pliku atomowo (collector nie widzi niepełnego pliku)"""
+        path = Path(path)
+        tmp_file = path.with_name(path.name + ".tmp")
+        tmp_file.write_text(self.render(), encoding='utf-8')
+        os.replace(tmp_file, path)
+
+    def _run(self, path, interval):
+        while not self._stopped.wait(interval):
+            try:
+                self.write(path)
+            except Exception:
+                logger.exception("Błąd zapisu metryk do %s", path)
+
+    def start(self, path, interval=METRICS_INTERVAL):
+        """Uruchamia wątek zapisujący metryki do pliku co `interval` sekund (pierwszy zapis od razu)"""
+        if self._thread is None:
+            self.write(path)
+            self._thread = threading.Thread(target=self._run, args=(path, interval), name="metrics", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Zatrzymuje wątek zapisu metryk"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,155 @@
+"""Pomiar czasu przebiegów aplikacji i wywołań magazynu - niezależny od Streamlit.
+
+Profiler jest wspólny dla procesu. Przebieg skryptu (start_run/finish_run)
+zbiera czasy swojego wątku: etapy wyznaczane przez lap() i zagnieżdżone
+sekcje section(), także wywołania metod obiektów podpiętych przez
+instrument(). Każdy pomiar trafia ponadto do kroczącego okna ostatnich
+pomiarów danej nazwy, z którego liczone są percentyle.
+"""
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+import json
+import math
+import threading
+import time
+
+# Ile ostatnich pomiarów każdej sekcji brać do percentyli
+PROFILE_WINDOW = 1000
+
+PERCENTILES = (50, 90, 99)
+
+# Metody backendu zapisu mierzone jako sekcje 'storage.<metoda>'
+BACKEND_METHODS = ['load_database', 'read_database', 'save_database', 'persist', 'poll_database',
+                   'load_history', 'save_history', 'append_history', 'split_history', 'poll_history']
+
+
+def percentile(sorted_values, q):
+    """Percentyl metodą najbliższej pozycji z posortowanej listy"""
+    return sorted_values[max(math.ceil(q / 100 * len(sorted_values)) - 1, 0)]
+
+
+class Profiler:
+    """Czasy sekcji bieżącego przebiegu (per wątek) i kroczące percentyle dla procesu"""
+
+    def __init__(self, window=PROFILE_WINDOW):
+        self.window = window
+        self.samples = {}
+        self.cumulative = {}  # nazwa -> [liczba, suma sekund] od startu procesu
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._instrumented = set()
+
+    def start_run(self):
+        """Zaczyna pomiar przebiegu w bieżącym wątku"""
+        local = self._local
+        local.run = []
+        local.depth = 0
+        local.started = local.phase_started = time.perf_counter()
+        local.phase_index = 0
+
+    def lap(self, name):
+        """Zamyka etap przebiegu trwający od poprzedniego lap() (lub początku przebiegu)"""
+        local = self._local
+        if getattr(local, 'run', None) is None:
+            return
+        now = time.perf_counter()
+        seconds = now - local.phase_started
+        # Etap przed sekcjami, które zmierzono w jego trakcie
+        local.run.insert(local.phase_index, (name, 0, seconds))
+        local.phase_started, local.phase_index = now, len(local.run)
+        self._add_sample(name, seconds)
+
+    @contextmanager
+    def section(self, name):
+        """Mierzy blok kodu (zagnieżdżony w bieżącym etapie przebiegu)"""
+        local = self._local
+        run = getattr(local, 'run', None)
+        if run is not None:
+            local.depth += 1
+            entry = len(run)
+            run.append(None)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            if run is not None and local.run is run:
+                run[entry] = (name, local.depth, seconds)
+                local.depth -= 1
+            self._add_sample(name, seconds)
+
+    def finish_run(self):
+        """Kończy przebieg: zwraca (czas całkowity w s, lista (nazwa, poziom, s))"""
+        local = self._local
+        run = getattr(local, 'run', None)
+        if run is None:
+            return 0.0, []
+        total = time.perf_counter() - local.started
+        local.run = None
+        self._add_sample("przebieg", total)
+        return total, [entry for entry in run if entry is not None]
+
+    def _add_sample(self, name, seconds):
+        with self._lock:
+            samples = self.samples.get(name)
+            if samples is None:
+                samples = self.samples[name] = deque(maxlen=self.window)
+                self.cumulative[name] = [0, 0.0]
+            samples.append(seconds)
+            totals = self.cumulative[name]
+            totals[0] += 1
+            totals[1] += seconds
+
+    def instrument(self, obj, methods, prefix):
+        """Podmienia metody obiektu na mierzone (sekcje '<prefix>.<metoda>'), raz na obiekt"""
+        with self._lock:
+            if id(obj) in self._instrumented:
+                return
+            self._instrumented.add(id(obj))
+        for name in methods:
+            method = getattr(obj, name)
+            setattr(obj, name, self._timed(method, f"{prefix}.{name}"))
+
+    def _timed(self, method, name):
+        @wraps(method)
+        def timed(*args, **kwargs):
+            with self.section(name):
+                return method(*args, **kwargs)
+        return timed
+
+    def stats(self):
+        """Statystyki sekcji z okna pomiarów: liczba, średnia, percentyle i maksimum (ms)"""
+        with self._lock:
+            snapshot = {name: sorted(samples) for name, samples in self.samples.items()}
+        stats = {}
+        for name, values in sorted(snapshot.items()):
+            row = {"count": len(values), "mean_ms": round(sum(values) / len(values) * 1000, 3)}
+            for q in PERCENTILES:
+                row[f"p{q}_ms"] = round(percentile(values, q) * 1000, 3)
+            row["max_ms"] = round(values[-1] * 1000, 3)
+            stats[name] = row
+        return stats
+
+    def quantiles(self, prefix=""):
+        """Sekcje o nazwie z prefiksem: (kwantyle z okna w s, liczba i suma od startu procesu)"""
+        with self._lock:
+            snapshot = {name: (sorted(samples), tuple(self.cumulative[name]))
+                        for name, samples in self.samples.items() if name.startswith(prefix)}
+        return {name: ({q: percentile(values, q) for q in PERCENTILES}, count, total)
+                for name, (values, (count, total)) in sorted(snapshot.items())}
+
+    def export_json(self):
+        """Statystyki sekcji jako JSON (do pobrania i porównań)"""
+        return json.dumps({
+            "created": datetime.now().isoformat(timespec='seconds'),
+            "window": self.window,
+            "sections": self.stats(),
+        }, indent=2, ensure_ascii=False)
+
+
+def instrument_store(profiler, store):
+    """Podpina pomiar wywołań backendu (storage.*) i zapisu kopii zapasowych (backup.write) magazynu"""
+    profiler.instrument(store.backend, BACKEND_METHODS, "storage")
+    profiler.instrument(store.backups, ['write'], "backup")
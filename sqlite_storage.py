@@ -0,0 +1,315 @@
+"""Backend zapisu w bazie SQLite (WARSZTAT_BACKEND=sqlite) - niezależny od Streamlit"""
+from contextlib import contextmanager
+import json
+import sqlite3
+
+from storage import DEFAULT_PATHS, DataPaths, apply_operation, ensure_data_directory, get_initial_data
+
+SQLITE_FILE = DEFAULT_PATHS.sqlite
+
+# Ile ostatnich operacji trzymać w tabeli operations - inne procesy odtwarzają z niej zmiany
+OPERATIONS_KEEP = 1000
+
+MACHINE_COLUMNS = ['id', 'name', 'model', 'location', 'avg_daily_cycles']
+INTERVAL_COLUMNS = ['name', 'type', 'interval', 'current_value', 'last_service', 'enabled']
+HISTORY_COLUMNS = ['timestamp', 'machine', 'action', 'user', 'machine_id']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS machines (
+    id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    model TEXT,
+    location TEXT,
+    avg_daily_cycles NUMERIC,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS machines_position ON machines (position);
+CREATE TABLE IF NOT EXISTS service_intervals (
+    machine_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    type TEXT NOT NULL,
+    "interval" INTEGER NOT NULL,
+    current_value INTEGER NOT NULL,
+    last_service TEXT NOT NULL,
+    enabled INTEGER NOT NULL,
+    extra TEXT,
+    PRIMARY KEY (machine_id, position)
+);
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    machine_id TEXT,
+    machine TEXT,
+    action TEXT,
+    user TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS history_machine ON history (machine_id, timestamp);
+CREATE INDEX IF NOT EXISTS history_timestamp ON history (timestamp);
+CREATE TABLE IF NOT EXISTS operations (
+    seq INTEGER PRIMARY KEY,
+    record TEXT NOT NULL
+);
+"""
+
+
+def _extra(record, known):
+    """Pola spoza stałych kolumn zapisywane jako JSON (None gdy brak)"""
+    extra = {key: value for key, value in record.items() if key not in known}
+    return json.dumps(extra, ensure_ascii=False) if extra else None
+
+def _with_extra(record, extra):
+    if extra:
+        record.update(json.loads(extra))
+    return record
+
+
+class SqliteBackend:
+    """Backend SQLite: maszyny, interwały i historia w tabelach, plik w trybie WAL.
+
+    Interfejs jak JsonBackend - metody wywołuje FleetStore pod blokadą locked(),
+    więc jedno połączenie jest współdzielone przez wątki procesu. Każde
+    utrwalenie operacji to jedna transakcja, a dodanie cykli zmienia tylko
+    wiersze liczników danej maszyny. Numer generation w tabeli meta rośnie przy
+    podmianie całej bazy, history_generation przy nadpisaniu historii.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path=None):
+        self.path = path or SQLITE_FILE
+        self.database_file = self.path
+        # Blokada, archiwum historii i kopie zapasowe w katalogu pliku bazy
+        self.paths = DataPaths(self.path.parent)
+        ensure_data_directory(self.paths)
+        self.conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.executescript(SCHEMA)
+        self._generation = None
+        self._history_generation = None
+        self._history_last_id = 0
+
+    @contextmanager
+    def transaction(self):
+        """Transakcja zapisu (BEGIN IMMEDIATE ... COMMIT, ROLLBACK przy błędzie)"""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.conn
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def close(self):
+        """Zamyka połączenie z bazą"""
+        self.conn.close()
+
+    def _meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, conn, key, value):
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    # --- BAZA MASZYN ---
+    def read_database(self):
+        """Odczyt bazy bez zmiany stanu backendu (np. do backupu)"""
+        machines = []
+        by_id = {}
+        for row in self.conn.execute(
+                "SELECT id, name, model, location, avg_daily_cycles, extra FROM machines ORDER BY position"):
+            machine = _with_extra(dict(zip(MACHINE_COLUMNS, row[:5])), row[5])
+            machine['service_intervals'] = []
+            machines.append(machine)
+            by_id[machine['id']] = machine
+
+        for row in self.conn.execute(
+                'SELECT machine_id, name, type, "interval", current_value, last_service, enabled, extra '
+                'FROM service_intervals ORDER BY machine_id, position'):
+            interval = _with_extra(dict(zip(INTERVAL_COLUMNS, row[1:7])), row[7])
+            interval['enabled'] = bool(interval['enabled'])
+            by_id[row[0]]['service_intervals'].append(interval)
+
+        return {"machines": machines, "revision": self._meta('revision') or 0}
+
+    def load_database(self):
+        """Wczytuje bazę; pusty plik inicjalizuje pustą strukturą danych"""
+        if self._meta('generation') is None:
+            self.save_database(get_initial_data())
+        data = self.read_database()
+        self._generation = self._meta('generation')
+        return data
+
+    def save_database(self, data):
+        """Zastępuje całą zawartość tabel maszyn i interwałów"""
+        if not isinstance(data, dict) or 'machines' not in data:
+            raise ValueError("Nieprawidłowa struktura danych!")
+
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM machines")
+            conn.execute("DELETE FROM service_intervals")
+            conn.execute("DELETE FROM operations")
+            for position, machine in enumerate(data['machines']):
+                self._insert_machine(conn, machine, position)
+            generation = (self._meta('generation') or 0) + 1
+            self._set_meta(conn, 'generation', generation)
+            self._set_meta(conn, 'revision', data.get('revision', 0))
+        self._generation = generation
+
+    def _insert_machine(self, conn, machine, position):
+        conn.execute(
+            "INSERT INTO machines (id, position, name, model, location, avg_daily_cycles, extra) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (machine['id'], position, *(machine.get(column) for column in MACHINE_COLUMNS[1:]),
+             _extra(machine, MACHINE_COLUMNS + ['service_intervals']))
+        )
+        self._write_intervals(conn, machine)
+
+    def _write_intervals(self, conn, machine):
+        """Zapisuje od nowa wszystkie interwały maszyny"""
+        conn.execute("DELETE FROM service_intervals WHERE machine_id = ?", (machine['id'],))
+        conn.executemany(
+            'INSERT INTO service_intervals (machine_id, position, name, type, "interval", current_value, '
+            'last_service, enabled, extra) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [(machine['id'], position, *(interval[column] for column in INTERVAL_COLUMNS),
+              _extra(interval, INTERVAL_COLUMNS))
+             for position, interval in enumerate(machine['service_intervals'])]
+        )
+
+    def _write_machine(self, conn, machine):
+        """Aktualizuje wiersz maszyny i jej interwały"""
+        conn.execute(
+            "UPDATE machines SET name = ?, model = ?, location = ?, avg_daily_cycles = ?, extra = ? WHERE id = ?",
+            (*(machine.get(column) for column in MACHINE_COLUMNS[1:]),
+             _extra(machine, MACHINE_COLUMNS + ['service_intervals']), machine['id'])
+        )
+        self._write_intervals(conn, machine)
+
+    def persist(self, data, records, index):
+        """Utrwala w jednej transakcji operacje już wykonane na danych w pamięci"""
+        with self.transaction() as conn:
+            for record in records:
+                kind = record['op']
+                if kind == 'add_machine':
+                    machine = index.machine(record['machine']['id'])
+                    if machine is not None:
+                        position = conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM machines").fetchone()[0]
+                        self._insert_machine(conn, machine, position)
+                    continue
+                if kind == 'delete_machine':
+                    conn.execute("DELETE FROM machines WHERE id = ?", (record['machine_id'],))
+                    conn.execute("DELETE FROM service_intervals WHERE machine_id = ?", (record['machine_id'],))
+                    continue
+
+                # Dalsza operacja w tej samej paczce mogła już usunąć maszynę
+                machine = index.machine(record['machine_id'])
+                if machine is None:
+                    continue
+                if kind == 'add_cycles':
+                    # Stan liczników z pamięci - zapis idempotentny także przy kilku operacjach w paczce
+                    conn.executemany(
+                        "UPDATE service_intervals SET current_value = ? WHERE machine_id = ? AND position = ?",
+                        [(interval['current_value'], machine['id'], position)
+                         for position, interval in enumerate(machine['service_intervals'])
+                         if interval['type'] == 'cycles' and interval['enabled']]
+                    )
+                else:
+                    self._write_machine(conn, machine)
+
+            conn.executemany("INSERT OR REPLACE INTO operations (seq, record) VALUES (?, ?)",
+                             [(record['seq'], json.dumps(record, ensure_ascii=False)) for record in records])
+            conn.execute("DELETE FROM operations WHERE seq <= ?", (data['revision'] - OPERATIONS_KEEP,))
+            self._set_meta(conn, 'revision', data['revision'])
+
+    def poll_database(self, data, index):
+        """Zmiany innych procesów: (nowe dane, []) gdy trzeba wczytać całość, inaczej (None, odtworzone rekordy)"""
+        if self._meta('generation') != self._generation:
+            return self.load_database(), []
+
+        revision = self._meta('revision') or 0
+        if revision == data['revision']:
+            return None, []
+
+        rows = self.conn.execute("SELECT seq, record FROM operations WHERE seq > ? ORDER BY seq",
+                                 (data['revision'],)).fetchall()
+        if not rows or rows[0][0] != data['revision'] + 1:
+            # Brakujące operacje zostały już usunięte z tabeli - wczytaj całość
+            return self.load_database(), []
+
+        applied = []
+        for seq, line in rows:
+            record = json.loads(line)
+            apply_operation(data, record, index)
+            data['revision'] = seq
+            applied.append(record)
+        return None, applied
+
+    # --- HISTORIA ---
+    def _history_rows(self, query, params=()):
+        entries = []
+        for row in self.conn.execute(query, params):
+            entry = {column: value for column, value in zip(HISTORY_COLUMNS, row[1:6])
+                     if value is not None or column != 'machine_id'}
+            entries.append(_with_extra(entry, row[6]))
+            self._history_last_id = max(self._history_last_id, row[0])
+        return entries
+
+    def load_history(self, limit=None):
+        """Historia od najnowszych wpisów"""
+        self._history_generation = self._meta('history_generation')
+        self._history_last_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM history").fetchone()[0]
+        return self._history_rows(
+            "SELECT id, timestamp, machine, action, user, machine_id, extra FROM history ORDER BY id DESC LIMIT ?",
+            (-1 if limit is None else limit,)
+        )
+
+    def _insert_history(self, conn, entries):
+        conn.executemany(
+            "INSERT INTO history (timestamp, machine, action, user, machine_id, extra) VALUES (?, ?, ?, ?, ?, ?)",
+            [(*(entry.get(column) for column in HISTORY_COLUMNS), _extra(entry, HISTORY_COLUMNS))
+             for entry in entries]
+        )
+
+    def save_history(self, history):
+        """Nadpisuje całą historię (lista od najnowszych wpisów)"""
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM history")
+            self._insert_history(conn, reversed(list(history)))
+            generation = (self._meta('history_generation') or 0) + 1
+            self._set_meta(conn, 'history_generation', generation)
+        self._history_generation = generation
+        self._history_last_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM history").fetchone()[0]
+
+    def append_history(self, entries):
+        """Dopisuje wpisy (chronologicznie) do historii"""
+        with self.transaction() as conn:
+            self._insert_history(conn, entries)
+        self._history_last_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM history").fetchone()[0]
+
+    def split_history(self, before, archive):
+        """Przekazuje wpisy starsze niż `before` do archive(), po czym usuwa je z tabeli"""
+        archive(self._history_rows(
+            "SELECT id, timestamp, machine, action, user, machine_id, extra FROM history WHERE timestamp < ? ORDER BY id",
+            (before,)
+        ))
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM history WHERE timestamp < ?", (before,))
+            generation = (self._meta('history_generation') or 0) + 1
+            self._set_meta(conn, 'history_generation', generation)
+        self._history_generation = generation
+
+    def poll_history(self):
+        """Wpisy dopisane przez inne procesy (chronologicznie) lub None, gdy trzeba wczytać całą historię"""
+        if self._meta('history_generation') != self._history_generation:
+            return None
+        return self._history_rows(
+            "SELECT id, timestamp, machine, action, user, machine_id, extra FROM history WHERE id > ? ORDER BY id",
+            (self._history_last_id,)
+        )
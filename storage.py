@@ -0,0 +1,1564 @@
+"""Warstwa zapisu danych warsztatu - niezależna od Streamlit"""
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from collections import deque, namedtuple
+from contextlib import contextmanager
+from functools import lru_cache, partial
+from itertools import islice
+from pathlib import Path
+import copy
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+
+try:
+    import orjson
+except ImportError:  # opcjonalny, szybszy kodek JSON
+    orjson = None
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+# --- SYSTEM ZAPISU DANYCH (PERSISTENCE) ---
+DATA_DIR = Path("warsztat_data")
+DATABASE_FILE = DATA_DIR / "database.json"
+WAL_FILE = DATA_DIR / "database.wal"
+LOCK_FILE = DATA_DIR / "database.lock"
+HISTORY_FILE = DATA_DIR / "history.jsonl"
+LEGACY_HISTORY_FILE = DATA_DIR / "history.json"
+BACKUP_DIR = DATA_DIR / "backups"
+ARCHIVE_DIR = DATA_DIR / "archive"
+
+# Podział danych na lokalizacje: każda hala we własnym katalogu SHARDS_DIR/<nazwa>,
+# przypisanie lokalizacji do katalogów w SHARD_MANIFEST. Bez manifestu dane leżą w DATA_DIR
+SHARDS_DIR = DATA_DIR / "shards"
+SHARD_MANIFEST = DATA_DIR / "shards.json"
+
+# Tryb zapisu: 'snapshot' - pełny zapis bazy po każdej operacji,
+# 'wal' - operacje dopisywane do dziennika WAL, snapshot co N operacji lub sekund
+PERSISTENCE_MODE = os.environ.get("WARSZTAT_PERSISTENCE", "snapshot")
+SNAPSHOT_EVERY_OPS = int(os.environ.get("WARSZTAT_SNAPSHOT_OPS", "200"))
+SNAPSHOT_EVERY_SECONDS = int(os.environ.get("WARSZTAT_SNAPSHOT_SECONDS", "300"))
+
+# Historia: bieżący miesiąc w dzienniku, starsze miesiące spakowane w ARCHIVE_DIR.
+# Archiwa starsze niż N miesięcy są usuwane (0 = przechowuj bez limitu)
+HISTORY_RETENTION_MONTHS = int(os.environ.get("WARSZTAT_HISTORY_RETENTION_MONTHS", "0"))
+
+# Kopie zapasowe: N najnowszych oraz najnowsza kopia z każdej z ostatnich godzin, dni i tygodni
+BACKUP_KEEP_LAST = int(os.environ.get("WARSZTAT_BACKUP_KEEP_LAST", "10"))
+BACKUP_KEEP_HOURLY = int(os.environ.get("WARSZTAT_BACKUP_KEEP_HOURLY", "24"))
+BACKUP_KEEP_DAILY = int(os.environ.get("WARSZTAT_BACKUP_KEEP_DAILY", "7"))
+BACKUP_KEEP_WEEKLY = int(os.environ.get("WARSZTAT_BACKUP_KEEP_WEEKLY", "8"))
+# Automatyczna kopia (w tle) przed usunięciem maszyny/interwału i podmianą całej bazy
+BACKUP_BEFORE_DESTRUCTIVE = os.environ.get("WARSZTAT_BACKUP_BEFORE_DESTRUCTIVE", "1") != "0"
+
+# Backend zapisu: 'json' - pliki w DATA_DIR (domyślnie), 'sqlite' - baza SQLite (sqlite_storage.py)
+STORAGE_BACKEND = os.environ.get("WARSZTAT_BACKEND", "json")
+
+# Układ snapshotu bazy: 'pretty' - jeden dokument JSON z wcięciami (czytelny),
+# 'compact' - JSON Lines: nagłówek i jedna zwarta linia na maszynę (mniejszy plik, odczyt strumieniowy).
+# Odczyt rozpoznaje układ sam - zmiana ustawienia działa od następnego zapisu
+DATABASE_LAYOUT = os.environ.get("WARSZTAT_DATABASE_LAYOUT", "pretty")
+
+# Kodek JSON: 'auto' - orjson, gdy jest zainstalowany (wielokrotnie szybszy zapis dużej bazy), 'stdlib' - moduł json
+JSON_CODEC = os.environ.get("WARSZTAT_JSON_CODEC", "auto")
+
+# Operacje zmieniające listę maszyn - po nich wyniki liczone per maszyna trzeba przeliczyć w całości
+STRUCTURAL_OPS = {'add_machine', 'delete_machine'}
+
+# Operacje usuwające dane - przed nimi magazyn robi kopię zapasową
+DESTRUCTIVE_OPS = {'delete_machine', 'delete_interval'}
+
+
+class DataPaths:
+    """Pliki jednego katalogu danych - głównego (DATA_DIR) lub shardu lokalizacji"""
+
+    def __init__(self, root=DATA_DIR):
+        self.root = Path(root)
+        self.database = self.root / DATABASE_FILE.name
+        self.wal = self.root / WAL_FILE.name
+        self.lock = self.root / LOCK_FILE.name
+        self.history = self.root / HISTORY_FILE.name
+        self.legacy_history = self.root / LEGACY_HISTORY_FILE.name
+        self.backups = self.root / BACKUP_DIR.name
+        self.archive = self.root / ARCHIVE_DIR.name
+        self.sqlite = self.root / "warsztat.db"
+        self.summary = self.root / "summary.json"
+
+    def data_files(self, backend=None):
+        """Pliki z danymi backendu (nazwa -> ścieżka) - ich sygnatury zmieniają się przy każdym zapisie"""
+        if (backend or STORAGE_BACKEND) == 'sqlite':
+            wal = self.sqlite.with_name(self.sqlite.name + "-wal")
+            return {self.sqlite.name: self.sqlite, wal.name: wal}
+        return {path.name: path for path in (self.database, self.wal, self.history)}
+
+DEFAULT_PATHS = DataPaths()
+
+def ensure_data_directory(paths=DEFAULT_PATHS):
+    """Tworzy katalog na dane jeśli nie istnieje"""
+    paths.root.mkdir(parents=True, exist_ok=True)
+    paths.backups.mkdir(exist_ok=True)
+
+def get_initial_data():
+    """Pusta struktura danych - użytkownik wprowadzi dane samodzielnie"""
+    return {
+        "machines": [],
+        "revision": 0
+    }
+
+@contextmanager
+def file_lock(path=LOCK_FILE):
+    """Blokada wyłączna katalogu danych, wspólna dla wszystkich procesów"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK poddaje się po ~10 s - czekamy dalej
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def file_signature(path):
+    """Sygnatura pliku (inode, czas modyfikacji, rozmiar) lub None gdy brak pliku"""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+def read_file_bytes(path):
+    """Zawartość pliku (np. do pobrania) - czytana przy każdym wywołaniu, nic nie zostaje w pamięci"""
+    with open(path, 'rb') as f:
+        return f.read()
+
+def read_file_page(path, page, page_size=64 * 1024):
+    """Tekst jednej strony pliku (page_size bajtów) - podgląd dużego pliku bez czytania całości"""
+    with open(path, 'rb') as f:
+        f.seek(page * page_size)
+        return f.read(page_size).decode('utf-8', errors='ignore')
+
+def json_codec():
+    """Nazwa używanego kodeka JSON: 'orjson' lub 'stdlib'"""
+    return 'orjson' if orjson is not None and JSON_CODEC != 'stdlib' else 'stdlib'
+
+def json_loads(raw):
+    """Dekoduje JSON z bajtów lub tekstu"""
+    if json_codec() == 'orjson':
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+def json_dumps(payload, indent=False, sort_keys=False):
+    """Koduje JSON do bajtów UTF-8 - z wcięciem 2 lub zwarty (jedna linia)"""
+    if json_codec() == 'orjson':
+        option = (orjson.OPT_INDENT_2 if indent else 0) | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        return orjson.dumps(payload, option=option)
+    if indent:
+        return json.dumps(payload, indent=2, ensure_ascii=False, sort_keys=sort_keys).encode('utf-8')
+    return json.dumps(payload, ensure_ascii=False, sort_keys=sort_keys, separators=(',', ':')).encode('utf-8')
+
+def write_bytes_atomic(path, body):
+    """Zapisuje treść przez plik tymczasowy, fsync i atomową zamianę nazwy"""
+    tmp_file = path.with_name(path.name + ".tmp")
+    with open(tmp_file, 'wb') as f:
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, path)
+
+    # Utrwal wpis katalogu po zmianie nazwy (niedostępne na Windows)
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(path.parent, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+# --- OPERACJE NA DANYCH ---
+def machine_number(machine_id):
+    """Numer z ID maszyny w formacie M<numer> (0 dla ID w innym formacie)"""
+    number = machine_id[1:]
+    return int(number) if machine_id.startswith('M') and number.isdigit() else 0
+
+class FleetIndex:
+    """Indeksy floty: maszyny po ID i nazwie, interwały po (ID maszyny, nazwa).
+
+    Indeks odwołuje się do tych samych słowników co dane, więc wyszukiwanie
+    i modyfikacje nie wymagają przeglądania listy maszyn. Operacje zmieniające
+    strukturę (dodanie, usunięcie, zmiana nazwy) muszą przejść przez
+    apply_operation(), które aktualizuje indeks razem z danymi.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.by_id = {}
+        self.by_name = {}
+        self.intervals = {}
+        self._max_number = 0
+        self._positions = None
+        self._ids = None
+        for machine in data['machines']:
+            self._index_machine(machine)
+
+    def _index_machine(self, machine):
+        self.by_id[machine['id']] = machine
+        self.by_name.setdefault(machine['name'], []).append(machine)
+        self._index_intervals(machine)
+        self._max_number = max(self._max_number, machine_number(machine['id']))
+
+    def _index_intervals(self, machine):
+        for interval in machine['service_intervals']:
+            # Przy powtórzonych nazwach wygrywa pierwszy interwał - jak w dawnym przeszukiwaniu listy
+            self.intervals.setdefault((machine['id'], interval['name']), interval)
+
+    def _unindex_intervals(self, machine):
+        for interval in machine['service_intervals']:
+            self.intervals.pop((machine['id'], interval['name']), None)
+
+    def _unindex_name(self, machine, name):
+        same_name = self.by_name.get(name, [])
+        same_name[:] = [m for m in same_name if m is not machine]
+        if not same_name:
+            self.by_name.pop(name, None)
+
+    def machine(self, machine_id):
+        """Maszyna o podanym ID lub None"""
+        return self.by_id.get(machine_id)
+
+    def machine_by_name(self, name):
+        """Pierwsza maszyna o podanej nazwie lub None"""
+        same_name = self.by_name.get(name)
+        return same_name[0] if same_name else None
+
+    def interval(self, machine_id, name):
+        """Interwał maszyny o podanej nazwie lub None"""
+        return self.intervals.get((machine_id, name))
+
+    def ids(self):
+        """ID maszyn w kolejności listy (przeliczane tylko po dodaniu/usunięciu maszyny)"""
+        if self._ids is None:
+            self._ids = [m['id'] for m in self.data['machines']]
+        return self._ids
+
+    def position(self, machine_id):
+        """Pozycja maszyny na liście maszyn"""
+        if self._positions is None:
+            self._positions = {machine_id: idx for idx, machine_id in enumerate(self.ids())}
+        return self._positions[machine_id]
+
+    def new_machine_id(self):
+        """Kolejne wolne ID maszyny (M01, M02, ...)"""
+        return f"M{self._max_number + 1:02d}"
+
+    def added_machine(self, machine):
+        self._index_machine(machine)
+        if self._ids is not None:
+            self._ids.append(machine['id'])
+        if self._positions is not None:
+            self._positions[machine['id']] = len(self._positions)
+
+    def removed_machine(self, machine):
+        self.by_id.pop(machine['id'], None)
+        self._unindex_name(machine, machine['name'])
+        self._unindex_intervals(machine)
+        self._ids = self._positions = None
+
+    def renamed_machine(self, machine, old_name):
+        self._unindex_name(machine, old_name)
+        self.by_name.setdefault(machine['name'], []).append(machine)
+
+    def changed_intervals(self, machine, old_names=()):
+        for name in old_names:
+            self.intervals.pop((machine['id'], name), None)
+        self._unindex_intervals(machine)
+        self._index_intervals(machine)
+
+    def replaced_machine(self, old, new):
+        self.by_id[new['id']] = new
+        same_name = self.by_name.get(new['name'], [])
+        same_name[:] = [new if m is old else m for m in same_name]
+        self._unindex_intervals(old)
+        self._index_intervals(new)
+
+def find_interval(machine, op, index):
+    """Zwraca interwał z operacji - po pozycji, a gdy ta jest nieaktualna, po nazwie"""
+    intervals = machine['service_intervals']
+    position = op.get('index')
+    if position is not None and position < len(intervals) and intervals[position]['name'] == op['interval']:
+        return intervals[position]
+    return index.interval(machine['id'], op['interval'])
+
+def apply_operation(data, op, index):
+    """Wykonuje operację na bazie i zwraca maszynę, której dotyczyła (None = odrzucona)"""
+    kind = op['op']
+
+    if kind == 'add_machine':
+        if index.machine(op['machine']['id']) is not None:
+            return None
+        machine = copy.deepcopy(op['machine'])
+        data['machines'].append(machine)
+        index.added_machine(machine)
+        return machine
+
+    machine = index.machine(op['machine_id'])
+    if machine is None:
+        return None
+
+    if kind == 'add_cycles':
+        for interval in machine['service_intervals']:
+            if interval['type'] == 'cycles' and interval['enabled']:
+                interval['current_value'] += op['cycles']
+    elif kind == 'reset_interval':
+        interval = find_interval(machine, op, index)
+        if interval is None:
+            return None
+        interval['current_value'] = 0
+        interval['last_service'] = op['date']
+    elif kind == 'update_machine':
+        old_name = machine['name']
+        machine.update(op['fields'])
+        if machine['name'] != old_name:
+            index.renamed_machine(machine, old_name)
+    elif kind == 'delete_machine':
+        del data['machines'][index.position(machine['id'])]
+        index.removed_machine(machine)
+    elif kind == 'add_interval':
+        machine['service_intervals'].append(dict(op['interval']))
+        index.changed_intervals(machine)
+    elif kind in ('update_interval', 'delete_interval'):
+        interval = find_interval(machine, op, index)
+        if interval is None:
+            return None
+        old_name = interval['name']
+        if kind == 'update_interval':
+            interval.update(op['fields'])
+        else:
+            intervals = machine['service_intervals']
+            del intervals[next(i for i, other in enumerate(intervals) if other is interval)]
+        index.changed_intervals(machine, [old_name])
+    else:
+        raise ValueError(f"Nieznana operacja: {kind}")
+
+    return machine
+
+class FleetDraft:
+    """Kopia robocza bazy typu copy-on-write.
+
+    Zamiast głębokiej kopii całej bazy draft ma własną listę maszyn, a słowniki
+    maszyn współdzieli z danymi źródłowymi. Maszyna jest kopiowana dopiero przy
+    pierwszej zmianie w drafcie (apply()), więc otwarcie konfiguracji kosztuje
+    tyle co skopiowanie listy. Niezmienione maszyny pokazują bieżący stan
+    źródła - operacje wykonane na źródle wystarczy przekazać do follow().
+    """
+
+    def __init__(self, data):
+        self.data = {**data, 'machines': list(data['machines'])}
+        self.index = FleetIndex(self.data)
+        self.owned = set()  # ID maszyn skopiowanych do draftu
+
+    def _own(self, machine_id):
+        machine = self.index.machine(machine_id)
+        if machine is None or machine_id in self.owned:
+            return
+        own = copy.deepcopy(machine)
+        self.data['machines'][self.index.position(machine_id)] = own
+        self.index.replaced_machine(machine, own)
+        self.owned.add(machine_id)
+
+    def apply(self, op):
+        """Wykonuje operację na drafcie (apply_operation) - zmieniana maszyna jest najpierw kopiowana"""
+        if op['op'] != 'add_machine':
+            self._own(op['machine_id'])
+        machine = apply_operation(self.data, op, self.index)
+        if machine is not None and op['op'] == 'add_machine':
+            self.owned.add(machine['id'])
+        return machine
+
+    def follow(self, op, machine=None):
+        """Uwzględnia operację wykonaną już na danych źródłowych (`machine` - maszyna źródła, której dotyczyła).
+
+        Dodanie i usunięcie maszyny zmienia listę maszyn draftu zawsze, pozostałe
+        operacje tylko maszyny skopiowane do draftu - resztę draft widzi przez źródło.
+        """
+        kind = op['op']
+        if kind == 'add_machine' and machine is not None:
+            # Nowa maszyna źródła - współdzielona jak pozostałe niezmienione maszyny
+            if self.index.machine(machine['id']) is None:
+                self.data['machines'].append(machine)
+                self.index.added_machine(machine)
+        elif kind in STRUCTURAL_OPS or op.get('machine_id') in self.owned:
+            machine = apply_operation(self.data, op, self.index)
+            if machine is not None and kind == 'add_machine':
+                self.owned.add(machine['id'])
+            elif kind == 'delete_machine':
+                self.owned.discard(op['machine_id'])
+
+# --- BAZA DANYCH: SNAPSHOT + WAL ---
+def replay_wal(data, offset=0, index=None, applied=None, paths=DEFAULT_PATHS):
+    """Odtwarza operacje z WAL nowsze niż rewizja danych, zwraca nowy offset w pliku"""
+    if not paths.wal.exists():
+        return 0
+    index = index or FleetIndex(data)
+
+    with open(paths.wal, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                # Urwana ostatnia linia po awarii lub zapis w toku
+                break
+            offset += len(line)
+            record = json_loads(line)
+            if record['seq'] <= data['revision']:
+                continue
+            apply_operation(data, record, index)
+            data['revision'] = record['seq']
+            if applied is not None:
+                applied.append(record)
+
+    return offset
+
+def _compact_header(line):
+    """Nagłówek snapshotu w układzie JSON Lines lub None (snapshot jako jeden dokument)"""
+    try:
+        header = json_loads(line)
+    except ValueError:
+        # Np. pierwsza linia '{' dokumentu z wcięciami
+        return None
+    return header if isinstance(header, dict) and header.get('layout') == 'jsonl' else None
+
+def encode_snapshot(data, layout=None):
+    """Treść snapshotu w wybranym układzie ('pretty' lub 'compact', domyślnie DATABASE_LAYOUT)"""
+    layout = layout or DATABASE_LAYOUT
+    if layout == 'pretty':
+        return json_dumps(data, indent=True)
+    if layout != 'compact':
+        raise ValueError(f"Nieznany układ bazy: {layout}")
+    header = {'layout': 'jsonl', 'machine_count': len(data['machines'])}
+    header.update((key, value) for key, value in data.items() if key != 'machines')
+    return b"".join([json_dumps(header) + b"\n"] + [json_dumps(machine) + b"\n" for machine in data['machines']])
+
+@lru_cache(maxsize=8)
+def _snapshot_layout(path, signature):
+    with open(path, 'rb') as f:
+        return 'compact' if _compact_header(f.readline()) is not None else 'pretty'
+
+def snapshot_layout(path=DATABASE_FILE):
+    """Układ pliku snapshotu: 'compact' lub 'pretty' (pamiętany, dopóki plik się nie zmieni)"""
+    return _snapshot_layout(str(path), file_signature(path))
+
+def iter_snapshot_machines(path=DATABASE_FILE, location=None):
+    """Maszyny ze snapshotu po kolei, opcjonalnie tylko z danej lokalizacji.
+
+    W układzie JSON Lines plik jest czytany linia po linii, a linie bez nazwy
+    lokalizacji w treści są pomijane bez dekodowania. Snapshot z wcięciami
+    trzeba wczytać w całości.
+    """
+    needle = json_dumps(location) if location is not None else None
+    with open(path, 'rb') as f:
+        if _compact_header(f.readline()) is None:
+            f.seek(0)
+            machines = json_loads(f.read())['machines']
+        else:
+            machines = (json_loads(line) for line in f if line.strip() and (needle is None or needle in line))
+        for machine in machines:
+            if location is None or machine.get('location') == location:
+                yield machine
+
+def read_snapshot(path=DATABASE_FILE):
+    """Wczytuje sam snapshot bazy (bez WAL) w dowolnym układzie"""
+    with open(path, 'rb') as f:
+        data = _compact_header(f.readline())
+        if data is None:
+            f.seek(0)
+            data = json_loads(f.read())
+        else:
+            data.pop('layout')
+            data['machines'] = [json_loads(line) for line in f if line.strip()]
+            if len(data['machines']) != data.pop('machine_count', len(data['machines'])):
+                raise ValueError("Niepełny plik database.json (liczba maszyn niezgodna z nagłówkiem)")
+
+    if not isinstance(data, dict) or 'machines' not in data:
+        raise ValueError("Nieprawidłowa struktura pliku database.json")
+
+    # Bazy zapisane przed wprowadzeniem rewizji
+    data.setdefault('revision', data.pop('wal_seq', 0))
+    return data
+
+def read_database(paths=DEFAULT_PATHS):
+    """Wczytuje snapshot bazy i odtwarza na nim ogon WAL"""
+    data = read_snapshot(paths.database)
+    replay_wal(data, paths=paths)
+    return data
+
+def save_database(data, layout=None, paths=DEFAULT_PATHS):
+    """Zapisuje pełny snapshot bazy danych (układ jak w encode_snapshot) i czyści dziennik WAL"""
+    ensure_data_directory(paths)
+
+    # Walidacja danych przed zapisem
+    if not isinstance(data, dict) or 'machines' not in data:
+        raise ValueError("Nieprawidłowa struktura danych!")
+
+    # Zapisz dane - snapshot obejmuje wszystkie operacje z WAL
+    write_bytes_atomic(paths.database, encode_snapshot(data, layout))
+    if paths.wal.exists():
+        paths.wal.unlink()
+
+def append_wal(records, paths=DEFAULT_PATHS):
+    """Dopisuje rekordy operacji do dziennika WAL (z fsync)"""
+    ensure_data_directory(paths)
+
+    lines = b"".join(json_dumps(record) + b"\n" for record in records)
+    with open(paths.wal, 'a+b') as f:
+        # Urwany rekord po awarii nigdy nie został zatwierdzony - obcinamy go
+        if f.seek(0, os.SEEK_END) > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.seek(0)
+                f.truncate(f.read().rfind(b"\n") + 1)
+        f.write(lines)
+        f.flush()
+        os.fsync(f.fileno())
+
+def load_database(paths=DEFAULT_PATHS):
+    """Wczytuje bazę danych (snapshot + WAL) lub tworzy nową"""
+    ensure_data_directory(paths)
+
+    if not paths.database.exists():
+        # Pierwsza inicjalizacja - utwórz pustą bazę
+        initial_data = get_initial_data()
+        save_database(initial_data, paths=paths)
+        return initial_data
+
+    try:
+        return read_database(paths)
+    except ValueError as e:  # także json.JSONDecodeError
+        # Uszkodzonego pliku nie nadpisujemy - zostaje obok do ręcznej naprawy
+        corrupt_file = paths.database.with_name(f"database.corrupt_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        os.replace(paths.database, corrupt_file)
+        logger.error("Błąd odczytu database.json (%s) - plik przeniesiono do %s, tworzę nową bazę", e, corrupt_file)
+        initial_data = get_initial_data()
+        save_database(initial_data, paths=paths)
+        return initial_data
+
+# --- KOPIE ZAPASOWE (GZIP, DEDUPLIKACJA, RETENCJA) ---
+BackupFile = namedtuple('BackupFile', 'path created revision digest')
+
+BACKUP_NAME = re.compile(r"^database_(\d{8}_\d{6})_r(\d+)_([0-9a-f]{16})\.json\.gz$")
+LEGACY_BACKUP_NAME = re.compile(r"^database_backup_(\d{8}_\d{6})\.json$")
+
+def list_backups(backup_dir=BACKUP_DIR):
+    """Kopie zapasowe od najnowszej (także dawne pełne kopie database_backup_*.json)"""
+    if not backup_dir.exists():
+        return []
+    backups = []
+    for path in backup_dir.iterdir():
+        match = BACKUP_NAME.match(path.name)
+        if match:
+            backups.append(BackupFile(path, datetime.strptime(match[1], "%Y%m%d_%H%M%S"), int(match[2]), match[3]))
+            continue
+        match = LEGACY_BACKUP_NAME.match(path.name)
+        if match:
+            backups.append(BackupFile(path, datetime.strptime(match[1], "%Y%m%d_%H%M%S"), None, None))
+    backups.sort(key=lambda backup: (backup.created, backup.path.name), reverse=True)
+    return backups
+
+def read_backup(backup):
+    """Dane bazy zapisane w kopii zapasowej"""
+    if backup.digest is None:
+        with open(backup.path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    with gzip.open(backup.path, 'rb') as f:
+        data = json_loads(f.read())
+    data['revision'] = backup.revision
+    return data
+
+def backups_to_keep(backups, keep_last=BACKUP_KEEP_LAST, hourly=BACKUP_KEEP_HOURLY,
+                    daily=BACKUP_KEEP_DAILY, weekly=BACKUP_KEEP_WEEKLY):
+    """Ścieżki kopii objętych retencją: N najnowszych i najnowsza kopia z każdej z ostatnich godzin, dni i tygodni"""
+    keep = {backup.path for backup in backups[:max(keep_last, 1)]}
+    for count, period in ((hourly, "%Y-%m-%d %H"), (daily, "%Y-%m-%d"), (weekly, "%G-%V")):
+        periods = []
+        for backup in backups:
+            key = backup.created.strftime(period)
+            if periods and periods[-1] == key:
+                continue
+            if len(periods) >= count:
+                break
+            periods.append(key)
+            keep.add(backup.path)
+    return keep
+
+class BackupEngine:
+    """Kopie zapasowe bazy jako pliki gzip nazwane skrótem treści.
+
+    snapshot() serializuje dane (wywoływane pod blokadą magazynu - spójny stan),
+    write() kompresuje i zapisuje kopię, a potem usuwa kopie spoza retencji.
+    Kopia o tej samej treści co ostatnia nie jest zapisywana - rewizja nie
+    wchodzi do skrótu. write_async() wykonuje write() w wątku w tle.
+    """
+
+    def __init__(self, backup_dir=BACKUP_DIR, retention=None):
+        self.backup_dir = backup_dir
+        self.retention = retention or {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def snapshot(self, data):
+        """Treść kopii: (JSON bez rewizji, skrót treści, rewizja)"""
+        content = {key: value for key, value in data.items() if key != 'revision'}
+        body = json_dumps(content, sort_keys=True)
+        return body, hashlib.sha256(body).hexdigest()[:16], data.get('revision', 0)
+
+    def write(self, body, digest, revision):
+        """Zapisuje kopię, zwraca (kopia, czy zapisano) - przy niezmienionej treści (ostatnia kopia, False)"""
+        with self._lock:
+            latest = next(iter(list_backups(self.backup_dir)), None)
+            if latest is not None and latest.digest == digest:
+                return latest, False
+
+            self.backup_dir.mkdir(parents=True, exist_ok=True)
+            created = datetime.now().replace(microsecond=0)
+            path = self.backup_dir / f"database_{created.strftime('%Y%m%d_%H%M%S')}_r{revision}_{digest}.json.gz"
+            tmp_file = path.with_name(path.name + ".tmp")
+            with open(tmp_file, 'wb') as raw:
+                # mtime=0 - ta sama treść daje identyczny plik
+                with gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+                    f.write(body)
+                raw.flush()
+                os.fsync(raw.fileno())
+            os.replace(tmp_file, path)
+
+            self.prune()
+            return BackupFile(path, created, revision, digest), True
+
+    def write_async(self, body, digest, revision):
+        """write() w wątku w tle (kopie zapisywane po kolei), zwraca Future"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="backup")
+        future = self._executor.submit(self.write, body, digest, revision)
+        future.add_done_callback(self._log_failure)
+        return future
+
+    @staticmethod
+    def _log_failure(future):
+        if future.exception() is not None:
+            logger.error("Błąd automatycznej kopii zapasowej: %s", future.exception())
+
+    def prune(self):
+        """Usuwa kopie spoza retencji"""
+        backups = list_backups(self.backup_dir)
+        keep = backups_to_keep(backups, **self.retention)
+        for backup in backups:
+            if backup.path not in keep:
+                backup.path.unlink(missing_ok=True)
+
+# --- HISTORIA OPERACJI (DZIENNIK JSON LINES) ---
+def save_history(history, paths=DEFAULT_PATHS):
+    """Nadpisuje cały dziennik historii (lista od najnowszych wpisów)"""
+    ensure_data_directory(paths)
+
+    # Dziennik przechowuje wpisy chronologicznie - najstarszy w pierwszej linii
+    tmp_file = paths.history.with_suffix(".jsonl.tmp")
+    with open(tmp_file, 'wb') as f:
+        for entry in reversed(list(history)):
+            f.write(json_dumps(entry) + b"\n")
+    os.replace(tmp_file, paths.history)
+
+def append_history(entries, paths=DEFAULT_PATHS):
+    """Dopisuje wpisy na końcu dziennika historii, zwraca rozmiar pliku po zapisie"""
+    ensure_data_directory(paths)
+
+    lines = b"".join(json_dumps(entry) + b"\n" for entry in entries)
+    with open(paths.history, 'a+b') as f:
+        # Domknij linię urwaną przez awarię, żeby nie skleić jej z nowym wpisem
+        if f.seek(0, os.SEEK_END) > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                lines = b"\n" + lines
+        f.write(lines)
+        return f.tell()
+
+def iter_history_reversed(path=HISTORY_FILE, block_size=64 * 1024):
+    """Czyta dziennik od końca i zwraca wpisy od najnowszego"""
+    if not path.exists():
+        return
+
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        remainder = b""
+
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            block = f.read(read_size) + remainder
+            lines = block.split(b"\n")
+            # Pierwsza linia bloku może być niepełna - doczytamy ją z kolejnym blokiem
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                entry = _parse_history_line(line)
+                if entry is not None:
+                    yield entry
+
+        entry = _parse_history_line(remainder)
+        if entry is not None:
+            yield entry
+
+def read_history_tail(offset, paths=DEFAULT_PATHS):
+    """Zwraca wpisy dopisane do dziennika za podanym offsetem (chronologicznie)"""
+    with open(paths.history, 'rb') as f:
+        f.seek(offset)
+        return [entry for entry in map(_parse_history_line, f) if entry is not None]
+
+def _parse_history_line(line):
+    """Dekoduje linię dziennika, pomijając puste i uszkodzone wpisy"""
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        entry = json_loads(line)
+    except (ValueError, UnicodeDecodeError):
+        # Np. niedokończona linia po awarii w trakcie zapisu
+        return None
+    return entry if isinstance(entry, dict) else None
+
+def migrate_legacy_history(paths=DEFAULT_PATHS):
+    """Jednorazowa migracja history.json do dziennika history.jsonl"""
+    if paths.history.exists() or not paths.legacy_history.exists():
+        return
+
+    try:
+        with open(paths.legacy_history, 'r', encoding='utf-8') as f:
+            history = json.load(f)
+    except json.JSONDecodeError:
+        logger.warning("Błąd odczytu history.json - pomijam migrację historii")
+        history = []
+
+    save_history(history if isinstance(history, list) else [], paths)
+    paths.legacy_history.rename(paths.legacy_history.with_suffix(".json.migrated"))
+
+def load_history(limit=None, paths=DEFAULT_PATHS):
+    """Wczytuje historię operacji z dziennika (od najnowszych wpisów)"""
+    ensure_data_directory(paths)
+    migrate_legacy_history(paths)
+
+    return list(islice(iter_history_reversed(paths.history), limit))
+
+# --- ARCHIWUM HISTORII (MIESIĘCZNE SEGMENTY GZIP) ---
+def archive_file(month, paths=DEFAULT_PATHS):
+    """Plik archiwum dla miesiąca 'RRRR-MM'"""
+    return paths.archive / f"history_{month}.jsonl.gz"
+
+def list_history_archives(paths=DEFAULT_PATHS):
+    """Miesiące ('RRRR-MM') z archiwum historii, od najstarszego"""
+    if not paths.archive.exists():
+        return []
+    return sorted(path.name[len("history_"):-len(".jsonl.gz")] for path in paths.archive.glob("history_*.jsonl.gz"))
+
+def read_history_archive(month, paths=DEFAULT_PATHS):
+    """Wpisy z archiwum miesiąca (chronologicznie)"""
+    path = archive_file(month, paths)
+    return _read_archive_file(path) if path.exists() else []
+
+def _read_archive_file(path):
+    with gzip.open(path, 'rb') as f:
+        return [entry for entry in map(_parse_history_line, f) if entry is not None]
+
+def archive_history(entries, paths=DEFAULT_PATHS):
+    """Dopisuje wpisy do archiwów ich miesięcy (atomowo, ponowne archiwizowanie nie dubluje wpisów)"""
+    by_month = {}
+    for entry in entries:
+        by_month.setdefault(entry.get('timestamp', '')[:7], []).append(entry)
+    if not by_month:
+        return
+
+    paths.archive.mkdir(parents=True, exist_ok=True)
+    for month, month_entries in by_month.items():
+        archived = read_history_archive(month, paths)
+        known = {json.dumps(entry, sort_keys=True) for entry in archived}
+        merged = archived + [entry for entry in month_entries if json.dumps(entry, sort_keys=True) not in known]
+        merged.sort(key=lambda entry: entry.get('timestamp', ''))
+
+        path = archive_file(month, paths)
+        tmp_file = path.with_name(path.name + ".tmp")
+        with open(tmp_file, 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                for entry in merged:
+                    f.write(json_dumps(entry) + b"\n")
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_file, path)
+
+def prune_history_archives(retention_months=HISTORY_RETENTION_MONTHS, today=None, paths=DEFAULT_PATHS):
+    """Usuwa archiwa starsze niż okres przechowywania"""
+    if retention_months <= 0:
+        return
+    today = today or datetime.now().date()
+    oldest = today.year * 12 + today.month - 1 - retention_months
+    for month in list_history_archives(paths):
+        year, number = map(int, month.split("-"))
+        if year * 12 + number - 1 < oldest:
+            archive_file(month, paths).unlink()
+            logger.info("Usunięto archiwum historii %s (retencja %d mies.)", month, retention_months)
+
+@lru_cache(maxsize=24)
+def _archive_segment(path, signature):
+    """Segment archiwum jako HistoryLog - archiwa się nie zmieniają, więc wynik jest pamiętany"""
+    return HistoryLog(list(reversed(_read_archive_file(path))))
+
+def archive_segment(month, paths=DEFAULT_PATHS):
+    """Indeksowany segment historii z archiwum miesiąca"""
+    path = archive_file(month, paths)
+    signature = file_signature(path)
+    return _archive_segment(str(path), signature) if signature is not None else HistoryLog()
+
+def make_history_entry(machine_name, action, user="System", machine_id=None):
+    """Tworzy wpis historii z bieżącym znacznikiem czasu"""
+    entry = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "machine": machine_name,
+        "action": action,
+        "user": user
+    }
+    if machine_id is not None:
+        entry["machine_id"] = machine_id
+    return entry
+
+# Rodzaj operacji rozpoznawany po początku opisu akcji (pierwsze dopasowanie wygrywa)
+ACTION_TYPES = [
+    ("Dodano nową maszynę", "Nowa maszyna"),
+    ("Usunięto maszynę", "Usunięcie maszyny"),
+    ("Dodano interwał", "Nowy interwał"),
+    ("Usunięto interwał", "Usunięcie interwału"),
+    ("Wykonano:", "Serwis"),
+    ("Dodano", "Cykle"),
+]
+
+def action_type(action):
+    """Rodzaj operacji dla opisu akcji z historii"""
+    for prefix, label in ACTION_TYPES:
+        if action.startswith(prefix):
+            return label
+    return "Inne"
+
+class HistoryLog:
+    """Historia operacji w pamięci z indeksami do filtrowania i stronicowania.
+
+    Wpisy leżą chronologicznie, więc dopisanie nie przesuwa pozycji w indeksach
+    (maszyna, rodzaj akcji, użytkownik -> rosnąca lista pozycji), a zakres dat
+    wyznacza wyszukiwanie binarne po znacznikach czasu. Iteracja i strony
+    zwracają wpisy od najnowszego, jak dawna lista historii.
+    """
+
+    def __init__(self, entries=()):
+        self.entries = []
+        self.timestamps = []
+        self.types = []
+        self.by_machine = {}
+        self.by_action_type = {}
+        self.by_user = {}
+        # Wejście jak z load_history() - od najnowszych
+        for entry in reversed(list(entries)):
+            self.append(entry)
+
+    def append(self, entry):
+        """Dopisuje najnowszy wpis"""
+        position = len(self.entries)
+        self.entries.append(entry)
+        self.timestamps.append(entry.get('timestamp', ''))
+        self.types.append(action_type(entry.get('action', '')))
+        self.by_machine.setdefault(entry.get('machine'), []).append(position)
+        self.by_action_type.setdefault(self.types[-1], []).append(position)
+        self.by_user.setdefault(entry.get('user'), []).append(position)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return reversed(self.entries)
+
+    def __reversed__(self):
+        return iter(self.entries)
+
+    def select(self, machine=None, action_type=None, user=None, date_from=None, date_to=None):
+        """Rosnące pozycje wpisów spełniających filtry (bez kopiowania samych wpisów)"""
+        start = bisect_left(self.timestamps, str(date_from)) if date_from else 0
+        end = bisect_left(self.timestamps, str(date_to + timedelta(days=1))) if date_to else len(self.entries)
+
+        lists = [index.get(value, []) for index, value in
+                 ((self.by_machine, machine), (self.by_action_type, action_type), (self.by_user, user))
+                 if value is not None]
+        if not lists:
+            return range(start, end)
+
+        # Najkrótsza lista z indeksu zawężona do zakresu dat, pozostałe filtry sprawdzane na wpisach
+        shortest = min(lists, key=len)
+        positions = shortest[bisect_left(shortest, start):bisect_left(shortest, end)]
+        if len(lists) == 1:
+            return positions
+        entries, types = self.entries, self.types
+        return [position for position in positions
+                if (machine is None or entries[position].get('machine') == machine)
+                and (action_type is None or types[position] == action_type)
+                and (user is None or entries[position].get('user') == user)]
+
+    def page(self, positions, offset=0, limit=50):
+        """Wpisy z wybranych pozycji od najnowszego: pomija `offset`, zwraca najwyżej `limit`"""
+        end = max(len(positions) - offset, 0)
+        return [self.entries[position] for position in reversed(positions[max(end - limit, 0):end])]
+
+def query_segments(segments, offset=0, limit=50, **filters):
+    """Strona wpisów z kolejnych segmentów historii (od najstarszego) i liczba wszystkich pasujących"""
+    selections = [(segment, segment.select(**filters)) for segment in segments]
+    total = sum(len(positions) for _, positions in selections)
+
+    entries = []
+    for segment, positions in reversed(selections):
+        if offset >= len(positions):
+            offset -= len(positions)
+            continue
+        entries.extend(segment.page(positions, offset, limit - len(entries)))
+        offset = 0
+        if len(entries) >= limit:
+            break
+    return entries, total
+
+# --- BACKENDY ZAPISU ---
+class JsonBackend:
+    """Backend plikowy: snapshot database.json z dziennikiem WAL i historia history.jsonl.
+
+    Metody backendu wywołuje FleetStore pod blokadą locked(). Backend pamięta
+    stan plików po własnym odczycie lub zapisie, dzięki czemu poll_*() wykrywa
+    zmiany wprowadzone przez inne procesy.
+    """
+
+    name = "json"
+
+    def __init__(self, paths=None):
+        self.paths = paths or DEFAULT_PATHS
+        self.database_file = self.paths.database
+        self.snapshot_revision = 0
+        self.snapshot_time = time.time()
+        self._snapshot_signature = None
+        self._wal_offset = 0
+        self._history_signature = None
+
+    def _remember_database(self, wal_offset=None):
+        """Zapamiętuje stan plików bazy po własnym odczycie lub zapisie.
+
+        `wal_offset` to koniec ostatniego pełnego rekordu WAL (z replay_wal) -
+        urwana linia za nim zostanie przeczytana ponownie, gdy ktoś ją dokończy
+        lub obetnie. Bez niego przyjmowany jest rozmiar pliku (po własnym zapisie).
+        """
+        self._snapshot_signature = file_signature(self.paths.database)
+        if wal_offset is None:
+            wal_offset = self.paths.wal.stat().st_size if self.paths.wal.exists() else 0
+        self._wal_offset = wal_offset
+
+    def load_database(self):
+        """Wczytuje bazę; ogon WAL odtworzony przy odczycie od razu trafia do nowego snapshotu"""
+        data = load_database(self.paths)
+        if self.paths.wal.exists():
+            self.save_database(data)
+        else:
+            self.snapshot_revision = data['revision']
+            self.snapshot_time = time.time()
+            self._remember_database()
+        return data
+
+    def read_database(self):
+        """Odczyt bazy bez zmiany stanu backendu (np. do backupu)"""
+        return read_database(self.paths)
+
+    def save_database(self, data):
+        """Zapisuje pełny snapshot bazy"""
+        save_database(data, paths=self.paths)
+        self.snapshot_revision = data['revision']
+        self.snapshot_time = time.time()
+        self._remember_database()
+
+    def persist(self, data, records, index):
+        """Utrwala operacje już wykonane na danych w pamięci (zgodnie z PERSISTENCE_MODE)"""
+        if PERSISTENCE_MODE != 'wal':
+            self.save_database(data)
+            return
+
+        append_wal(records, self.paths)
+        self._remember_database()
+
+        # Kompaktowanie: nowy snapshot co N operacji lub co określony czas
+        pending = data['revision'] - self.snapshot_revision
+        if pending >= SNAPSHOT_EVERY_OPS or time.time() - self.snapshot_time >= SNAPSHOT_EVERY_SECONDS:
+            self.save_database(data)
+
+    def poll_database(self, data, index):
+        """Zmiany innych procesów: (nowe dane, []) gdy trzeba wczytać całość, inaczej (None, odtworzone rekordy)"""
+        wal_size = self.paths.wal.stat().st_size if self.paths.wal.exists() else 0
+        if file_signature(self.paths.database) != self._snapshot_signature or wal_size < self._wal_offset:
+            # Inny proces zapisał nowy snapshot (albo WAL się skrócił) - wczytaj całość
+            data = read_snapshot(self.paths.database)
+            offset = replay_wal(data, paths=self.paths)
+            self.snapshot_revision = data['revision']
+            self._remember_database(offset)
+            return data, []
+
+        applied = []
+        if wal_size != self._wal_offset:
+            # Tylko nowe operacje w WAL - odtwórz sam ogon
+            self._wal_offset = replay_wal(data, self._wal_offset, index, applied, self.paths)
+        return None, applied
+
+    def load_history(self, limit=None):
+        """Historia od najnowszych wpisów"""
+        history = load_history(limit, self.paths)
+        self._history_signature = file_signature(self.paths.history)
+        return history
+
+    def save_history(self, history):
+        """Nadpisuje całą historię (lista od najnowszych wpisów)"""
+        save_history(history, self.paths)
+        self._history_signature = file_signature(self.paths.history)
+
+    def append_history(self, entries):
+        """Dopisuje wpisy (chronologicznie) do historii"""
+        append_history(entries, self.paths)
+        self._history_signature = file_signature(self.paths.history)
+
+    def split_history(self, before, archive):
+        """Przekazuje wpisy starsze niż `before` do archive(), po czym usuwa je z bieżącego dziennika"""
+        history = load_history(paths=self.paths)
+        keep = [entry for entry in history if entry.get('timestamp', '') >= before]
+        archive([entry for entry in reversed(history) if entry.get('timestamp', '') < before])
+        self.save_history(keep)
+
+    def poll_history(self):
+        """Wpisy dopisane przez inne procesy (chronologicznie) lub None, gdy trzeba wczytać całą historię"""
+        signature = file_signature(self.paths.history)
+        known = self._history_signature
+        if signature == known:
+            return []
+
+        self._history_signature = signature
+        if known is not None and signature is not None and signature[0] == known[0] and signature[2] > known[2]:
+            return read_history_tail(known[2], self.paths)
+        return None
+
+def get_backend(name=None, paths=None):
+    """Tworzy backend zapisu wybrany w STORAGE_BACKEND (domyślnie w głównym katalogu danych)"""
+    name = name or STORAGE_BACKEND
+    if name == 'json':
+        return JsonBackend(paths)
+    if name == 'sqlite':
+        from sqlite_storage import SqliteBackend
+        return SqliteBackend(paths.sqlite if paths is not None else None)
+    raise ValueError(f"Nieznany backend zapisu: {name}")
+
+# --- WSPÓLNY MAGAZYN DANYCH (JEDEN NA PROCES) ---
+class FleetStore:
+    """Jedna kopia floty i historii współdzielona przez wszystkie sesje procesu.
+
+    Zapisy są serializowane blokadą plikową, więc kilka procesów może pracować
+    na tym samym katalogu danych. Każda operacja podnosi rewizję bazy; przed
+    zapisem magazyn doczytuje zmiany innych procesów i wykonuje swoje operacje
+    na najnowszych danych, zamiast nadpisywać je swoją nieaktualną kopią.
+    Sam odczyt i zapis na dysk wykonuje backend (JsonBackend, SqliteBackend).
+    """
+
+    def __init__(self, backend=None):
+        self.lock = threading.RLock()
+        self._lock_depth = 0
+        self.version = 0
+        self.epoch = 0
+        self.changes = deque(maxlen=1000)
+        self.backend = backend or get_backend()
+        self.paths = self.backend.paths
+        self.backups = BackupEngine(self.paths.backups)
+
+        with self.locked():
+            self._set_data(self.backend.load_database())
+            self.history = HistoryLog(self.backend.load_history())
+            self._roll_history()
+
+    def _set_data(self, data):
+        """Podmienia dane w pamięci razem z ich indeksem"""
+        self.data = data
+        self.index = FleetIndex(data)
+        self.epoch += 1
+        self.changes.clear()
+
+    def _record_changes(self, records):
+        """Zapamiętuje, których maszyn dotyczyły kolejne rewizje"""
+        for record in records:
+            machine_id = None if record['op'] in STRUCTURAL_OPS else record['machine_id']
+            self.changes.append((record['seq'], machine_id))
+
+    def changed_machines(self, since):
+        """ID maszyn zmienionych po rewizji `since` lub None, gdy trzeba przeliczyć całość"""
+        if since == self.revision:
+            return set()
+        if not self.changes or self.changes[0][0] > since + 1:
+            return None
+
+        machine_ids = set()
+        for revision, machine_id in reversed(self.changes):
+            if revision <= since:
+                break
+            if machine_id is None:
+                return None
+            machine_ids.add(machine_id)
+        return machine_ids
+
+    @property
+    def revision(self):
+        """Rewizja danych trzymanych w pamięci"""
+        return self.data['revision']
+
+    @contextmanager
+    def locked(self):
+        """Blokada wątków procesu i - na najwyższym poziomie - blokada plikowa"""
+        with self.lock:
+            if self._lock_depth:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+
+            with file_lock(self.paths.lock):
+                self._lock_depth = 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth = 0
+
+    def sync(self):
+        """Doczytuje zmiany zapisane przez inne procesy (wywoływane pod blokadą)"""
+        with self.locked():
+            changed = False
+
+            data, applied = self.backend.poll_database(self.data, self.index)
+            if data is not None:
+                self._set_data(data)
+                changed = True
+            elif applied:
+                self._record_changes(applied)
+                changed = True
+
+            entries = self.backend.poll_history()
+            if entries is None:
+                self.history = HistoryLog(self.backend.load_history())
+                changed = True
+            elif entries:
+                for entry in entries:
+                    self.history.append(entry)
+                changed = True
+
+            if changed:
+                self.version += 1
+
+    def save(self):
+        """Zapisuje pełny snapshot bazy"""
+        with self.locked():
+            self.backend.save_database(self.data)
+
+    def _persist(self, ops):
+        """Nadaje operacjom kolejne rewizje i przekazuje je do utrwalenia backendowi"""
+        records = []
+        for op in ops:
+            self.data['revision'] += 1
+            records.append({"seq": self.data['revision'], **op})
+        self._record_changes(records)
+        self.backend.persist(self.data, records, self.index)
+
+    def _roll_history(self):
+        """Przenosi wpisy z poprzednich miesięcy z bieżącego segmentu historii do archiwum"""
+        month_start = datetime.now().strftime("%Y-%m-01")
+        if not self.history or self.history.timestamps[0] >= month_start:
+            return
+
+        with self.locked():
+            self.backend.split_history(month_start, partial(archive_history, paths=self.paths))
+            prune_history_archives(paths=self.paths)
+            self.history = HistoryLog(self.backend.load_history())
+            self.version += 1
+
+    def query_history(self, offset=0, limit=50, date_from=None, date_to=None, **filters):
+        """Strona historii od najnowszych wpisów i liczba wszystkich pasujących.
+
+        Bez zakresu dat przeszukiwany jest tylko bieżący segment (pamięć procesu);
+        zakres dat otwiera dodatkowo archiwa miesięcy, na które zachodzi.
+        """
+        segments = []
+        if date_from is not None or date_to is not None:
+            first = date_from.strftime("%Y-%m") if date_from else ""
+            last = date_to.strftime("%Y-%m") if date_to else "9999-12"
+            segments = [archive_segment(month, self.paths) for month in list_history_archives(self.paths)
+                        if first <= month <= last]
+
+        with self.lock:
+            segments.append(self.history)
+            return query_segments(segments, offset, limit, date_from=date_from, date_to=date_to, **filters)
+
+    def log_events(self, entries):
+        """Dopisuje zdarzenia do dziennika historii"""
+        with self.locked():
+            self.sync()
+            self._roll_history()
+            self.backend.append_history(entries)
+            for entry in entries:
+                self.history.append(entry)
+            self.version += 1
+
+    def submit(self, ops, action=None, user="System"):
+        """Wykonuje operacje na najnowszych danych, zapisuje historię i utrwala zmiany.
+
+        `action` to opis do historii - jeden wpis dla całej paczki albo lista
+        opisów, po jednym wpisie na każdą wykonaną operację (jeden zapis historii).
+        Zwraca listę maszyn, których dotyczyły kolejne operacje; None oznacza
+        operację odrzuconą, bo jej cel zmienił lub usunął inny zapis.
+        """
+        with self.locked():
+            self.sync()
+            if any(op['op'] in DESTRUCTIVE_OPS for op in ops):
+                self.backup_in_background()
+
+            results = [apply_operation(self.data, op, self.index) for op in ops]
+            applied = [op for op, machine in zip(ops, results) if machine is not None]
+            if not applied:
+                return results
+
+            # Automatyczny zapis
+            self.version += 1
+            committed_revision = self.data['revision'] + len(applied)
+            try:
+                self._persist(applied)
+            except Exception:
+                # Operacje zmieniły już dane w pamięci - wracamy do stanu z dysku, żeby ponowna
+                # próba (np. bufora cykli) nie wykonała ich drugi raz
+                self._set_data(self.backend.read_database())
+                self.version += 1
+                if self.data['revision'] < committed_revision:
+                    raise
+                logger.exception("Błąd zapisu po utrwaleniu operacji (np. kompaktowania WAL) - operacje są zapisane")
+
+            # Dodaj do historii - po utrwaleniu, więc wpis nie powstaje dla niezapisanej operacji
+            if isinstance(action, list):
+                entries = [make_history_entry(machine['name'], description, user, machine['id'])
+                           for machine, description in zip(results, action) if machine is not None]
+            elif action:
+                machine = next(m for m in results if m is not None)
+                entries = [make_history_entry(machine['name'], action, user, machine['id'])]
+            else:
+                entries = []
+            if entries:
+                try:
+                    self.log_events(entries)
+                except Exception:
+                    # Operacje są już zapisane - błąd historii nie może skłonić wywołującego do ich powtórzenia
+                    logger.exception("Błąd zapisu historii - operacje na danych zostały zapisane")
+            return results
+
+    def replace(self, data):
+        """Podmienia całą bazę (przywrócenie backupu, czyszczenie), zwraca ścieżkę kopii poprzedniej bazy.
+
+        None, gdy kopii nie ma: kopie przed usuwaniem są wyłączone, baza była
+        pusta albo zapis kopii się nie powiódł.
+        """
+        with self.locked():
+            self.sync()
+            backup = self.backup_in_background()
+
+            # Rewizja rośnie monotonicznie także po przywróceniu starszej kopii
+            data = copy.deepcopy(data)
+            data['revision'] = self.data['revision'] + 1
+            self._set_data(data)
+            self.version += 1
+            self.save()
+
+        # Na wynik kopii czekamy już bez blokady magazynu
+        if backup is None or backup.exception() is not None:
+            return None
+        return backup.result()[0].path
+
+    def reload(self):
+        """Wczytuje ponownie bazę i historię z dysku"""
+        with self.locked():
+            self._set_data(self.backend.load_database())
+            self.history = HistoryLog(self.backend.load_history())
+            self._roll_history()
+            self.version += 1
+
+    def clear_history(self):
+        """Czyści całą historię operacji razem z archiwum"""
+        with self.locked():
+            self.backend.save_history([])
+            for month in list_history_archives(self.paths):
+                archive_file(month, self.paths).unlink()
+            self.history = HistoryLog()
+            self.version += 1
+
+    def create_backup(self):
+        """Zapisuje kopię zapasową aktualnej bazy (dowolnego backendu), zwraca (kopia, czy zapisano)"""
+        with self.locked():
+            self.sync()
+            snapshot = self.backups.snapshot(self.data)
+        return self.backups.write(*snapshot)
+
+    def backup_in_background(self):
+        """Kopia aktualnej bazy przed operacją usuwającą dane - zapis w tle, bez czekania (wywoływane pod blokadą)"""
+        if not BACKUP_BEFORE_DESTRUCTIVE or not self.data['machines']:
+            return None
+        return self.backups.write_async(*self.backups.snapshot(self.data))
+
+# --- BUFOR ZAPISU PRZYROSTÓW CYKLI ---
+class CycleBuffer:
+    """Przyrosty cykli sumowane w pamięci per maszyna i utrwalane paczką.
+
+    add() tylko dolicza przyrost w pamięci; flush() zapisuje wszystkie
+    zaległe przyrosty jednym store.submit() - jedna operacja add_cycles
+    i jeden wpis historii "Dodano N cykli" na maszynę. Wątek start()
+    wykonuje flush() co `interval` sekund albo wcześniej, gdy w buforze
+    zbierze się `max_pending` zgłoszeń; stop() zawsze kończy się zapisem.
+    """
+
+    def __init__(self, store, interval=1.0, max_pending=1000, user="System"):
+        self.store = store
+        self.interval = interval
+        self.max_pending = max_pending
+        self.user = user
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._requests = 0
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def add(self, machine_id, cycles):
+        """Dolicza przyrost do bufora (bez zapisu na dysk)"""
+        with self._lock:
+            self._pending[machine_id] = self._pending.get(machine_id, 0) + cycles
+            self._requests += 1
+            full = self._requests >= self.max_pending
+        if full:
+            self._wakeup.set()
+
+    def pending(self):
+        """Zaległe przyrosty per maszyna (kopia)"""
+        with self._lock:
+            return dict(self._pending)
+
+    def pending_requests(self):
+        """Liczba zgłoszeń czekających na zapis"""
+        return self._requests
+
+    def flush(self):
+        """Zapisuje zaległe przyrosty, zwraca liczbę maszyn w zapisanej paczce"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending, self._requests = self._pending, {}, 0
+            if not batch:
+                return 0
+
+            ops = [{"op": "add_cycles", "machine_id": machine_id, "cycles": cycles} for machine_id, cycles in batch.items()]
+            try:
+                self.store.submit(ops, [f"Dodano {cycles} cykli" for cycles in batch.values()], user=self.user)
+            except Exception:
+                # Nieudany zapis nie gubi przyrostów - wracają do bufora na następną próbę
+                with self._lock:
+                    for machine_id, cycles in batch.items():
+                        self._pending[machine_id] = self._pending.get(machine_id, 0) + cycles
+                raise
+            return len(batch)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Błąd zapisu bufora cykli - ponowna próba przy następnym przebiegu")
+
+    def start(self):
+        """Uruchamia wątek zapisujący bufor w tle"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="cycle-buffer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Zatrzymuje wątek i zapisuje wszystko, co zostało w buforze"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+# --- PODZIAŁ DANYCH NA LOKALIZACJE (SHARDY) ---
+def shard_slug(location):
+    """Nazwa katalogu shardu z nazwy lokalizacji (małe litery ASCII, cyfry i myślniki)"""
+    ascii_name = unicodedata.normalize('NFKD', location.replace('ł', 'l').replace('Ł', 'L'))
+    ascii_name = ascii_name.encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r"[^a-z0-9]+", "-", ascii_name.lower()).strip("-") or "lokalizacja"
+
+def shard_directory_name(location, taken=()):
+    """Niepowtarzalna nazwa katalogu shardu: slug lokalizacji, przy kolizji z numerem (-2, -3, ...)"""
+    taken = set(taken)
+    name = base = shard_slug(location)
+    number = 2
+    while name in taken:
+        name = f"{base}-{number}"
+        number += 1
+    return name
+
+@lru_cache(maxsize=4)
+def _shard_manifest(path, signature):
+    with open(path, 'rb') as f:
+        return json_loads(f.read())
+
+def read_shard_manifest(path=SHARD_MANIFEST):
+    """Lokalizacja -> katalog shardu (w SHARDS_DIR) lub None, gdy dane nie są podzielone"""
+    signature = file_signature(path)
+    return dict(_shard_manifest(str(path), signature)['shards']) if signature is not None else None
+
+def read_next_machine_number(path=SHARD_MANIFEST):
+    """Następny numer ID maszyny z licznika w manifeście (None, gdy manifest go nie ma)"""
+    signature = file_signature(path)
+    return _shard_manifest(str(path), signature).get('next_machine_number') if signature is not None else None
+
+def write_shard_manifest(shards, path=SHARD_MANIFEST, next_machine_number=None):
+    """Zapisuje przypisanie lokalizacji do katalogów shardów (atomowo).
+
+    Licznik ID maszyn w manifeście nigdy się nie cofa - zostaje większy
+    z zapisanego i podanego numeru.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    record = {"shards": dict(sorted(shards.items()))}
+    numbers = [number for number in (read_next_machine_number(path), next_machine_number) if number is not None]
+    if numbers:
+        record['next_machine_number'] = max(numbers)
+    write_bytes_atomic(path, json_dumps(record, indent=True))
+
+def register_shard(location, path=SHARD_MANIFEST):
+    """Dopisuje lokalizację do manifestu (katalog o niepowtarzalnej nazwie), zwraca nazwę katalogu"""
+    with file_lock(path.with_suffix(".lock")):
+        shards = read_shard_manifest(path) or {}
+        if location not in shards:
+            shards[location] = shard_directory_name(location, shards.values())
+            write_shard_manifest(shards, path)
+        return shards[location]
+
+class ShardSet:
+    """Flota podzielona na lokalizacje: każda hala to osobny katalog danych (baza, historia, archiwum, kopie).
+
+    Magazyn shardu (FleetStore) powstaje przy pierwszym użyciu, więc proces
+    wczytuje tylko otwierane hale. Każdy shard ma własną blokadę plikową -
+    zapis w jednej hali nie czeka na zapisy w pozostałych.
+    """
+
+    def __init__(self, manifest=SHARD_MANIFEST, root=SHARDS_DIR, backend=None):
+        self.manifest = manifest
+        self.root = root
+        self.backend = backend
+        self.stores = {}
+        self._lock = threading.Lock()
+
+    def locations(self):
+        """Lokalizacje z manifestu, alfabetycznie"""
+        return sorted(read_shard_manifest(self.manifest) or {})
+
+    def paths(self, location):
+        """Pliki shardu lokalizacji (KeyError dla lokalizacji spoza manifestu)"""
+        return DataPaths(self.root / (read_shard_manifest(self.manifest) or {})[location])
+
+    def add(self, location):
+        """Zakłada shard lokalizacji - pustą bazę tworzy magazyn przy pierwszym wczytaniu"""
+        register_shard(location, self.manifest)
+        return self.paths(location)
+
+    def store(self, location):
+        """Magazyn shardu - wczytywany przy pierwszym użyciu, potem wspólny dla procesu"""
+        with self._lock:
+            store = self.stores.get(location)
+            if store is None:
+                store = self.stores[location] = FleetStore(get_backend(self.backend, self.paths(location)))
+            return store
+
+    def loaded(self, location):
+        """Magazyn shardu, jeśli proces już go wczytał (inaczej None)"""
+        return self.stores.get(location)
+
+    def new_machine_id(self):
+        """Kolejne ID maszyny niepowtarzalne w całej flocie - z licznika w manifeście, pod jego blokadą.
+
+        ID z FleetIndex.new_machine_id byłyby niepowtarzalne tylko w obrębie
+        hali, a historia, serwis cykli i metryki rozpoznają maszyny po samym ID.
+        """
+        with file_lock(self.manifest.with_suffix(".lock")):
+            shards = read_shard_manifest(self.manifest)
+            number = read_next_machine_number(self.manifest)
+            if number is None:
+                # Manifest bez licznika: pierwszy numer po najwyższym ID we wszystkich shardach
+                number = 1
+                for location in shards:
+                    with file_lock(self.paths(location).lock):
+                        for machine in self.read_machines(location):
+                            number = max(number, machine_number(machine['id']) + 1)
+            write_shard_manifest(shards, self.manifest, number + 1)
+        return f"M{number:02d}"
+
+    def read_machines(self, location):
+        """Maszyny shardu bez tworzenia jego magazynu - nic nie zostaje w pamięci procesu (wywoływane pod blokadą shardu).
+
+        Snapshot JSON bez zaległego WAL jest czytany strumieniowo (iter_snapshot_machines),
+        w pozostałych przypadkach dane są wczytywane jednorazowo.
+        """
+        paths = self.paths(location)
+        backend = self.backend or STORAGE_BACKEND
+        if backend == 'json':
+            if not paths.database.exists():
+                return iter(())
+            if not paths.wal.exists() or paths.wal.stat().st_size == 0:
+                return iter_snapshot_machines(paths.database)
+            return iter(read_database(paths)['machines'])
+        if not paths.sqlite.exists():
+            return iter(())
+        shard_backend = get_backend(backend, paths)
+        try:
+            return iter(shard_backend.read_database()['machines'])
+        finally:
+            shard_backend.close()
+
+    def data_signature(self, location):
+        """Sygnatury plików danych shardu (jak po zapisie do JSON) - zmienia je każdy zapis, także innego procesu"""
+        return [list(signature) if signature is not None else None
+                for signature in map(file_signature, self.paths(location).data_files(self.backend).values())]
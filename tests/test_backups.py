@@ -0,0 +1,100 @@
+from datetime import datetime
+from pathlib import Path
+
+import storage
+from storage import BackupEngine, BackupFile, DataPaths, FleetStore, backups_to_keep, get_backend, get_initial_data
+
+
+def machine(machine_id):
+    return {'id': machine_id, 'name': f"Maszyna {machine_id}", 'location': "Hala A", 'model': "P-100",
+            'avg_daily_cycles': 0, 'service_intervals': []}
+
+
+def test_replace_returns_backup_of_previous_data(tmp_path):
+    store = FleetStore(get_backend('json', DataPaths(tmp_path)))
+    store.submit([{'op': 'add_machine', 'machine': machine('M01')}])
+
+    path = store.replace(get_initial_data())
+    assert path is not None and path.exists()
+    assert [m['id'] for m in storage.read_backup(storage.list_backups(store.backups.backup_dir)[0])['machines']] == ['M01']
+
+
+def test_replace_without_backup(tmp_path, monkeypatch):
+    store = FleetStore(get_backend('json', DataPaths(tmp_path)))
+    # Pusta baza - nie ma czego kopiować
+    assert store.replace(get_initial_data()) is None
+
+    store.submit([{'op': 'add_machine', 'machine': machine('M01')}])
+    monkeypatch.setattr(storage, 'BACKUP_BEFORE_DESTRUCTIVE', False)
+    assert store.replace(get_initial_data()) is None
+    assert storage.list_backups(store.backups.backup_dir) == []
+
+
+def test_replace_reports_failed_backup(tmp_path, monkeypatch):
+    store = FleetStore(get_backend('json', DataPaths(tmp_path)))
+    store.submit([{'op': 'add_machine', 'machine': machine('M01')}])
+
+    def fail(*args):
+        raise OSError("dysk pełny")
+    monkeypatch.setattr(store.backups, 'write', fail)
+    assert store.replace(get_initial_data()) is None
+    assert store.data['machines'] == []
+
+
+def backup(timestamp):
+    created = datetime.strptime(timestamp, "%Y-%m-%d %H:%M")
+    return BackupFile(Path(f"database_{created:%Y%m%d_%H%M%S}_r1_0000000000000000.json.gz"), created, 1, "0" * 16)
+
+
+def test_tiered_retention():
+    # Od najnowszej, jak z list_backups()
+    backups = [backup(timestamp) for timestamp in [
+        "2026-10-18 12:30", "2026-10-18 12:00", "2026-10-18 11:30", "2026-10-18 10:10",
+        "2026-10-17 20:00", "2026-10-17 08:00", "2026-10-16 09:00", "2026-10-05 09:00", "2026-09-20 09:00",
+    ]]
+    keep = backups_to_keep(backups, keep_last=2, hourly=3, daily=2, weekly=2)
+
+    # 2 najnowsze, godziny 12/11/10 z 18.10, dni 18.10 i 17.10, tygodnie 42 i 41
+    assert keep == {backups[i].path for i in (0, 1, 2, 3, 4, 7)}
+
+
+class FrozenClock:
+    """Zastępuje datetime w storage - kolejne kopie dostają zadane znaczniki czasu"""
+
+    def __init__(self, monkeypatch):
+        self.now_value = None
+        clock = self
+
+        class FrozenDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return clock.now_value
+        monkeypatch.setattr(storage, 'datetime', FrozenDatetime)
+
+    def set(self, timestamp):
+        self.now_value = datetime.strptime(timestamp, "%Y-%m-%d %H:%M")
+
+
+def test_write_skips_unchanged_content_and_prunes(tmp_path, monkeypatch):
+    clock = FrozenClock(monkeypatch)
+    engine = BackupEngine(tmp_path / 'backups', retention={'keep_last': 2, 'hourly': 0, 'daily': 0, 'weekly': 0})
+    data = {'machines': [machine('M01')], 'revision': 1}
+
+    clock.set("2026-10-18 08:00")
+    first, created = engine.write(*engine.snapshot(data))
+    assert created and first.created == datetime(2026, 10, 18, 8, 0)
+
+    # Ta sama treść przy innej rewizji - bez nowego pliku
+    clock.set("2026-10-18 09:00")
+    latest, created = engine.write(*engine.snapshot({**data, 'revision': 7}))
+    assert not created and latest.path == first.path
+
+    for hour, machine_id in ((10, 'M02'), (11, 'M03')):
+        clock.set(f"2026-10-18 {hour}:00")
+        data = {'machines': data['machines'] + [machine(machine_id)], 'revision': hour}
+        engine.write(*engine.snapshot(data))
+
+    backups = storage.list_backups(engine.backup_dir)
+    assert [b.created.hour for b in backups] == [11, 10]
+    assert [b.revision for b in backups] == [11, 10]
+    assert len(storage.read_backup(backups[0])['machines']) == 3
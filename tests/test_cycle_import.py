@@ -0,0 +1,64 @@
+import io
+
+import pytest
+
+from cycle_import import import_cycles, validate_rows
+from storage import DataPaths, FleetIndex, FleetStore, get_backend
+
+MACHINE = {
+    'id': 'M01', 'name': "Prasa", 'location': "Hala A", 'model': "P-100", 'avg_daily_cycles': 100,
+    'service_intervals': [{'name': "Smarowanie", 'type': 'cycles', 'interval': 1000, 'current_value': 0,
+                           'last_service': "2026-01-01", 'enabled': True}],
+}
+INDEX = FleetIndex({'machines': [MACHINE]})
+
+
+def validate_jsonl(*lines):
+    return validate_rows(io.StringIO("\n".join(lines) + "\n"), 'jsonl', INDEX)
+
+
+def test_valid_rows_are_summed():
+    result = validate_rows(io.StringIO("machine_id;cycles;timestamp\nM01;5;2026-10-01 06:00\nM01;7;2026-10-01 14:00\n"),
+                           'csv', INDEX)
+    assert result.error_count == 0
+    assert result.cycles == {'M01': 12}
+    assert result.first_timestamp == "2026-10-01 06:00:00"
+
+
+@pytest.mark.parametrize('cycles', ['2.7', 'true', '1e3', '"abc"', 'null'])
+def test_non_integer_cycles_rejected(cycles):
+    result = validate_jsonl(f'{{"machine_id": "M01", "cycles": {cycles}, "timestamp": "2026-10-01 06:00"}}')
+    assert result.valid_rows == 0
+    assert result.cycles == {}
+    assert result.errors[0][1].startswith("Nieprawidłowa liczba cykli")
+
+
+def test_csv_fraction_rejected():
+    result = validate_rows(io.StringIO("machine_id,cycles,timestamp\nM01,2.7,2026-10-01 06:00\n"), 'csv', INDEX)
+    assert result.valid_rows == 0
+    assert result.error_count == 1
+
+
+def test_import_sees_machines_added_by_another_process(tmp_path):
+    paths = DataPaths(tmp_path)
+    store = FleetStore(get_backend('json', paths))
+    other = FleetStore(get_backend('json', paths))
+    other.submit([{'op': 'add_machine', 'machine': {**MACHINE, 'id': 'M02', 'name': "Tokarka"}}])
+
+    result = import_cycles(store, b"machine_id,cycles,timestamp\nM02,5,2026-10-01 06:00\n")
+    assert result.error_count == 0
+    assert result.applied
+    assert result.cycles == {'M02': 5}
+    other.sync()
+    assert other.index.machine('M02')['service_intervals'][0]['current_value'] == 5
+
+
+def test_import_rejects_machine_deleted_by_another_process(tmp_path):
+    paths = DataPaths(tmp_path)
+    store = FleetStore(get_backend('json', paths))
+    store.submit([{'op': 'add_machine', 'machine': MACHINE}])
+    FleetStore(get_backend('json', paths)).submit([{'op': 'delete_machine', 'machine_id': 'M01'}])
+
+    result = import_cycles(store, b"machine_id,cycles,timestamp\nM01,5,2026-10-01 06:00\n")
+    assert not result.applied
+    assert result.errors == [(2, "Nieznana maszyna: M01")]
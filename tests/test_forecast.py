@@ -0,0 +1,47 @@
+from datetime import date
+
+from fleet import compute_fleet_status, compute_forecast, forecast_table
+
+TODAY = date(2026, 10, 18)
+
+
+def interval(name, kind, value, current=0, last_service="2026-01-01"):
+    return {'name': name, 'type': kind, 'interval': value, 'current_value': current,
+            'last_service': last_service, 'enabled': True}
+
+
+MACHINE = {
+    'id': 'M01', 'name': "Prasa", 'location': "Hala A", 'model': "P-100", 'avg_daily_cycles': 100,
+    'service_intervals': [
+        interval("Smarowanie", 'cycles', 1000, current=1200),                # zaległy cyklicznie
+        interval("Przegląd roczny", 'time', 6, last_service="2026-03-01"),   # termin 01.09 - zaległy
+        interval("Kalibracja", 'time', 1, last_service="2026-09-25"),        # termin 25.10 - za 7 dni
+        interval("Przegląd kwartalny", 'time', 3, last_service="2026-10-01"),  # termin poza horyzontem
+    ],
+}
+
+
+def forecast(horizon=14):
+    intervals = compute_fleet_status([MACHINE], TODAY).intervals
+    return compute_forecast(intervals, horizon, TODAY).set_index('name')
+
+
+def test_overdue_time_interval_on_first_day():
+    events = forecast()
+    assert events.loc["Przegląd roczny", 'first_day'] == 1
+    assert events.loc["Przegląd roczny", 'status'] == 2
+    assert events.loc["Smarowanie", 'first_day'] == 1
+    assert events.loc["Kalibracja", 'first_day'] == 7
+    assert "Przegląd kwartalny" not in events.index
+
+
+def test_machine_card_table_repeats_overdue_items():
+    table = forecast_table(forecast().reset_index(), 14, TODAY)
+    events = table['Zdarzenia'].str.split(", ")
+
+    # Zaległe - przegląd i serwis cykliczny - wymagane każdego dnia horyzontu
+    assert all("Przegląd roczny" in day for day in events)
+    assert all("Smarowanie" in day for day in events)
+    assert (table['Status'] == "PRZEGLĄD").all()
+    # Przegląd przed terminem - tylko w dniu terminu
+    assert [day for day, names in enumerate(events, start=1) if "Kalibracja" in names] == [7]
@@ -0,0 +1,76 @@
+from datetime import date, datetime
+
+import pytest
+
+import storage
+from storage import (DataPaths, FleetStore, HistoryLog, append_history, archive_history, archive_file, get_backend,
+                     list_history_archives, prune_history_archives, query_segments, read_history_archive)
+
+
+def entry(timestamp, machine="Prasa", action="Dodano 5 cykli", user="System"):
+    return {'timestamp': timestamp, 'machine': machine, 'action': action, 'user': user}
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return DataPaths(tmp_path)
+
+
+def test_store_moves_previous_months_to_archive(paths):
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    old = [entry(f"2020-01-{day:02d} 08:00:00") for day in (3, 17)] + [entry("2020-02-01 06:00:00")]
+    append_history(old + [entry(now)], paths)
+
+    store = FleetStore(get_backend('json', paths))
+    assert list_history_archives(paths) == ['2020-01', '2020-02']
+    assert read_history_archive('2020-01', paths) == old[:2]
+    assert [e['timestamp'] for e in store.history] == [now]
+    assert [e['timestamp'] for e in storage.load_history(paths=paths)] == [now]
+
+    # Ponowna archiwizacja tych samych wpisów nie dubluje ich
+    archive_history(old, paths)
+    assert read_history_archive('2020-01', paths) == old[:2]
+
+
+def test_prune_keeps_retention_window(paths):
+    archive_history([entry(f"2026-{month:02d}-15 12:00:00") for month in range(1, 11)], paths)
+
+    prune_history_archives(3, today=date(2026, 10, 18), paths=paths)
+    assert list_history_archives(paths) == ['2026-07', '2026-08', '2026-09', '2026-10']
+    assert not archive_file('2026-06', paths).exists()
+
+    # 0 = bez limitu
+    prune_history_archives(0, today=date(2030, 1, 1), paths=paths)
+    assert len(list_history_archives(paths)) == 4
+
+
+def test_paged_selection_across_segments():
+    # Segmenty od najstarszego; wpisy w segmencie od najnowszych, jak z load_history()
+    january = HistoryLog([entry(f"2026-01-{day:02d} 08:00:00", machine="Prasa" if day % 2 else "Tokarka")
+                          for day in range(10, 0, -1)])
+    february = HistoryLog([entry(f"2026-02-{day:02d} 08:00:00", machine="Prasa") for day in range(5, 0, -1)])
+    segments = [january, february]
+
+    page, total = query_segments(segments, offset=3, limit=4)
+    assert total == 15
+    # Strona przechodzi z końca lutego na najnowsze wpisy stycznia
+    assert [e['timestamp'][:10] for e in page] == ["2026-02-02", "2026-02-01", "2026-01-10", "2026-01-09"]
+
+    page, total = query_segments(segments, offset=5, limit=50, machine="Prasa")
+    assert total == 10
+    assert [e['timestamp'][:10] for e in page] == [f"2026-01-{day:02d}" for day in (9, 7, 5, 3, 1)]
+
+    page, total = query_segments(segments, date_from=date(2026, 1, 9), date_to=date(2026, 2, 1))
+    assert total == 3
+    assert [e['timestamp'][:10] for e in page] == ["2026-02-01", "2026-01-10", "2026-01-09"]
+
+
+def test_store_query_opens_archives_for_date_range(paths):
+    append_history([entry(f"2020-0{month}-01 08:00:00", action=f"Wykonano: {month}") for month in (1, 2, 3)], paths)
+    store = FleetStore(get_backend('json', paths))
+    store.log_events([entry(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))])
+
+    assert store.query_history()[1] == 1
+    page, total = store.query_history(date_from=date(2020, 2, 1), date_to=date(2020, 3, 31), action_type="Serwis")
+    assert total == 2
+    assert [e['action'] for e in page] == ["Wykonano: 3", "Wykonano: 2"]
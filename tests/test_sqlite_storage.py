@@ -0,0 +1,101 @@
+import pytest
+
+import sqlite_storage
+from sqlite_storage import SqliteBackend
+from storage import DataPaths, FleetIndex, FleetStore, append_wal, get_backend, read_database, save_database
+
+
+def machine(machine_id):
+    return {
+        'id': machine_id, 'name': f"Maszyna {machine_id}", 'location': "Hala A", 'model': "P-100",
+        'avg_daily_cycles': 100, 'serial': f"SN-{machine_id}",
+        'service_intervals': [
+            {'name': "Smarowanie", 'type': 'cycles', 'interval': 1000, 'current_value': 0,
+             'last_service': "2026-01-01", 'enabled': True},
+            {'name': "Wymiana noży", 'type': 'cycles', 'interval': 5000, 'current_value': 0,
+             'last_service': "2026-01-01", 'enabled': False},
+            {'name': "Przegląd", 'type': 'time', 'interval': 6, 'current_value': 0,
+             'last_service': "2026-03-01", 'enabled': True, 'note': "UDT"},
+        ],
+    }
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return DataPaths(tmp_path)
+
+
+def sqlite_store(paths):
+    return FleetStore(get_backend('sqlite', paths))
+
+
+def test_generation_and_revision_round_trip(paths):
+    store = sqlite_store(paths)
+    other = SqliteBackend(paths.sqlite)
+    data = other.load_database()
+    generation = other._meta('generation')
+
+    store.submit([{'op': 'add_machine', 'machine': machine('M01')}])
+    # Zwykły zapis: te same dane, kolejna rewizja, operacje do odtworzenia
+    changed, applied = other.poll_database(data, FleetIndex(data))
+    assert changed is None and [record['seq'] for record in applied] == [1]
+    assert other._meta('generation') == generation
+    assert SqliteBackend(paths.sqlite).read_database() == {'machines': store.data['machines'], 'revision': 1}
+
+    # Podmiana całej bazy zmienia generation - inny proces wczytuje całość
+    store.replace({'machines': [machine('M02')], 'revision': 0})
+    changed, applied = other.poll_database(data, None)
+    assert other._meta('generation') == generation + 1
+    assert [m['id'] for m in changed['machines']] == ['M02'] and changed['revision'] == 2
+    other.close()
+
+
+def test_add_cycles_updates_only_enabled_cycle_rows(paths):
+    store = sqlite_store(paths)
+    store.submit([{'op': 'add_machine', 'machine': machine('M01')}, {'op': 'add_machine', 'machine': machine('M02')}])
+
+    statements = []
+    store.backend.conn.set_trace_callback(statements.append)
+    store.submit([{'op': 'add_cycles', 'machine_id': 'M01', 'cycles': 7}])
+    store.backend.conn.set_trace_callback(None)
+
+    interval_writes = [sql for sql in statements if 'service_intervals' in sql]
+    assert interval_writes == ["UPDATE service_intervals SET current_value = 7 WHERE machine_id = 'M01' AND position = 0"]
+    intervals = SqliteBackend(paths.sqlite).read_database()['machines'][0]['service_intervals']
+    assert [interval['current_value'] for interval in intervals] == [7, 0, 0]
+
+
+def test_operations_table_keeps_last_operations(paths):
+    store = sqlite_store(paths)
+    store.submit([{'op': 'add_machine', 'machine': machine('M01')}])
+    store.submit([{'op': 'add_cycles', 'machine_id': 'M01', 'cycles': 1}] * (sqlite_storage.OPERATIONS_KEEP + 50))
+
+    seqs = [row[0] for row in store.backend.conn.execute("SELECT seq FROM operations ORDER BY seq")]
+    assert len(seqs) == sqlite_storage.OPERATIONS_KEEP
+    assert seqs[-1] == store.revision == sqlite_storage.OPERATIONS_KEEP + 51
+
+
+def test_same_results_as_json_backend(paths, tmp_path):
+    # Migracja: snapshot JSON z ogonem WAL przeniesiony do SQLite
+    json_paths = DataPaths(tmp_path / 'json')
+    save_database({'machines': [machine('M01'), machine('M02')], 'revision': 4}, paths=json_paths)
+    append_wal([{'seq': 5, 'op': 'add_cycles', 'machine_id': 'M02', 'cycles': 30}], json_paths)
+    source = read_database(json_paths)
+    SqliteBackend(paths.sqlite).save_database(source)
+
+    json_store = FleetStore(get_backend('json', json_paths))
+    store = sqlite_store(paths)
+    assert store.data == json_store.data
+
+    ops = [
+        ({'op': 'add_cycles', 'machine_id': 'M01', 'cycles': 120}, "Dodano 120 cykli"),
+        ({'op': 'reset_interval', 'machine_id': 'M02', 'interval': "Smarowanie", 'date': "2026-10-18"}, "Wykonano"),
+        ({'op': 'update_machine', 'machine_id': 'M01', 'fields': {'name': "Prasa", 'location': "Hala B"}}, "Zmiana"),
+        ({'op': 'add_machine', 'machine': machine('M03')}, "Dodano maszynę"),
+        ({'op': 'delete_machine', 'machine_id': 'M02'}, "Usunięto maszynę"),
+    ]
+    for op, action in ops:
+        assert json_store.submit([op], action) == store.submit([op], action)
+
+    assert SqliteBackend(paths.sqlite).read_database() == read_database(json_paths) == json_store.data
+    assert [entry['action'] for entry in store.history] == [entry['action'] for entry in json_store.history]
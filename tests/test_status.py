@@ -0,0 +1,78 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import fleet
+from fleet import StatusCache, compute_fleet_status
+from storage import DataPaths, FleetStore, get_backend
+
+TODAY = date(2026, 10, 18)
+
+
+def machine(number):
+    return {
+        'id': f"M{number:02d}", 'name': f"Maszyna {number}", 'location': "Hala A", 'model': "P-100",
+        'avg_daily_cycles': 10 * number,
+        'service_intervals': [
+            {'name': "Smarowanie", 'type': 'cycles', 'interval': 1000, 'current_value': 100 * number,
+             'last_service': "2026-01-01", 'enabled': True},
+            {'name': "Przegląd", 'type': 'time', 'interval': number, 'current_value': 0,
+             'last_service': "2026-08-01", 'enabled': number % 2 == 1},
+        ],
+    }
+
+
+def assert_same(status, expected):
+    pd.testing.assert_frame_equal(status.intervals.reset_index(drop=True), expected.intervals.reset_index(drop=True),
+                                  check_dtype=False)
+    assert np.array_equal(status.machine_status, expected.machine_status)
+    assert np.array_equal(status.offsets, expected.offsets)
+
+
+def test_patched_matches_full_recompute():
+    machines = [machine(number) for number in range(1, 6)]
+    status = compute_fleet_status(machines, TODAY)
+
+    machines[1]['service_intervals'][0]['current_value'] = 990
+    machines[3]['name'] = "Prasa nowa"
+    positions = np.array([1, 3])
+    partial = compute_fleet_status([machines[pos] for pos in positions], TODAY)
+
+    assert_same(status.patched(positions, partial), compute_fleet_status(machines, TODAY))
+
+
+def test_patched_rejects_changed_interval_count():
+    machines = [machine(number) for number in range(1, 4)]
+    status = compute_fleet_status(machines, TODAY)
+    machines[0]['service_intervals'].pop()
+    assert status.patched(np.array([0]), compute_fleet_status(machines[:1], TODAY)) is None
+
+
+@pytest.fixture
+def frozen_today(monkeypatch):
+    class FrozenDatetime(fleet.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return cls(TODAY.year, TODAY.month, TODAY.day, 12)
+    monkeypatch.setattr(fleet, 'datetime', FrozenDatetime)
+
+
+def test_status_cache_after_cycles_rename_and_delete(tmp_path, frozen_today):
+    store = FleetStore(get_backend('json', DataPaths(tmp_path)))
+    store.submit([{'op': 'add_machine', 'machine': machine(number)} for number in range(1, 6)])
+    cache = StatusCache()
+    cache.get(store)
+
+    steps = [
+        ({'op': 'add_cycles', 'machine_id': 'M02', 'cycles': 850}, True),
+        ({'op': 'update_machine', 'machine_id': 'M04', 'fields': {'name': "Prasa nowa"}}, True),
+        ({'op': 'delete_machine', 'machine_id': 'M03'}, False),
+    ]
+    for op, incremental in steps:
+        revision = store.revision
+        store.submit([op])
+        # Zmiana pojedynczej maszyny przelicza tylko ją, usunięcie - całą flotę
+        assert (store.changed_machines(revision) is not None) == incremental
+        assert_same(cache.get(store), compute_fleet_status(store.data['machines'], TODAY))
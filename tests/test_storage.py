@@ -0,0 +1,57 @@
+import pytest
+
+from storage import DataPaths, ShardSet, encode_snapshot, iter_snapshot_machines, read_snapshot, save_database
+
+
+def machine(machine_id, location):
+    return {
+        'id': machine_id, 'name': f"Maszyna {machine_id}", 'location': location, 'model': "P-100",
+        'avg_daily_cycles': 100,
+        'service_intervals': [{'name': "Smarowanie", 'type': 'cycles', 'interval': 1000, 'current_value': 250,
+                               'last_service': "2026-01-01", 'enabled': True}],
+    }
+
+
+DATA = {'machines': [machine('M01', 'Hala A'), machine('M02', 'Hala B'), machine('M03', 'Hala A')], 'revision': 3}
+
+
+@pytest.mark.parametrize('layout', ['pretty', 'compact'])
+def test_iter_snapshot_machines(tmp_path, layout):
+    paths = DataPaths(tmp_path)
+    save_database(DATA, layout, paths)
+
+    assert list(iter_snapshot_machines(paths.database)) == DATA['machines']
+    assert [m['id'] for m in iter_snapshot_machines(paths.database, 'Hala A')] == ['M01', 'M03']
+    assert list(iter_snapshot_machines(paths.database, 'Hala Z')) == []
+
+
+def test_read_snapshot_rejects_truncated_compact_file(tmp_path):
+    paths = DataPaths(tmp_path)
+    paths.database.write_bytes(b"".join(encode_snapshot(DATA, 'compact').splitlines(keepends=True)[:-1]))
+
+    with pytest.raises(ValueError, match="Niepełny plik"):
+        read_snapshot(paths.database)
+
+
+def test_read_machines_does_not_load_shard(tmp_path):
+    shards = ShardSet(tmp_path / 'shards.json', tmp_path / 'shards', backend='json')
+    paths = shards.add('Hala A')
+    assert list(shards.read_machines('Hala A')) == []
+
+    save_database({**DATA, 'machines': DATA['machines'][::2]}, 'compact', paths)
+    assert [m['id'] for m in shards.read_machines('Hala A')] == ['M01', 'M03']
+    assert shards.loaded('Hala A') is None
+
+
+def test_shard_machine_ids_unique_across_halls(tmp_path):
+    shards = ShardSet(tmp_path / 'shards.json', tmp_path / 'shards', backend='json')
+    save_database({'machines': [machine('M01', 'Hala A')], 'revision': 1}, 'compact', shards.add('Hala A'))
+    save_database({'machines': [machine('M07', 'Hala B')], 'revision': 1}, 'compact', shards.add('Hala B'))
+
+    # Manifest bez licznika - numeracja od najwyższego ID we wszystkich halach
+    assert shards.new_machine_id() == 'M08'
+    assert shards.new_machine_id() == 'M09'
+    # Dopisanie hali nie cofa licznika
+    shards.add('Hala C')
+    assert shards.new_machine_id() == 'M10'
+    assert shards.loaded('Hala A') is None
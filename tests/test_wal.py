@@ -0,0 +1,103 @@
+import pytest
+
+import storage
+from storage import DataPaths, FleetStore, append_wal, get_backend, read_database, replay_wal, save_database
+
+
+def machine(machine_id, current=0):
+    return {'id': machine_id, 'name': f"Maszyna {machine_id}", 'location': "Hala A", 'model': "P-100",
+            'avg_daily_cycles': 100,
+            'service_intervals': [{'name': "Smarowanie", 'type': 'cycles', 'interval': 1000, 'current_value': current,
+                                   'last_service': "2026-01-01", 'enabled': True}]}
+
+
+def cycles(data, machine_id='M01'):
+    return next(m for m in data['machines'] if m['id'] == machine_id)['service_intervals'][0]['current_value']
+
+
+def add_cycles(seq, count, machine_id='M01'):
+    return {'seq': seq, 'op': 'add_cycles', 'machine_id': machine_id, 'cycles': count}
+
+
+@pytest.fixture
+def paths(tmp_path):
+    paths = DataPaths(tmp_path)
+    save_database({'machines': [machine('M01')], 'revision': 0}, paths=paths)
+    return paths
+
+
+@pytest.fixture
+def wal_mode(monkeypatch):
+    monkeypatch.setattr(storage, 'PERSISTENCE_MODE', 'wal')
+
+
+def test_replay_applies_wal_tail(paths):
+    append_wal([add_cycles(1, 5), add_cycles(2, 7)], paths)
+
+    data = read_database(paths)
+    assert data['revision'] == 2
+    assert cycles(data) == 12
+
+
+def test_replay_skips_records_already_in_snapshot(paths):
+    save_database({'machines': [machine('M01', current=12)], 'revision': 2}, paths=paths)
+    paths.wal.write_bytes(b"".join(storage.json_dumps(record) + b"\n"
+                                   for record in [add_cycles(1, 5), add_cycles(2, 7), add_cycles(3, 1)]))
+
+    data = read_database(paths)
+    assert data['revision'] == 3
+    assert cycles(data) == 13
+
+
+def test_torn_final_record(paths):
+    append_wal([add_cycles(1, 5)], paths)
+    complete = paths.wal.stat().st_size
+    with open(paths.wal, 'ab') as f:
+        f.write(storage.json_dumps(add_cycles(2, 7))[:-5])
+
+    # Urwany rekord nie jest odtwarzany, offset wskazuje koniec ostatniego pełnego rekordu
+    data = storage.read_snapshot(paths.database)
+    assert replay_wal(data, paths=paths) == complete
+    assert (data['revision'], cycles(data)) == (1, 5)
+
+    # Kolejny zapis obcina urwany rekord
+    append_wal([add_cycles(2, 3)], paths)
+    data = read_database(paths)
+    assert (data['revision'], cycles(data)) == (2, 8)
+
+
+def test_other_process_changes_through_wal(paths, wal_mode):
+    first = FleetStore(get_backend('json', paths))
+    second = FleetStore(get_backend('json', paths))
+    first.submit([{'op': 'add_cycles', 'machine_id': 'M01', 'cycles': 5}])
+    second.submit([{'op': 'add_cycles', 'machine_id': 'M01', 'cycles': 7}])
+
+    first.sync()
+    assert (first.revision, cycles(first.data)) == (2, 12)
+
+    # Kompaktowanie skraca WAL - drugi magazyn wczytuje snapshot od nowa
+    first.save()
+    first.submit([{'op': 'add_cycles', 'machine_id': 'M01', 'cycles': 1}])
+    second.sync()
+    assert (second.revision, cycles(second.data)) == (3, 13)
+
+
+def test_submit_rolls_back_when_persist_fails(paths, wal_mode, monkeypatch):
+    store = FleetStore(get_backend('json', paths))
+    persist = store.backend.persist
+
+    def fail_once(*args):
+        monkeypatch.setattr(store.backend, 'persist', persist)
+        raise OSError("dysk pełny")
+    monkeypatch.setattr(store.backend, 'persist', fail_once)
+
+    op = {'op': 'add_cycles', 'machine_id': 'M01', 'cycles': 5}
+    with pytest.raises(OSError):
+        store.submit([op], "Dodano 5 cykli")
+    assert (store.revision, cycles(store.data)) == (0, 0)
+
+    # Ponowienie (np. przez bufor cykli) nie dolicza cykli drugi raz
+    store.submit([op], "Dodano 5 cykli")
+    assert (store.revision, cycles(store.data)) == (1, 5)
+    assert cycles(read_database(paths)) == 5
+    assert len(store.history) == 1
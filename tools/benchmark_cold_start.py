@@ -0,0 +1,110 @@
+"""Pomiar czasu startu sesji i odczytu/zapisu bazy w zależności od rozmiaru pliku database.json.
+
+Uruchomienie (z katalogu repozytorium):
+    python tools/benchmark_cold_start.py --machines 1000,5000,10000
+    python tools/benchmark_cold_start.py --machines 10000 --no-server
+
+Dla każdej wielkości floty skrypt tworzy tymczasową bazę i mierzy:
+  - wczytanie magazynu (FleetStore: parsowanie + indeks) i pełny zapis
+    snapshotu - kodekiem stdlib oraz orjson, jeśli jest zainstalowany,
+  - utworzenie kopii roboczej konfiguracji: dawną głęboką kopię bazy
+    i kopię copy-on-write (FleetDraft),
+  - pierwszy przebieg pierwszej sesji na świeżo uruchomionym serwerze
+    (z wczytaniem magazynu) i pierwszy przebieg kolejnej sesji, która
+    korzysta z magazynu wspólnego dla procesu.
+"""
+import argparse
+import asyncio
+import copy
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from benchmark_reruns import REPO_DIR, BrowserSession, build_fleet, free_port, start_server
+
+import storage
+from storage import DATABASE_FILE, FleetDraft, FleetStore
+
+
+def timed(func, repeat):
+    """Mediana czasu wykonania w milisekundach"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+async def first_run(port):
+    """Czas pierwszego przebiegu nowej sesji (połączenie + skrypt) w milisekundach"""
+    import websockets
+
+    start = time.perf_counter()
+    async with websockets.connect(f"ws://127.0.0.1:{port}/_stcore/stream", subprotocols=["streamlit"],
+                                  max_size=None) as websocket:
+        await BrowserSession(websocket).run()
+    return (time.perf_counter() - start) * 1000
+
+
+def measure_sessions(app_path, data_dir):
+    """(pierwsza sesja, kolejna sesja) na świeżo uruchomionym serwerze"""
+    port = free_port()
+    server = start_server(app_path, data_dir, port)
+    try:
+        return asyncio.run(first_run(port)), asyncio.run(first_run(port))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--machines", default="1000,5000,10000", help="wielkości floty oddzielone przecinkami")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-server", action="store_true", help="bez pomiaru sesji na serwerze Streamlit")
+    parser.add_argument("--app", default=str(REPO_DIR / "app.py"), help="plik aplikacji do pomiaru sesji")
+    args = parser.parse_args()
+
+    codecs = ["stdlib"] + (["orjson"] if storage.orjson is not None else [])
+    if len(codecs) == 1:
+        print("orjson nie jest zainstalowany - pomiar tylko dla kodeka stdlib")
+
+    header = f"{'maszyny':>8} {'MB':>6}"
+    for codec in codecs:
+        header += f" {'odczyt ' + codec:>15} {'zapis ' + codec:>14}"
+    header += f" {'deepcopy':>9} {'draft COW':>10}"
+    if not args.no_server:
+        header += f" {'1. sesja':>9} {'kolejna':>8}"
+    print(header + "   [ms]")
+
+    app_path = str(Path(args.app).resolve())
+    for machines in map(int, args.machines.split(",")):
+        with tempfile.TemporaryDirectory() as data_dir:
+            os.chdir(data_dir)
+            build_fleet(FleetStore(), machines)
+            row = f"{machines:>8} {DATABASE_FILE.stat().st_size / 1024 / 1024:>6.1f}"
+
+            for codec in codecs:
+                storage.JSON_CODEC = "stdlib" if codec == "stdlib" else "auto"
+                store = FleetStore()
+                load = timed(FleetStore, args.repeat)
+                save = timed(lambda: storage.save_database(store.data), args.repeat)
+                row += f" {load:>15.0f} {save:>14.0f}"
+            storage.JSON_CODEC = "auto"
+
+            row += f" {timed(lambda: copy.deepcopy(store.data), args.repeat):>9.0f}"
+            row += f" {timed(lambda: FleetDraft(store.data), args.repeat):>10.1f}"
+
+            if not args.no_server:
+                row += " {:>9.0f} {:>8.0f}".format(*measure_sessions(app_path, data_dir))
+            print(row)
+            os.chdir(REPO_DIR)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""Pomiar czasu przebiegu skryptu aplikacji przy interakcjach na panelu i karcie maszyny.
+
+Uruchomienie (z katalogu repozytorium):
+    python tools/benchmark_reruns.py --machines 500 --repeat 5
+    python tools/benchmark_reruns.py --app /inna/wersja/app.py
+
+Skrypt tworzy tymczasową flotę, uruchamia aplikację serwerem Streamlit i łączy
+się z nim tak jak przeglądarka (websocket /_stcore/stream). Dla każdej
+interakcji mierzy czas od wysłania zdarzenia do zakończenia przebiegu oraz
+liczbę i rozmiar przesłanych elementów. Kliknięcie w widżet fragmentu jest
+wysyłane jako przebieg fragmentu - tak samo jak robi to przeglądarka - więc
+wynik pokazuje rzeczywisty koszt częściowego przebiegu.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import date, timedelta
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+
+INTERVALS_PER_MACHINE = 5
+
+
+def build_fleet(store, machines):
+    """Dodaje flotę testową jedną paczką operacji"""
+    ops = []
+    for i in range(machines):
+        last_service = str(date.today() - timedelta(days=i % 60))
+        ops.append({"op": "add_machine", "machine": {
+            "id": f"M{i + 1:04d}", "name": f"Maszyna {i + 1}", "location": f"Hala {'ABCD'[i % 4]}",
+            "model": f"Model {i % 7}", "avg_daily_cycles": (i % 5) * 40,
+            "service_intervals": [
+                {"name": f"Interwał {n}", "type": "cycles" if n % 2 == 0 else "time",
+                 "interval": 1000 * (n + 1) if n % 2 == 0 else n + 1,
+                 "current_value": (i * 37 + n * 101) % (1000 * (n + 1)),
+                 "last_service": last_service, "enabled": True}
+                for n in range(INTERVALS_PER_MACHINE)
+            ]
+        }})
+    store.submit(ops)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(app_path, data_dir, port):
+    """Uruchamia serwer Streamlit w katalogu danych i czeka na gotowość"""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", app_path, "--server.headless", "true",
+         "--server.port", str(port), "--browser.gatherUsageStats", "false"],
+        cwd=data_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1)
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    sys.exit("Serwer Streamlit nie wystartował")
+
+
+class BrowserSession:
+    """Minimalny klient protokołu Streamlit: stan widżetów i pomiar przebiegów"""
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.widgets = {}   # klucz/etykieta -> (id, fragment_id, element)
+        self.states = {}    # id -> WidgetState wysyłany z każdym przebiegiem
+
+    async def run(self, trigger=None, fragment_id=""):
+        """Wysyła przebieg skryptu i zwraca (sekundy, liczba elementów, bajty)"""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        msg = BackMsg()
+        client_state = msg.rerun_script
+        client_state.fragment_id = fragment_id
+        for state in self.states.values():
+            client_state.widget_states.widgets.append(state)
+        if trigger is not None:
+            client_state.widget_states.widgets.append(trigger)
+
+        start = time.perf_counter()
+        await self.websocket.send(msg.SerializeToString())
+        deltas = received = 0
+        while True:
+            raw = await self.websocket.recv()
+            received += len(raw)
+            fwd = ForwardMsg()
+            fwd.ParseFromString(raw)
+            kind = fwd.WhichOneof("type")
+            if kind == "delta":
+                deltas += 1
+                self._remember(fwd.delta)
+            elif kind == "script_finished" and fwd.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                return time.perf_counter() - start, deltas, received
+
+    def _remember(self, delta):
+        if delta.WhichOneof("type") != "new_element":
+            return
+        element = getattr(delta.new_element, delta.new_element.WhichOneof("type"))
+        widget_id = getattr(element, "id", None)
+        if widget_id:
+            name = getattr(element, "label", "")
+            if "-" in widget_id and "$$ID" in widget_id and not widget_id.endswith("-None"):
+                name = widget_id.rsplit("-", 1)[-1]
+            self.widgets[name] = (widget_id, delta.fragment_id, element)
+
+    def widget(self, name):
+        if name not in self.widgets:
+            raise KeyError(f"Brak widżetu: {name}")
+        return self.widgets[name]
+
+    def click(self, name):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+        widget_id, fragment_id, _ = self.widget(name)
+        return WidgetState(id=widget_id, trigger_value=True), fragment_id
+
+    def set_radio(self, name, option):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+        widget_id, fragment_id, _ = self.widget(name)
+        state = WidgetState(id=widget_id, string_value=option)
+        self.states[widget_id] = state
+        return None, fragment_id
+
+    def set_slider(self, name, value):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+        widget_id, fragment_id, _ = self.widget(name)
+        state = WidgetState(id=widget_id)
+        state.double_array_value.data.append(value)
+        self.states[widget_id] = state
+        return None, fragment_id
+
+
+async def measure(port, repeat):
+    import websockets
+
+    async with websockets.connect(f"ws://127.0.0.1:{port}/_stcore/stream", subprotocols=["streamlit"],
+                                  max_size=None) as websocket:
+        session = BrowserSession(websocket)
+        await session.run()
+
+        first = lambda s, prefix: next(name for name in s.widgets if name.startswith(prefix))
+        horizons = iter([30, 14] * repeat)
+        scenarios = [
+            ("Panel główny: otwarcie", lambda s: s.set_radio("NAWIGACJA", "🏠 Panel Główny"), None),
+            ("Panel główny: Otwórz kartę", None, lambda s: s.click(first(s, "open_"))),
+            ("Karta maszyny: otwarcie", lambda s: s.set_radio("NAWIGACJA", "🔧 Karta Maszyny"), None),
+            ("Karta maszyny: rejestracja cykli", None, lambda s: s.click("add_cycles")),
+            ("Karta maszyny: reset interwału", None, lambda s: s.click(first(s, "reset_"))),
+            ("Karta maszyny: horyzont prognozy", None,
+             lambda s: s.set_slider("forecast_horizon", next(horizons))),
+        ]
+
+        print(f"{'Scenariusz':<36} {'mediana ms':>11} {'min ms':>9} {'elementy':>9} {'KB':>8}")
+        for label, setup, action in scenarios:
+            if setup is not None:
+                await session.run(*setup(session))
+            samples = []
+            for _ in range(repeat):
+                trigger, fragment_id = action(session) if action else (None, "")
+                samples.append(await session.run(trigger, fragment_id))
+            elapsed = [sample[0] for sample in samples]
+            print(f"{label:<36} {statistics.median(elapsed) * 1000:>11.1f} {min(elapsed) * 1000:>9.1f} "
+                  f"{samples[-1][1]:>9} {samples[-1][2] / 1024:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--machines", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--app", default=str(REPO_DIR / "app.py"), help="plik aplikacji do pomiaru")
+    args = parser.parse_args()
+
+    app_path = str(Path(args.app).resolve())
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.chdir(data_dir)
+        from storage import FleetStore
+        build_fleet(FleetStore(), args.machines)
+
+        port = free_port()
+        server = start_server(app_path, data_dir, port)
+        try:
+            print(f"Flota: {args.machines} maszyn x {INTERVALS_PER_MACHINE} interwałów, powtórzeń: {args.repeat}")
+            asyncio.run(measure(port, args.repeat))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""Zestaw pomiarów silnika floty i magazynu danych na syntetycznej flocie - wyniki do pliku JSON.
+
+Uruchomienie (z katalogu repozytorium):
+    python tools/benchmark_suite.py --output wyniki.json
+    python tools/benchmark_suite.py --machines 1000 --events 100000 --compare wyniki.json
+    python tools/benchmark_suite.py --data-dir /tmp/flota --keep    # dane do ponownego użycia
+
+Generator tworzy flotę (domyślnie 10 000 maszyn x 20 interwałów) oraz historię
+(domyślnie 1 000 000 zdarzeń z ostatnich 12 miesięcy: bieżący miesiąc
+w dzienniku, starsze w miesięcznych archiwach) - przy tym samym --seed zawsze
+identyczną. Każdy scenariusz jest wykonywany --repeat razy; do pliku trafia
+mediana, minimum i maksimum w milisekundach razem z opisem środowiska
+(wersja kodu, kodek JSON, backend), a --compare pokazuje zmianę względem
+wcześniejszego pliku wyników.
+
+Pomiar nie wymaga Streamlit - korzysta z modułów fleet i storage.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+
+import numpy as np
+import pandas as pd
+
+import storage
+from fleet import StatusCache, compute_fleet_status, compute_forecast
+from storage import HISTORY_FILE, FleetStore, archive_history, json_dumps
+
+LOCATIONS = [f"Hala {letter}" for letter in "ABCDEFGH"]
+USERS = ["System", "Operator", "Import", "Kierownik"]
+
+
+def generate_machines(machines, intervals, rng):
+    """Syntetyczna flota: interwały na przemian cykliczne i czasowe, różne stany zużycia"""
+    today = date.today()
+    fleet = []
+    for i in range(machines):
+        service_intervals = []
+        for n in range(intervals):
+            if n % 2 == 0:
+                limit = rng.choice([500, 1000, 5000, 10000, 50000])
+                service_intervals.append({"name": f"Interwał {n}", "type": "cycles", "interval": limit,
+                                          "current_value": rng.randint(0, int(limit * 1.1)),
+                                          "last_service": str(today - timedelta(days=rng.randint(0, 400))),
+                                          "enabled": rng.random() > 0.05})
+            else:
+                service_intervals.append({"name": f"Interwał {n}", "type": "time", "interval": rng.choice([1, 3, 6, 12]),
+                                          "current_value": 0,
+                                          "last_service": str(today - timedelta(days=rng.randint(0, 400))),
+                                          "enabled": rng.random() > 0.05})
+        fleet.append({"id": f"M{i + 1:05d}", "name": f"Maszyna {i + 1}", "location": LOCATIONS[i % len(LOCATIONS)],
+                      "model": f"Model {i % 13}", "avg_daily_cycles": rng.choice([0, 10, 40, 120, 300]),
+                      "service_intervals": service_intervals})
+    return fleet
+
+
+def generate_history(machines, events, months, rng):
+    """Zapisuje historię: starsze miesiące do archiwów, bieżący miesiąc do dziennika (chronologicznie)"""
+    now = datetime.now().replace(microsecond=0)
+    month_starts = []
+    first = now.replace(day=1, hour=0, minute=0, second=0)
+    for _ in range(months):
+        month_starts.append(first)
+        first = (first - timedelta(days=1)).replace(day=1)
+    month_starts.reverse()
+
+    per_month = events // months
+    for number, start in enumerate(month_starts):
+        end = month_starts[number + 1] if number + 1 < months else now
+        count = per_month + (events - per_month * months if number + 1 == months else 0)
+        step = (end - start).total_seconds() / max(count, 1)
+        entries = []
+        for k in range(count):
+            machine = machines[rng.randrange(len(machines))]
+            if rng.random() < 0.8:
+                action = f"Dodano {rng.randint(1, 500)} cykli"
+            else:
+                action = f"Wykonano: {rng.choice(machine['service_intervals'])['name']}"
+            entries.append({"timestamp": (start + timedelta(seconds=k * step)).strftime("%Y-%m-%d %H:%M:%S"),
+                            "machine": machine['name'], "action": action, "user": rng.choice(USERS),
+                            "machine_id": machine['id']})
+        if number + 1 < months:
+            archive_history(entries)
+        else:
+            with open(HISTORY_FILE, 'wb') as f:
+                f.writelines(json_dumps(entry) + b"\n" for entry in entries)
+
+
+def generate(data_dir, args):
+    """Tworzy dane testowe w katalogu (pomija, jeśli katalog już zawiera bazę)"""
+    os.chdir(data_dir)
+    if storage.DATABASE_FILE.exists():
+        print(f"Dane w {data_dir} już istnieją - pomijam generowanie")
+        return
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    machines = generate_machines(args.machines, args.intervals, rng)
+    storage.ensure_data_directory()
+    storage.get_backend().save_database({"machines": machines, "revision": 0})
+    generate_history(machines, args.events, args.months, rng)
+    print(f"Wygenerowano {args.machines} maszyn x {args.intervals} interwałów i {args.events} zdarzeń "
+          f"w {time.perf_counter() - start:.1f} s")
+
+
+def timed(func, repeat, setup=None):
+    """Czasy kolejnych wykonań w milisekundach (setup nie jest mierzony)"""
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def run_scenarios(repeat):
+    """Scenariusze: nazwa -> lista czasów (ms)"""
+    results = {}
+    results['load'] = timed(FleetStore, repeat)
+    store = FleetStore()
+    machines = store.data['machines']
+    rng = random.Random(0)
+
+    results['status_full'] = timed(lambda: compute_fleet_status(machines), repeat)
+    cache = StatusCache()
+    cache.get(store)
+    machine_ids = store.index.ids()
+
+    def one_change():
+        store.submit([{"op": "add_cycles", "machine_id": rng.choice(machine_ids), "cycles": 1}])
+    results['status_incremental'] = timed(lambda: cache.get(store), repeat, setup=one_change)
+
+    status = cache.get(store)
+    results['forecast_30'] = timed(lambda: compute_forecast(status.intervals, 30), repeat)
+    results['forecast_365'] = timed(lambda: compute_forecast(status.intervals, 365), repeat)
+
+    results['register_cycles'] = timed(lambda: store.submit(
+        [{"op": "add_cycles", "machine_id": rng.choice(machine_ids), "cycles": 5}], "Dodano 5 cykli"), repeat)
+    results['register_cycles_batch_100'] = timed(lambda: store.submit(
+        [{"op": "add_cycles", "machine_id": machine_id, "cycles": 5} for machine_id in rng.sample(machine_ids, 100)],
+        ["Dodano 5 cykli"] * 100), repeat)
+    results['save'] = timed(lambda: store.backend.save_database(store.data), repeat)
+
+    machine_name = machines[0]['name']
+    today = date.today()
+    results['history_latest_page'] = timed(lambda: store.query_history(limit=50), repeat)
+    results['history_machine'] = timed(lambda: store.query_history(limit=50, machine=machine_name), repeat)
+    quarter = dict(date_from=today - timedelta(days=90), date_to=today)
+    results['history_quarter_cold'] = timed(lambda: store.query_history(limit=50, **quarter), repeat,
+                                            setup=storage._archive_segment.cache_clear)
+    results['history_quarter_warm'] = timed(lambda: store.query_history(limit=50, **quarter), repeat)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--machines", type=int, default=10000)
+    parser.add_argument("--intervals", type=int, default=20, help="interwałów na maszynę")
+    parser.add_argument("--events", type=int, default=1_000_000, help="zdarzeń historii")
+    parser.add_argument("--months", type=int, default=12, help="ile miesięcy obejmuje historia")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--data-dir", type=Path, help="katalog danych testowych (domyślnie tymczasowy)")
+    parser.add_argument("--keep", action="store_true", help="nie usuwaj katalogu danych po pomiarze")
+    parser.add_argument("--output", type=Path, default=Path("benchmark_results.json"), help="plik wyników JSON")
+    parser.add_argument("--compare", type=Path, help="wcześniejszy plik wyników do porównania")
+    args = parser.parse_args()
+
+    output = args.output.resolve()
+    compare = json.loads(args.compare.read_text(encoding='utf-8')) if args.compare else None
+    data_dir = args.data_dir.resolve() if args.data_dir else Path(tempfile.mkdtemp(prefix="warsztat_bench_"))
+    data_dir.mkdir(parents=True, exist_ok=True)
+
+    try:
+        generate(data_dir, args)
+        samples = run_scenarios(args.repeat)
+    finally:
+        os.chdir(REPO_DIR)
+        if not args.keep and not args.data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    results = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec='seconds'),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "json_codec": storage.json_codec(),
+            "backend": storage.STORAGE_BACKEND,
+            "persistence": storage.PERSISTENCE_MODE,
+            "database_layout": storage.DATABASE_LAYOUT,
+            "machines": args.machines,
+            "intervals": args.intervals,
+            "events": args.events,
+            "months": args.months,
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "scenarios": {
+            name: {"median_ms": round(statistics.median(times), 3), "min_ms": round(min(times), 3),
+                   "max_ms": round(max(times), 3)}
+            for name, times in samples.items()
+        },
+    }
+    output.write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding='utf-8')
+
+    if compare and any(compare['meta'].get(key) != results['meta'][key] for key in ('machines', 'intervals', 'events')):
+        print("Uwaga: porównywany plik dotyczy innej wielkości danych testowych")
+    print(f"{'Scenariusz':<28} {'mediana ms':>11} {'min ms':>9} {'max ms':>9}" + (f" {'zmiana':>9}" if compare else ""))
+    for name, result in results['scenarios'].items():
+        line = f"{name:<28} {result['median_ms']:>11.2f} {result['min_ms']:>9.2f} {result['max_ms']:>9.2f}"
+        previous = compare['scenarios'].get(name) if compare else None
+        if previous and previous['median_ms']:
+            line += f" {(result['median_ms'] / previous['median_ms'] - 1) * 100:>+8.0f}%"
+        print(line)
+    print(f"Wyniki zapisano w {output}")
+
+
+if __name__ == "__main__":
+    main()
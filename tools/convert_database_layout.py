@@ -0,0 +1,57 @@
+"""Konwersja snapshotu bazy między układem czytelnym (JSON z wcięciami) a kompaktowym (JSON Lines).
+
+Uruchomienie (z katalogu, w którym leży warsztat_data):
+    python tools/convert_database_layout.py --to compact
+    python tools/convert_database_layout.py --to pretty --input kopia.json --output kopia_czytelna.json
+    WARSZTAT_DATABASE_LAYOUT=compact streamlit run app.py
+
+Bez --input konwertowana jest bieżąca baza warsztat_data/database.json - pod
+blokadą katalogu danych i razem z ogonem WAL (dziennik zostaje wyczyszczony,
+jak przy każdym zapisie snapshotu). Aplikacja zapisuje kolejne snapshoty
+w układzie z WARSZTAT_DATABASE_LAYOUT, więc po konwersji ustaw go tak samo.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from storage import (DATABASE_FILE, encode_snapshot, file_lock, read_database, read_snapshot, save_database,
+                     snapshot_layout, write_bytes_atomic)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--to", choices=["compact", "pretty"], required=True, help="układ docelowy")
+    parser.add_argument("--input", type=Path, help="plik źródłowy (domyślnie bieżąca baza)")
+    parser.add_argument("--output", type=Path, help="plik docelowy (domyślnie nadpisuje źródło)")
+    args = parser.parse_args()
+
+    source = args.input or DATABASE_FILE
+    target = args.output or source
+    if not source.exists():
+        sys.exit(f"Brak pliku {source}")
+    size_before = source.stat().st_size
+    layout_before = snapshot_layout(source)
+
+    if source == DATABASE_FILE:
+        # Bieżąca baza - aplikacja nie może w tym czasie zapisywać
+        with file_lock():
+            data = read_database()
+            if target == DATABASE_FILE:
+                save_database(data, args.to)
+            else:
+                write_bytes_atomic(target, encode_snapshot(data, args.to))
+    else:
+        data = read_snapshot(source)
+        write_bytes_atomic(target, encode_snapshot(data, args.to))
+
+    # Kontrola: odczyt pliku docelowego musi dać te same dane
+    assert read_snapshot(target) == data, "Dane po konwersji różnią się od źródła!"
+
+    print(f"{source} ({layout_before}, {size_before} B) -> {target} ({args.to}, {target.stat().st_size} B): "
+          f"{len(data['machines'])} maszyn, rewizja {data['revision']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Import liczników cykli z pliku CSV/JSONL bez uruchamiania interfejsu.
+
+Uruchomienie (z katalogu, w którym leży warsztat_data):
+    python tools/import_cycles.py zmiana_2026-10-18.csv
+    python tools/import_cycles.py liczniki.jsonl --skip-invalid
+
+Plik CSV musi mieć nagłówek z kolumnami machine_id, cycles, timestamp
+(separator , lub ;); plik JSONL - obiekty z tymi samymi polami. Import
+korzysta z tego samego magazynu i blokady co aplikacja, więc może działać
+równolegle z nią.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cycle_import import detect_format, import_cycles
+from storage import FleetStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("file", type=Path)
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="domyślnie według rozszerzenia pliku")
+    parser.add_argument("--skip-invalid", action="store_true", help="importuj poprawne wiersze mimo błędów")
+    parser.add_argument("--user", default="Import")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    store = FleetStore()
+    with open(args.file, 'r', encoding='utf-8-sig', newline='') as f:
+        try:
+            result = import_cycles(store, f, args.format or detect_format(args.file), args.skip_invalid, args.user)
+        except ValueError as e:
+            sys.exit(f"Błąd pliku: {e}")
+
+    for line, message in result.errors:
+        print(f"  linia {line}: {message}")
+    if result.error_count > len(result.errors):
+        print(f"  ... i {result.error_count - len(result.errors)} kolejnych błędów")
+
+    print(f"Wierszy: {result.rows}, poprawnych: {result.valid_rows}, błędnych: {result.error_count}, "
+          f"maszyn: {len(result.cycles)}, cykli: {sum(result.cycles.values())} "
+          f"({time.perf_counter() - started:.2f} s)")
+    if not result.applied:
+        sys.exit("Nie zaimportowano danych" + (" - popraw błędy lub użyj --skip-invalid" if result.error_count else ""))
+
+
+if __name__ == "__main__":
+    main()
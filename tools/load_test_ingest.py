@@ -0,0 +1,113 @@
+"""Test obciążeniowy serwisu ingest_server.py na localhost.
+
+Uruchomienie (serwis musi działać na tym samym katalogu danych):
+    python ingest_server.py --port 8502 &
+    python tools/load_test_ingest.py --requests 20000 --connections 8 --verify
+
+Każde połączenie keep-alive wysyła zgłoszenia POST /machines/{id}/cycles
+dla losowych maszyn z włączonym interwałem cyklicznym. Skrypt podaje
+przepustowość i czasy odpowiedzi; z --verify czeka na zapis bufora
+i porównuje przyrost licznika jednego interwału każdej maszyny.
+"""
+import argparse
+import http.client
+import json
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from storage import get_backend
+
+
+def cycle_counters(data):
+    """Licznik pierwszego włączonego interwału cyklicznego per maszyna (maszyny bez takiego interwału są pomijane).
+
+    Zgłoszenie cykli zwiększa każdy włączony interwał cykliczny o tę samą wartość,
+    więc przyrost jednego interwału to suma zapisanych cykli maszyny.
+    """
+    counters = {}
+    for machine in data['machines']:
+        for interval in machine['service_intervals']:
+            if interval['type'] == 'cycles' and interval['enabled']:
+                counters[machine['id']] = (interval['name'], interval['current_value'])
+                break
+    return counters
+
+
+def worker(host, port, machine_ids, requests, seed, results):
+    """Wysyła zgłoszenia jednym połączeniem, zbiera czasy odpowiedzi i sumy cykli"""
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection(host, port)
+    latencies, sent, errors = [], {}, 0
+    for _ in range(requests):
+        machine_id = rng.choice(machine_ids)
+        cycles = rng.randint(1, 20)
+        started = time.perf_counter()
+        conn.request("POST", f"/machines/{machine_id}/cycles", body=json.dumps({"cycles": cycles}),
+                     headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - started)
+        if response.status == 202:
+            sent[machine_id] = sent.get(machine_id, 0) + cycles
+        else:
+            errors += 1
+    conn.close()
+    results.append((latencies, sent, errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--requests", type=int, default=20000, help="łączna liczba zgłoszeń")
+    parser.add_argument("--connections", type=int, default=8)
+    parser.add_argument("--verify", action="store_true", help="sprawdź liczniki w warsztat_data po zapisie")
+    parser.add_argument("--flush-wait", type=float, default=3.0, help="ile sekund czekać na zapis bufora")
+    args = parser.parse_args()
+
+    backend = get_backend()
+    before = cycle_counters(backend.read_database())
+    machine_ids = [machine_id for machine_id in before]
+    if not machine_ids:
+        sys.exit("Brak maszyn z włączonym interwałem cyklicznym - dodaj je przed testem")
+
+    results = []
+    per_connection = args.requests // args.connections
+    threads = [threading.Thread(target=worker, args=(args.host, args.port, machine_ids, per_connection, n, results))
+               for n in range(args.connections)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for result in results for latency in result[0])
+    errors = sum(result[2] for result in results)
+    total = len(latencies)
+    print(f"Zgłoszeń: {total} w {elapsed:.2f} s -> {total / elapsed:.0f} req/s, błędów: {errors}")
+    print(f"Czas odpowiedzi: p50 {latencies[total // 2] * 1000:.2f} ms, "
+          f"p95 {latencies[int(total * 0.95)] * 1000:.2f} ms, p99 {latencies[int(total * 0.99)] * 1000:.2f} ms")
+
+    if args.verify:
+        sent = {}
+        for result in results:
+            for machine_id, cycles in result[1].items():
+                sent[machine_id] = sent.get(machine_id, 0) + cycles
+        time.sleep(args.flush_wait)
+        after = cycle_counters(get_backend().read_database())
+        wrong = [machine_id for machine_id in machine_ids
+                 if machine_id not in after or after[machine_id][0] != before[machine_id][0]
+                 or after[machine_id][1] - before[machine_id][1] != sent.get(machine_id, 0)]
+        if wrong:
+            sys.exit(f"Liczniki niezgodne dla {len(wrong)} maszyn (np. {wrong[0]})")
+        print(f"OK - wszystkie {sum(sent.values())} cykli zapisane")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Migracja danych z plików JSON (warsztat_data/*.json) do bazy SQLite.
+
+Uruchomienie (z katalogu, w którym leży warsztat_data):
+    python tools/migrate_json_to_sqlite.py
+    WARSZTAT_BACKEND=sqlite streamlit run app.py
+
+Pliki JSON nie są zmieniane - po migracji zostają jako kopia. Migracja
+przenosi bazę (snapshot razem z ogonem WAL) oraz całą historię, także
+z dawnego pliku history.json, jeśli nie został jeszcze przekonwertowany.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from storage import DATABASE_FILE, HISTORY_FILE, LEGACY_HISTORY_FILE, file_lock, iter_history_reversed, read_database
+from sqlite_storage import SQLITE_FILE, SqliteBackend
+
+
+def read_json_history():
+    """Historia z dziennika JSON Lines lub dawnego history.json (od najnowszych wpisów)"""
+    if HISTORY_FILE.exists():
+        return list(iter_history_reversed(HISTORY_FILE))
+    if LEGACY_HISTORY_FILE.exists():
+        with open(LEGACY_HISTORY_FILE, 'r', encoding='utf-8') as f:
+            history = json.load(f)
+        return history if isinstance(history, list) else []
+    return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--force", action="store_true", help="nadpisz istniejącą bazę SQLite")
+    args = parser.parse_args()
+
+    if not DATABASE_FILE.exists():
+        sys.exit(f"Brak pliku {DATABASE_FILE} - nie ma czego migrować")
+    if SQLITE_FILE.exists() and not args.force:
+        sys.exit(f"Baza {SQLITE_FILE} już istnieje - użyj --force, aby ją nadpisać")
+
+    # Blokada katalogu danych - aplikacja nie może w tym czasie zapisywać plików JSON
+    with file_lock():
+        data = read_database()
+        history = read_json_history()
+
+        backend = SqliteBackend()
+        backend.save_database(data)
+        backend.save_history(history)
+
+    # Kontrola: odczyt z SQLite musi dać te same dane
+    migrated = backend.read_database()
+    assert migrated['machines'] == data['machines'], "Dane maszyn po migracji różnią się od źródła!"
+    assert len(backend.load_history()) == len(history), "Liczba wpisów historii po migracji się nie zgadza!"
+
+    intervals = sum(len(m['service_intervals']) for m in data['machines'])
+    print(f"Zmigrowano do {SQLITE_FILE}: {len(data['machines'])} maszyn, {intervals} interwałów, "
+          f"{len(history)} wpisów historii (rewizja {data['revision']})")
+    print("Uruchom aplikację z WARSZTAT_BACKEND=sqlite")
+
+
+if __name__ == "__main__":
+    main()
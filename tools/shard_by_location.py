@@ -0,0 +1,134 @@
+"""Podział danych floty na shardy lokalizacji (hal) - każda hala we własnym katalogu danych.
+
+Uruchomienie (z katalogu, w którym leży warsztat_data):
+    python tools/shard_by_location.py
+    streamlit run app.py                                   # wybór hali w panelu bocznym
+    python ingest_server.py --location "Hala A"            # serwis cykli jednej hali
+
+Maszyny trafiają do shardu swojej lokalizacji (warsztat_data/shards/<hala>)
+razem z historią: bieżącym dziennikiem i miesięcznymi archiwami. Wpisy
+historii są przypisywane po ID maszyny (dawne wpisy - po nazwie); wpisy
+usuniętych maszyn zostają tylko w dotychczasowych plikach. Kopie zapasowe
+każdy shard zaczyna od nowa. Manifest warsztat_data/shards.json powstaje na
+końcu - od niego aplikacja i serwisy rozpoznają podział, więc trzeba je
+potem uruchomić ponownie. Dotychczasowe pliki nie są zmieniane - zostają
+jako kopia. Backend shardów jak w WARSZTAT_BACKEND.
+
+Ponowny podział (--force) scala bieżące shardy - nie główną bazę, która po
+pierwszym podziale jest nieaktualna - i dzieli je od nowa (np. po
+przeniesieniu maszyn między halami). Dotychczasowy katalog shardów zostaje
+jako kopia warsztat_data/shards_<data>.
+"""
+from collections import Counter
+import argparse
+import sys
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from storage import (SHARD_MANIFEST, SHARDS_DIR, DataPaths, archive_history, file_lock, get_backend,
+                     list_history_archives, machine_number, read_history_archive, read_next_machine_number,
+                     read_shard_manifest, shard_directory_name, write_shard_manifest)
+
+
+def read_shards(manifest):
+    """Scala bieżące shardy z manifestu: (baza, historia od najnowszych, archiwa per miesiąc)"""
+    data, history, archives = None, [], {}
+    for location, directory in sorted(manifest.items()):
+        paths = DataPaths(SHARDS_DIR / directory)
+        with file_lock(paths.lock):
+            shard_backend = get_backend(paths=paths)
+            shard = shard_backend.read_database()
+            history += shard_backend.load_history()
+            for month in list_history_archives(paths):
+                archives.setdefault(month, []).extend(read_history_archive(month, paths))
+        if data is None:
+            data = {**shard, 'machines': []}
+        data['machines'] += shard['machines']
+        data['revision'] = max(data['revision'], shard['revision'])
+
+    ids = Counter(machine['id'] for machine in data['machines'])
+    duplicates = sorted(machine_id for machine_id, count in ids.items() if count > 1)
+    if duplicates:
+        sys.exit(f"Te same ID maszyn w kilku shardach ({', '.join(duplicates[:5])}) - popraw je przed podziałem")
+
+    history.sort(key=lambda entry: entry.get('timestamp', ''), reverse=True)
+    for entries in archives.values():
+        entries.sort(key=lambda entry: entry.get('timestamp', ''))
+    return data, history, archives
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--force", action="store_true", help="scal istniejące shardy i podziel je ponownie")
+    args = parser.parse_args()
+
+    manifest = read_shard_manifest()
+    if manifest is not None and not args.force:
+        sys.exit(f"Dane są już podzielone ({SHARD_MANIFEST}) - użyj --force, aby podzielić je ponownie")
+
+    if manifest is None:
+        # Blokada katalogu danych - aplikacja nie może w tym czasie zapisywać
+        backend = get_backend()
+        with file_lock():
+            data = backend.read_database()
+            history = backend.load_history()
+            archives = {month: read_history_archive(month) for month in list_history_archives()}
+    else:
+        data, history, archives = read_shards(manifest)
+    if not data['machines']:
+        sys.exit("Baza nie zawiera maszyn - nie ma czego dzielić")
+
+    by_location = {}
+    owner = {}
+    for machine in data['machines']:
+        by_location.setdefault(machine['location'], []).append(machine)
+        owner[('id', machine['id'])] = owner[('name', machine['name'])] = machine['location']
+
+    def entry_location(entry):
+        if 'machine_id' in entry:
+            return owner.get(('id', entry['machine_id']))
+        return owner.get(('name', entry.get('machine')))
+
+    next_number = max(machine_number(machine['id']) for machine in data['machines']) + 1
+    if manifest is not None:
+        # Numery usuniętych maszyn nie wracają - licznik z dotychczasowego manifestu
+        next_number = max(next_number, read_next_machine_number() or 0)
+        SHARD_MANIFEST.unlink()
+        previous = SHARDS_DIR.with_name(f"shards_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        SHARDS_DIR.rename(previous)
+        print(f"Dotychczasowe shardy przeniesiono do {previous}")
+
+    shards = {}
+    assigned = 0
+    print(f"{'Hala':<24} {'katalog':<20} {'maszyny':>8} {'historia':>9} {'archiwum':>9}")
+    for location, machines in sorted(by_location.items()):
+        shards[location] = shard_directory_name(location, shards.values())
+        paths = DataPaths(SHARDS_DIR / shards[location])
+        shard_history = [entry for entry in history if entry_location(entry) == location]
+        archived = 0
+        with file_lock(paths.lock):
+            shard_backend = get_backend(paths=paths)
+            shard_backend.save_database({**data, 'machines': machines})
+            shard_backend.save_history(shard_history)
+            for entries in archives.values():
+                shard_entries = [entry for entry in entries if entry_location(entry) == location]
+                archive_history(shard_entries, paths)
+                archived += len(shard_entries)
+
+        # Kontrola: odczyt shardu musi dać maszyny tej hali
+        assert shard_backend.read_database()['machines'] == machines, f"Dane shardu {location} różnią się od źródła!"
+        assigned += len(shard_history) + archived
+        print(f"{location:<24} {shards[location]:<20} {len(machines):>8} {len(shard_history):>9} {archived:>9}")
+
+    # Licznik ID maszyn całej floty - nowe maszyny w halach dostają ID z manifestu
+    write_shard_manifest(shards, next_machine_number=next_number)
+    total = len(history) + sum(len(entries) for entries in archives.values())
+    print(f"Podzielono {len(data['machines'])} maszyn na {len(shards)} hal (rewizja {data['revision']}); "
+          f"wpisy historii bez istniejącej maszyny: {total - assigned} (zostają w dotychczasowych plikach)")
+    print("Uruchom ponownie aplikację i serwisy - wczytają dane z shardów")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Test obciążeniowy: N procesów jednocześnie dodaje cykle do wspólnego katalogu danych.
+
+Uruchomienie (z katalogu repozytorium):
+    python tools/stress_concurrent_writes.py --processes 8 --ops 200 --mode wal
+    python tools/stress_concurrent_writes.py --backend sqlite
+
+Na koniec liczniki cykli muszą się zgadzać co do jednego cyklu, a historia
+musi zawierać wpis dla każdej operacji - inaczej skrypt kończy się błędem.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+MACHINES = 5
+
+
+def worker(data_dir, worker_id, ops, result_queue):
+    """Dodaje cykle do losowych maszyn i zwraca sumy dodane per maszyna"""
+    os.chdir(data_dir)
+    from storage import FleetStore
+
+    store = FleetStore()
+    rng = random.Random(worker_id)
+    added = {}
+    for _ in range(ops):
+        machine_id = f"M{rng.randrange(MACHINES) + 1:02d}"
+        cycles = rng.randint(1, 50)
+        store.submit([{"op": "add_cycles", "machine_id": machine_id, "cycles": cycles}],
+                     f"Dodano {cycles} cykli")
+        added[machine_id] = added.get(machine_id, 0) + cycles
+    result_queue.put(added)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=200, help="operacji na proces")
+    parser.add_argument("--mode", choices=["snapshot", "wal"], default="wal")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    args = parser.parse_args()
+
+    # Tryb zapisu musi być ustawiony przed importem storage w procesach potomnych
+    os.environ["WARSZTAT_PERSISTENCE"] = args.mode
+    os.environ["WARSZTAT_BACKEND"] = args.backend
+    os.environ.setdefault("WARSZTAT_SNAPSHOT_OPS", "50")
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.chdir(data_dir)
+        from storage import FleetStore, get_backend
+
+        store = FleetStore()
+        for i in range(MACHINES):
+            machine_id = f"M{i + 1:02d}"
+            store.submit([{"op": "add_machine", "machine": {
+                "id": machine_id, "name": f"Prasa {machine_id}", "location": "Hala A", "model": "Test",
+                "avg_daily_cycles": 0,
+                "service_intervals": [{"name": "Smarowanie", "type": "cycles", "interval": 10 ** 9,
+                                       "current_value": 0, "last_service": "2026-01-01", "enabled": True}]
+            }}])
+
+        ctx = multiprocessing.get_context("spawn")
+        results = ctx.Queue()
+        processes = [ctx.Process(target=worker, args=(data_dir, n, args.ops, results))
+                     for n in range(args.processes)]
+        for p in processes:
+            p.start()
+        expected = {}
+        for _ in processes:
+            for machine_id, cycles in results.get().items():
+                expected[machine_id] = expected.get(machine_id, 0) + cycles
+        for p in processes:
+            p.join()
+            if p.exitcode != 0:
+                sys.exit(f"Proces zakończył się błędem (kod {p.exitcode})")
+
+        backend = get_backend()
+        data = backend.read_database()
+        actual = {m['id']: m['service_intervals'][0]['current_value'] for m in data['machines']}
+        history = backend.load_history()
+        total_ops = args.processes * args.ops
+
+        print(f"Backend: {args.backend}, tryb: {args.mode}, procesy: {args.processes}, operacji: {total_ops}, rewizja: {data['revision']}")
+        for machine_id in sorted(actual):
+            print(f"  {machine_id}: oczekiwano {expected.get(machine_id, 0)}, jest {actual[machine_id]}")
+
+        assert actual == {m: expected.get(m, 0) for m in actual}, "Utracono część przyrostów cykli!"
+        assert data['revision'] == MACHINES + total_ops, "Nieprawidłowa rewizja danych"
+        assert sum(1 for e in history if e['action'].startswith("Dodano")) == total_ops, "Brak wpisów historii"
+        print("OK - liczniki zgodne")
+
+
+if __name__ == "__main__":
+    main()